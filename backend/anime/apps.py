@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def repair_search_index(sender, using='default', **kwargs):
+    # На SQLite миграции пересоздают таблицу anime_anime, а с ней пропадают триггеры FTS
+    from django.db import connections
+    from .search import FTS_TABLE, install_fts
+
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        install_fts(connection)
 
 
 class AnimeConfig(AppConfig):
     name = 'anime'
+
+    def ready(self):
+        post_migrate.connect(repair_search_index, sender=self)
@@ -0,0 +1,198 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from .memory_index import AnimeMemoryIndex, IndexHolder
+from .search_keys import query_tokens
+
+# Сколько подсказок отдаём по умолчанию и максимум
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+MAX_TOKENS = 8
+
+# Поля подсказки: всё, что нужно выпадающему списку, без похода в базу
+PAYLOAD_FIELDS = ('id', 'title_ru', 'title_en', 'year', 'anime_type', 'poster_url', 'slug')
+
+# Под префиксом больше слов, чем здесь, - считаем, что он покрывает весь каталог
+WIDE_RANGE = 2000
+# Кэш ответов по нормализованному запросу; сбрасывается при каждом изменении
+CACHE_SIZE = 4096
+# После стольких вставок и удалений за пачку порядок по популярности
+# дешевле отсортировать заново (на 100k аниме - около 30 мс)
+RESORT_AFTER = 1000
+
+
+class PrefixIndex(AnimeMemoryIndex):
+    """Префиксный индекс названий для подсказок при наборе.
+
+    Слова search_text (нормализованные названия и их транслитерации)
+    лежат в отсортированном списке, префикс - это отрезок, найденный
+    двумя bisect; у каждого слова - массив pk аниме. Все аниме заранее
+    упорядочены по популярности (ключи сортировки в списке order,
+    изменения вставляются в него bisect'ом), поэтому из кандидатов
+    берутся первые по ключу. Если совпадений ожидается много («а», «no»), кандидатов
+    не собираем, а идём по аниме в порядке популярности до первых
+    совпадений. Последнее слово запроса - префикс, остальные
+    тоже, но должны совпасть в том же аниме.
+    """
+
+    fields = ('pk', 'search_text', 'popularity', 'score') + PAYLOAD_FIELDS[1:]
+
+    def __init__(self):
+        super().__init__()
+        self.postings: Dict[str, array] = {}
+        self.words: List[str] = []
+        # pk -> (' ' + search_text, ключ популярности, поля подсказки)
+        self.docs: Dict[int, tuple] = {}
+        # Ключи популярности всех аниме по возрастанию, pk - последний элемент
+        self.order: List[tuple] = []
+        self.cache: OrderedDict = OrderedDict()
+        self._new_words: List[str] = []
+        self._changed = False
+        # Изменений с прошлого _finish; после RESORT_AFTER order не ведём, а сортируем заново
+        self._order_changes = 0
+        self._order_stale = True
+
+    def __len__(self):
+        return len(self.docs)
+
+    def live_pks(self):
+        return self.docs.keys()
+
+    def _add(self, row: tuple):
+        pk, search_text, popularity, score, *payload = row
+        self._remove(pk)
+
+        text = ' ' + (search_text or '')
+        # Как Meta.ordering: -popularity, -score; без значений - в конце
+        key = (-(popularity if popularity is not None else -1), -(score if score is not None else -1), pk)
+        self.docs[pk] = (text, key, (pk, *payload))
+        if self._track_order():
+            insort(self.order, key)
+        for word in set(text.split()):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = array('q')
+                self._new_words.append(word)
+            postings.append(pk)
+        self._changed = True
+
+    def _remove(self, pk: int):
+        old = self.docs.pop(pk, None)
+        if old is None:
+            return
+        if self._track_order():
+            del self.order[bisect_left(self.order, old[1])]
+        for word in set(old[0].split()):
+            postings = self.postings[word]
+            postings.remove(pk)
+            if not postings:
+                # Из words слово уберётся при следующей полной сортировке
+                del self.postings[word]
+        self._changed = True
+
+    def _track_order(self) -> bool:
+        """Вести order по месту или отложить до полной сортировки в _finish"""
+        if not self._order_stale:
+            self._order_changes += 1
+            self._order_stale = self._order_changes > RESORT_AFTER
+        return not self._order_stale
+
+    def _finish(self):
+        if not self._changed:
+            return
+        if len(self._new_words) > 100 or len(self.words) > 2 * len(self.postings):
+            self.words = sorted(self.postings)
+        else:
+            for word in self._new_words:
+                index = bisect_left(self.words, word)
+                if index == len(self.words) or self.words[index] != word:
+                    insort(self.words, word)
+        self._new_words = []
+
+        if self._order_stale:
+            self.order = sorted(doc[1] for doc in self.docs.values())
+            self._order_stale = False
+        self._order_changes = 0
+        self.cache.clear()
+        self._changed = False
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.words, prefix), bisect_left(self.words, prefix + '\U0010ffff')
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """Подсказки по началу запроса, самые популярные первыми"""
+        tokens = tuple(dict.fromkeys(query_tokens(query, limit=MAX_TOKENS)))
+        if not tokens:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        with self._lock:
+            pks = self.cache.get(tokens)
+            if pks is None:
+                pks = self._search(tokens)
+                self.cache[tokens] = pks
+                if len(self.cache) > CACHE_SIZE:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(tokens)
+            docs = self.docs
+            return [dict(zip(PAYLOAD_FIELDS, docs[pk][2])) for pk in pks[:limit] if pk in docs]
+
+    def _search(self, tokens: Tuple[str, ...]) -> List[int]:
+        total = len(self.docs)
+        if not total:
+            return []
+        # Сколько аниме под каждым префиксом; очень широкий отрезок не считаем - это «всё»
+        counted = []
+        for token in tokens:
+            lo, hi = self._range(token)
+            if hi - lo > WIDE_RANGE:
+                counted.append((total, token, None))
+                continue
+            postings = [self.postings[word] for word in self.words[lo:hi] if word in self.postings]
+            count = sum(map(len, postings))
+            if not count:
+                return []
+            counted.append((count, token, postings))
+        counted.sort(key=lambda item: item[0])
+        count, narrow, postings = counted[0]
+        others = [' ' + token for _, token, _ in counted[1:]]
+
+        # Обход по популярности просматривает примерно MAX_LIMIT / (доля совпадений)
+        # аниме, сбор кандидатов - все аниме самого узкого слова; берём что дешевле
+        share = 1.0
+        for n, _, _ in counted:
+            share *= n / total
+        docs = self.docs
+        if postings is None or MAX_LIMIT / share < count:
+            needles = [' ' + narrow] + others
+            found = []
+            for _, _, pk in self.order:
+                text = docs[pk][0]
+                for needle in needles:
+                    if needle not in text:
+                        break
+                else:
+                    found.append(pk)
+                    if len(found) == MAX_LIMIT:
+                        break
+            return found
+
+        candidates = set()
+        for pks in postings:
+            candidates.update(pks)
+        # По одному слову за проход, от узких к широким: так список быстрее сжимается
+        for needle in others:
+            candidates = [pk for pk in candidates if needle in docs[pk][0]]
+        return heapq.nsmallest(MAX_LIMIT, candidates, key=lambda pk: docs[pk][1])
+
+
+_holder = IndexHolder(PrefixIndex)
+
+
+def get_prefix_index() -> PrefixIndex:
+    """Общий на процесс индекс; строится при первой подсказке"""
+    return _holder.get()
@@ -0,0 +1,283 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from parsers.shikimori import ShikimoriParser
+from .import_journal import default_state_dir
+from .models import Anime
+
+
+class Backfill:
+    """Один бэкфилл: какие строки и колонки читать и как их преобразовать.
+
+    transform получает словарь колонок строки (с 'pk') и возвращает
+    словарь изменившихся полей или None. Он не должен ходить в БД: при
+    cpu_bound его выполняет пул процессов.
+    """
+
+    name = ''
+    model = Anime
+    read_fields: Tuple[str, ...] = ()
+    # Преобразование упирается в CPU (регулярки) - есть смысл в пуле процессов
+    cpu_bound = False
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def transform(self, row: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def transform_batch(self, rows: List[Dict], pool: Optional[ProcessPoolExecutor] = None) -> List[Tuple[int, Dict]]:
+        """[(pk, изменения)] для пачки; можно переопределить для пакетных запросов"""
+        if pool:
+            results = pool.map(self.transform, rows, chunksize=max(len(rows) // 32, 1))
+        else:
+            results = map(self.transform, rows)
+        return [(row['pk'], changes) for row, changes in zip(rows, results) if changes]
+
+
+class BackfillRunner:
+    """Проход бэкфилла по таблице кусками с чекпоинтами.
+
+    Строки читаются keyset-пагинацией по pk (только нужные колонки, без
+    загрузки всей таблицы), изменения пишутся bulk_update только по
+    затронутым полям. После каждого куска последний pk сохраняется в
+    IMPORT_STATE_DIR/<name>.backfill.json, так что прерванный проход
+    продолжается с места остановки; после полного прохода чекпоинт
+    удаляется. rate и pause ограничивают нагрузку на живую базу.
+    """
+
+    def __init__(self, backfill: Backfill, chunk_size: int = 1000, processes: int = 0,
+                 rate: Optional[float] = None, pause: float = 0.0, resume: bool = False,
+                 dry_run: bool = False, state_dir: Optional[Path] = None):
+        self.backfill = backfill
+        self.chunk_size = chunk_size
+        self.processes = processes if backfill.cpu_bound else 0
+        # Не больше rate строк в секунду в среднем
+        self.rate = rate
+        # Пауза после каждого куска, секунд
+        self.pause = pause
+        self.dry_run = dry_run
+        self.state_path = Path(state_dir or default_state_dir()) / f'{backfill.name}.backfill.json'
+        self.stats = {'scanned': 0, 'changed': 0, 'chunks': 0, 'last_pk': 0}
+        self.touch_updated_at = any(f.name == 'updated_at' for f in backfill.model._meta.concrete_fields)
+        if resume:
+            self._load_state()
+
+    def run(self, limit: Optional[int] = None) -> Dict[str, int]:
+        started = time.monotonic()
+        scanned_before = self.stats['scanned']
+        pool = ProcessPoolExecutor(self.processes) if self.processes > 1 else None
+        try:
+            for rows in self._chunks():
+                changes = self.backfill.transform_batch(rows, pool)
+                if changes and not self.dry_run:
+                    self._write(changes)
+
+                self.stats['scanned'] += len(rows)
+                self.stats['changed'] += len(changes)
+                self.stats['chunks'] += 1
+                self.stats['last_pk'] = rows[-1]['pk']
+                if not self.dry_run:
+                    self._save_state()
+                print(f"[{self.backfill.name}] pk <= {self.stats['last_pk']}: "
+                      f"просмотрено {self.stats['scanned']}, изменено {self.stats['changed']}")
+
+                if limit and self.stats['scanned'] - scanned_before >= limit:
+                    break
+                self._throttle(started, self.stats['scanned'] - scanned_before)
+            else:
+                # Таблица пройдена до конца: --resume больше нечего продолжать
+                if not self.dry_run:
+                    self.state_path.unlink(missing_ok=True)
+        finally:
+            if pool:
+                pool.shutdown()
+        return self.stats
+
+    def _chunks(self) -> Iterable[List[Dict]]:
+        queryset = self.backfill.queryset().order_by('pk')
+        fields = ('pk',) + tuple(self.backfill.read_fields)
+        last_pk = self.stats['last_pk']
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).values(*fields)[:self.chunk_size])
+            if not rows:
+                return
+            last_pk = rows[-1]['pk']
+            yield rows
+
+    def _write(self, changes: List[Tuple[int, Dict]]):
+        now = timezone.now()
+        model = self.backfill.model
+        # Как в AnimeBulkWriter: одна пачка UPDATE на каждый набор полей
+        groups: Dict[tuple, list] = {}
+        for pk, fields in changes:
+            obj = model(pk=pk, **fields)
+            if self.touch_updated_at:
+                obj.updated_at = now
+            groups.setdefault(tuple(sorted(fields)), []).append(obj)
+
+        for fields, objs in groups.items():
+            update_fields = list(fields) + (['updated_at'] if self.touch_updated_at else [])
+            model.objects.bulk_update(objs, update_fields, batch_size=self.chunk_size)
+
+    def _throttle(self, started: float, scanned: int):
+        delay = self.pause
+        if self.rate:
+            delay = max(delay, scanned / self.rate - (time.monotonic() - started))
+        if delay > 0:
+            time.sleep(delay)
+
+    def _load_state(self):
+        if not self.state_path.exists():
+            return
+        with open(self.state_path, encoding='utf-8') as f:
+            self.stats.update(json.load(f))
+        print(f"[{self.backfill.name}] Продолжаем с pk > {self.stats['last_pk']}")
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.stats), encoding='utf-8')
+        os.replace(tmp_path, self.state_path)
+
+
+class SearchTextBackfill(Backfill):
+    """search_text, slug и year - те же производные поля, что считает Anime.save"""
+
+    name = 'fill_search_text'
+    read_fields = ('title_ru', 'title_en', 'title_jp', 'search_text', 'slug', 'shikimori_id',
+                   'aired_from', 'year')
+    computed_fields = ('search_text', 'slug', 'year')
+
+    def transform(self, row: Dict) -> Optional[Dict]:
+        anime = Anime(**row)
+        anime.fill_computed_fields()
+        return {
+            name: getattr(anime, name)
+            for name in self.computed_fields
+            if getattr(anime, name) != row[name]
+        }
+
+
+class CleanDescriptionsBackfill(Backfill):
+    """Убрать BBCode-теги Shikimori из описаний"""
+
+    name = 'clean_descriptions'
+    read_fields = ('description',)
+    cpu_bound = True
+
+    def queryset(self):
+        return Anime.objects.filter(description__contains='[')
+
+    def transform(self, row: Dict) -> Optional[Dict]:
+        cleaned = ShikimoriParser._clean_description(row['description'])
+        if cleaned != row['description']:
+            return {'description': cleaned}
+        return None
+
+
+class MissingPostersBackfill(Backfill):
+    """Заново взять постеры с Shikimori для аниме с заглушкой
+
+    Сеть, а не CPU: вместо transform - пакетные GraphQL-запросы.
+    """
+
+    name = 'update_posters'
+    read_fields = ('shikimori_id', 'poster_url')
+
+    def __init__(self):
+        self.parser = ShikimoriParser()
+        self.errors = 0
+
+    def queryset(self):
+        return Anime.objects.filter(poster_url__contains='missing_original.jpg', shikimori_id__isnull=False)
+
+    def transform_batch(self, rows: List[Dict], pool=None) -> List[Tuple[int, Dict]]:
+        pk_by_shikimori = {row['shikimori_id']: row['pk'] for row in rows}
+        ids = list(pk_by_shikimori)
+        changes = []
+        for start in range(0, len(ids), self.parser.GRAPHQL_BATCH_LIMIT):
+            try:
+                items = self.parser.get_anime_chunk(ids[start:start + self.parser.GRAPHQL_BATCH_LIMIT])
+            except Exception as e:
+                self.errors += 1
+                print(f"Ошибка загрузки постеров: {e}")
+                continue
+            for item in items:
+                poster_url = self.parser.normalize_anime_data(item)['poster_url']
+                if poster_url and '/missing_' not in poster_url:
+                    changes.append((pk_by_shikimori[item['id']], {'poster_url': poster_url}))
+        return changes
+
+
+class BackfillCommand(BaseCommand):
+    """Общие опции management-команд, построенных на BackfillRunner"""
+
+    def get_backfill(self, options) -> Backfill:
+        raise NotImplementedError
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Строк за один проход (чтение и bulk_update)'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=0,
+            help='Пул процессов для тяжёлых по CPU преобразований'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=None,
+            help='Не больше стольких строк в секунду'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Пауза после каждого куска, секунд'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить с последнего чекпоинта'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Остановиться после стольких строк'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать изменения, без записи'
+        )
+
+    def handle(self, *args, **options):
+        runner = BackfillRunner(
+            self.get_backfill(options),
+            chunk_size=options['chunk_size'],
+            processes=options['processes'],
+            rate=options['rate'],
+            pause=options['pause'],
+            resume=options['resume'],
+            dry_run=options['dry_run'],
+        )
+        started = time.monotonic()
+        stats = runner.run(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Просмотрено {stats['scanned']}, изменено {stats['changed']} "
+            f"за {time.monotonic() - started:.1f} с"
+        ))
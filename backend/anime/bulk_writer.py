@@ -0,0 +1,219 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Set
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import external_ids
+from .models import Anime, Genre, Studio
+
+# Поля нормализованной записи, которые переносятся в Anime как есть
+ANIME_FIELDS = (
+    'title_ru', 'title_en', 'title_jp', 'description', 'year', 'status',
+    'episodes', 'score', 'popularity', 'poster_url', 'trailer_url', 'screenshots', 'mal_id', 'anilist_id',
+)
+TITLE_FIELDS = {'title_ru', 'title_en', 'title_jp'}
+
+
+def _slug(name: str) -> str:
+    # Так же, как жанры и студии всегда создавались при импорте
+    return name.lower().replace(' ', '-')
+
+
+class AnimeBulkWriter:
+    """Буферизованная запись нормализованных аниме пачками.
+
+    Принимает записи в формате ShikimoriParser.normalize_anime_data и на
+    каждый flush делает один многострочный upsert по shikimori_id плюс
+    bulk-вставки жанров, студий и строк M2M-таблиц. Вместо десятка
+    запросов на аниме получается десяток запросов на пачку.
+    """
+
+    def __init__(self, batch_size: int = 500, data_source: str = 'shikimori', on_flush=None,
+                 metrics=None, mark_synced: bool = True):
+        self.batch_size = batch_size
+        self.data_source = data_source
+        # Вызывается с shikimori_id всех записанных аниме после каждого flush
+        self.on_flush = on_flush
+        # ImportMetrics, если нужно замерять время записи
+        self.metrics = metrics
+        # Свежие данные из апстрима: сдвигаем last_synced (не нужно при пересборке из кеша)
+        self.mark_synced = mark_synced
+        self.buffer: Dict[int, Dict] = {}
+        self.stats = {'created': 0, 'updated': 0, 'flushes': 0}
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, record: Dict):
+        """Добавить запись в буфер (сброс в БД при заполнении)"""
+        shikimori_id = record.get('id')
+        if not shikimori_id:
+            return
+
+        with self._lock:
+            self.buffer[int(shikimori_id)] = record
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def add_many(self, records: Iterable[Dict]):
+        for record in records:
+            self.add(record)
+
+    def flush(self) -> Set[int]:
+        """Записать буфер; вернуть shikimori_id впервые созданных аниме"""
+        with self._lock:
+            if not self.buffer:
+                return set()
+            records, self.buffer = self.buffer, {}
+
+            started = time.monotonic()
+            with transaction.atomic():
+                created_ids = self._write(records)
+            if self.metrics:
+                self.metrics.observe_write(len(records), time.monotonic() - started)
+
+            self.stats['flushes'] += 1
+            self.stats['created'] += len(created_ids)
+            self.stats['updated'] += len(records) - len(created_ids)
+
+            if self.on_flush:
+                self.on_flush(records.keys())
+            return created_ids
+
+    def _write(self, records: Dict[int, Dict]) -> Set[int]:
+        existing_ids = set(Anime.objects.filter(
+            shikimori_id__in=records.keys()
+        ).values_list('shikimori_id', flat=True))
+
+        # Источники отдают разные наборы полей: обновляем только пришедшие,
+        # чтобы не затирать то, что заполнил другой источник
+        synced_at = timezone.now() if self.mark_synced else None
+        groups: Dict[tuple, List[Anime]] = {}
+        for shikimori_id, record in records.items():
+            fields = tuple(f for f in ANIME_FIELDS if f in record)
+            anime = Anime(
+                shikimori_id=shikimori_id,
+                data_source=record.get('data_source', self.data_source),
+                last_synced=synced_at,
+                **{f: self._clean_value(f, record[f]) for f in fields}
+            )
+            anime.fill_computed_fields()
+            groups.setdefault(fields, []).append(anime)
+
+        partial_titles = []
+        for fields, objs in groups.items():
+            update_fields = list(fields) + ['data_source', 'updated_at']
+            if self.mark_synced:
+                update_fields.append('last_synced')
+            titles = TITLE_FIELDS & set(fields)
+            if titles == TITLE_FIELDS:
+                update_fields.append('search_text')
+            elif titles:
+                partial_titles.extend(obj.shikimori_id for obj in objs)
+
+            Anime.objects.bulk_create(
+                objs,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['shikimori_id'],
+                update_fields=update_fields,
+            )
+
+        if partial_titles:
+            # Пришла только часть названий - производные поля считаем по строке из БД
+            objs = list(Anime.objects.filter(shikimori_id__in=partial_titles))
+            for anime in objs:
+                anime.fill_computed_fields()
+            Anime.objects.bulk_update(objs, ['search_text'], batch_size=self.batch_size)
+
+        # В Django 4.2 upsert не возвращает pk, забираем их одним запросом
+        pk_by_shikimori = dict(Anime.objects.filter(
+            shikimori_id__in=records.keys()
+        ).values_list('shikimori_id', 'id'))
+
+        self._write_genres(records, pk_by_shikimori)
+        self._write_studios(records, pk_by_shikimori)
+        self._write_external_ids(records, pk_by_shikimori)
+
+        return set(records) - existing_ids
+
+    def _write_genres(self, records: Dict[int, Dict], pk_by_shikimori: Dict[int, int]):
+        names_by_anime = {
+            pk_by_shikimori[sid]: {g['name'] for g in record.get('genres') or [] if g.get('name')}
+            for sid, record in records.items()
+            if sid in pk_by_shikimori
+        }
+        all_names = set().union(*names_by_anime.values()) if names_by_anime else set()
+        if not all_names:
+            return
+
+        Genre.objects.bulk_create(
+            [Genre(name=name, slug=_slug(name)) for name in all_names],
+            ignore_conflicts=True,
+        )
+        genre_ids = dict(Genre.objects.filter(name__in=all_names).values_list('name', 'id'))
+
+        Through = Anime.genres.through
+        Through.objects.bulk_create(
+            [
+                Through(anime_id=anime_pk, genre_id=genre_ids[name])
+                for anime_pk, names in names_by_anime.items()
+                for name in names
+                if name in genre_ids
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def _write_studios(self, records: Dict[int, Dict], pk_by_shikimori: Dict[int, int]):
+        # У студий уникален только slug, по нему и сопоставляем
+        slugs_by_anime = {
+            pk_by_shikimori[sid]: {_slug(name): name for name in record.get('studios') or [] if name}
+            for sid, record in records.items()
+            if sid in pk_by_shikimori
+        }
+        all_studios = {}
+        for studios in slugs_by_anime.values():
+            all_studios.update(studios)
+        if not all_studios:
+            return
+
+        Studio.objects.bulk_create(
+            [Studio(name=name, slug=slug) for slug, name in all_studios.items()],
+            ignore_conflicts=True,
+        )
+        studio_ids = dict(Studio.objects.filter(slug__in=all_studios.keys()).values_list('slug', 'id'))
+
+        Through = Anime.studios.through
+        Through.objects.bulk_create(
+            [
+                Through(anime_id=anime_pk, studio_id=studio_ids[slug])
+                for anime_pk, studios in slugs_by_anime.items()
+                for slug in studios
+                if slug in studio_ids
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def _write_external_ids(self, records: Dict[int, Dict], pk_by_shikimori: Dict[int, int]):
+        external_ids.register(
+            (pk_by_shikimori[sid], source, external_id)
+            for sid, record in records.items()
+            if sid in pk_by_shikimori
+            for source, external_id in external_ids.anime_external_ids(
+                sid, record.get('mal_id'), record.get('anilist_id'))
+        )
+
+    @staticmethod
+    def _clean_value(field: str, value):
+        if value is None and field in ('title_ru', 'title_en', 'title_jp', 'description',
+                                       'poster_url', 'trailer_url'):
+            return ''
+        return value
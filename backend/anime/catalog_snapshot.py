@@ -0,0 +1,260 @@
+import gzip
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import external_ids
+from .import_journal import default_state_dir
+from .models import Anime, Genre, Studio
+
+FORMAT = 'animecore-catalog'
+# Версия формата файла; загрузчик читает все версии не новее своей
+VERSION = 1
+
+# Эти поля загрузчик всё равно выставит сам
+SKIP_FIELDS = {'id', 'created_at', 'updated_at'}
+
+
+def anime_fields() -> List[str]:
+    return [f.name for f in Anime._meta.concrete_fields if f.name not in SKIP_FIELDS]
+
+
+def last_export_until(state_dir: Optional[Path] = None) -> Optional[datetime]:
+    """Верхняя граница прошлой выгрузки - начало следующей инкрементальной"""
+    path = Path(state_dir or default_state_dir()) / 'catalog_export.json'
+    if not path.exists():
+        return None
+    return parse_datetime(json.loads(path.read_text(encoding='utf-8'))['until'])
+
+
+def _save_export_until(until: datetime, state_dir: Optional[Path] = None):
+    path = Path(state_dir or default_state_dir()) / 'catalog_export.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'until': until.isoformat()}), encoding='utf-8')
+
+
+def _json_value(value):
+    # Даты - в ISO; у poster_file values() отдаёт путь, сами файлы не переносятся
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class CatalogExporter:
+    """Потоковая выгрузка каталога в сжатый JSON Lines.
+
+    Файл: строка-заголовок (формат, версия, список полей Anime, границы
+    по updated_at), строка со всеми жанрами, строка со всеми студиями,
+    затем по строке-массиву на аниме (значения полей по порядку из
+    заголовка + ID жанров и студий этого файла) и финальная строка с
+    количеством записей - по ней загрузчик отличает оборванный файл.
+    Аниме читаются keyset-пагинацией по pk, в памяти одна пачка.
+
+    Переносятся только аниме с shikimori_id: по нему загрузчик
+    сопоставляет строки между базами.
+    """
+
+    def __init__(self, since: Optional[datetime] = None, batch_size: int = 2000):
+        self.since = since
+        self.batch_size = batch_size
+        self.stats = {'anime': 0, 'genres': 0, 'studios': 0}
+
+    def export(self, path: Path) -> Dict[str, int]:
+        # Граница берётся до чтения: то, что изменится во время выгрузки,
+        # попадёт и в следующую (upsert это переживёт)
+        until = timezone.now()
+        fields = anime_fields()
+
+        with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            def write(obj):
+                f.write(json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+            write({
+                'format': FORMAT,
+                'version': VERSION,
+                'created_at': until.isoformat(),
+                'since': self.since.isoformat() if self.since else None,
+                'until': until.isoformat(),
+                'anime_fields': fields,
+            })
+
+            genres = list(Genre.objects.order_by('pk').values_list('pk', 'name', 'slug'))
+            studios = list(Studio.objects.order_by('pk').values_list('pk', 'name', 'slug'))
+            write({'genres': genres})
+            write({'studios': studios})
+            self.stats['genres'] = len(genres)
+            self.stats['studios'] = len(studios)
+
+            for rows in self._anime_batches(fields, until):
+                for row in rows:
+                    write(row)
+                self.stats['anime'] += len(rows)
+                print(f"Выгружено аниме: {self.stats['anime']}")
+
+            write({'end': self.stats})
+
+        return dict(self.stats, until=until)
+
+    def _anime_batches(self, fields: List[str], until: datetime) -> Iterable[List[list]]:
+        queryset = Anime.objects.filter(shikimori_id__isnull=False, updated_at__lt=until)
+        if self.since:
+            queryset = queryset.filter(updated_at__gte=self.since)
+        queryset = queryset.order_by('pk')
+
+        last_pk = 0
+        while True:
+            objs = list(queryset.filter(pk__gt=last_pk).values('pk', *fields)[:self.batch_size])
+            if not objs:
+                return
+            last_pk = objs[-1]['pk']
+            pks = [obj['pk'] for obj in objs]
+
+            genres = self._links(Anime.genres.through, 'genre_id', pks)
+            studios = self._links(Anime.studios.through, 'studio_id', pks)
+            yield [
+                [_json_value(obj[name]) for name in fields] + [genres.get(obj['pk'], []), studios.get(obj['pk'], [])]
+                for obj in objs
+            ]
+
+    @staticmethod
+    def _links(through, column: str, pks: List[int]) -> Dict[int, List[int]]:
+        links: Dict[int, List[int]] = {}
+        for anime_pk, target_pk in through.objects.filter(anime_id__in=pks).values_list('anime_id', column):
+            links.setdefault(anime_pk, []).append(target_pk)
+        return links
+
+
+class CatalogLoader:
+    """Загрузка выгрузки CatalogExporter пачками bulk-вставок.
+
+    Аниме - upsert по shikimori_id через bulk_create_fast (COPY на
+    PostgreSQL), жанры и студии сопоставляются по имени и slug, связи
+    M2M каждой пачки заменяются целиком. Каждая пачка - своя транзакция.
+    """
+
+    def __init__(self, batch_size: int = 2000):
+        self.batch_size = batch_size
+        self.stats = {'anime': 0, 'genres': 0, 'studios': 0}
+
+    def load(self, path: Path) -> Dict:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != FORMAT:
+                raise ValueError(f"{path}: это не выгрузка каталога")
+            if header.get('version', 0) > VERSION:
+                raise ValueError(f"{path}: версия формата {header['version']} новее поддерживаемой {VERSION}")
+
+            # Поля, которых в этой схеме нет (выгрузка с более новой версии), пропускаются
+            known = set(anime_fields())
+            columns = [(i, name) for i, name in enumerate(header['anime_fields']) if name in known]
+            n_fields = len(header['anime_fields'])
+
+            genre_map = self._load_genres(json.loads(f.readline())['genres'])
+            studio_map = self._load_studios(json.loads(f.readline())['studios'])
+
+            batch = []
+            end = None
+            try:
+                for line in f:
+                    row = json.loads(line)
+                    if isinstance(row, dict):
+                        end = row.get('end')
+                        break
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        self._load_anime(batch, columns, n_fields, genre_map, studio_map)
+                        batch = []
+            except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+                # Оборванный файл: всё прочитанное целиком загружаем, ниже - ошибка
+                batch = batch if end is None else []
+            if batch:
+                self._load_anime(batch, columns, n_fields, genre_map, studio_map)
+
+        if end is None or end.get('anime') != self.stats['anime']:
+            raise ValueError(f"{path}: файл оборван, загружено {self.stats['anime']} аниме")
+        return dict(self.stats, since=header.get('since'), until=header.get('until'))
+
+    def _load_genres(self, genres: List[list]) -> Dict[int, int]:
+        Genre.objects.bulk_create(
+            [Genre(name=name, slug=slug) for _, name, slug in genres],
+            ignore_conflicts=True,
+        )
+        local = dict(Genre.objects.filter(name__in=[name for _, name, _ in genres]).values_list('name', 'pk'))
+        self.stats['genres'] = len(genres)
+        return {pk: local[name] for pk, name, _ in genres if name in local}
+
+    def _load_studios(self, studios: List[list]) -> Dict[int, int]:
+        Studio.objects.bulk_create(
+            [Studio(name=name, slug=slug) for _, name, slug in studios],
+            ignore_conflicts=True,
+        )
+        local = dict(Studio.objects.filter(slug__in=[slug for _, _, slug in studios]).values_list('slug', 'pk'))
+        self.stats['studios'] = len(studios)
+        return {pk: local[slug] for pk, _, slug in studios if slug in local}
+
+    def _load_anime(self, rows: List[list], columns, n_fields: int,
+                    genre_map: Dict[int, int], studio_map: Dict[int, int]):
+        objs = []
+        links = {}
+        for row in rows:
+            values = {name: Anime._meta.get_field(name).to_python(row[i]) for i, name in columns}
+            objs.append(Anime(**values))
+            links[values['shikimori_id']] = (row[n_fields], row[n_fields + 1])
+
+        with transaction.atomic():
+            Anime.objects.bulk_create_fast(objs, batch_size=self.batch_size, update_conflicts=True,
+                                           unique_fields=['shikimori_id'])
+            pk_by_shikimori = dict(
+                Anime.objects.filter(shikimori_id__in=links.keys()).values_list('shikimori_id', 'pk')
+            )
+            pks = list(pk_by_shikimori.values())
+
+            for field, id_map, column, index in ((Anime.genres, genre_map, 'genre_id', 0),
+                                                 (Anime.studios, studio_map, 'studio_id', 1)):
+                through = field.through
+                through.objects.filter(anime_id__in=pks).delete()
+                through.objects.bulk_create(
+                    [
+                        through(anime_id=pk_by_shikimori[sid], **{column: id_map[target]})
+                        for sid, targets in links.items()
+                        for target in targets[index]
+                        if target in id_map
+                    ],
+                    batch_size=self.batch_size,
+                    ignore_conflicts=True,
+                )
+
+            external_ids.register(
+                (pk_by_shikimori[obj.shikimori_id], source, external_id)
+                for obj in objs
+                for source, external_id in external_ids.anime_external_ids(obj.shikimori_id, obj.mal_id,
+                                                                           obj.anilist_id)
+            )
+
+        self.stats['anime'] += len(rows)
+        print(f"Загружено аниме: {self.stats['anime']}")
+
+
+def export_catalog(path: Path, since: Optional[datetime] = None, incremental: bool = False,
+                   batch_size: int = 2000) -> Dict:
+    """Выгрузить каталог; incremental - с границы прошлой выгрузки"""
+    if incremental and since is None:
+        since = last_export_until()
+    started = time.monotonic()
+    stats = CatalogExporter(since=since, batch_size=batch_size).export(path)
+    _save_export_until(stats['until'])
+    stats['seconds'] = round(time.monotonic() - started, 1)
+    return stats
+
+
+def load_catalog(path: Path, batch_size: int = 2000) -> Dict:
+    started = time.monotonic()
+    stats = CatalogLoader(batch_size=batch_size).load(path)
+    stats['seconds'] = round(time.monotonic() - started, 1)
+    return stats
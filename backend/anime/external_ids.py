@@ -0,0 +1,280 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+
+from .models import Anime, AnimeExternalId
+
+SOURCES = tuple(source for source, _ in AnimeExternalId.SOURCE_CHOICES)
+
+# Источники, ID которых хранятся и в самой модели Anime
+ANIME_ID_FIELDS = {
+    'shikimori': 'shikimori_id',
+    'mal': 'mal_id',
+    'anilist': 'anilist_id',
+}
+
+# Сколько ID в одном запросе IN (...): у SQLite лимит на число параметров
+RESOLVE_CHUNK = 500
+
+# Поля, которые при слиянии не переносятся с дубликата
+MERGE_SKIP_FIELDS = {'id', 'slug', 'search_text', 'created_at', 'updated_at'}
+
+
+def anime_external_ids(shikimori_id: Optional[int], mal_id: Optional[int],
+                       anilist_id: Optional[int]) -> List[Tuple[str, int]]:
+    """Пары (источник, ID) для аниме; ID Shikimori совпадают с MAL"""
+    pairs = []
+    if shikimori_id:
+        pairs.append(('shikimori', int(shikimori_id)))
+    if mal_id or shikimori_id:
+        pairs.append(('mal', int(mal_id or shikimori_id)))
+    if anilist_id:
+        pairs.append(('anilist', int(anilist_id)))
+    return pairs
+
+
+def register(rows: Iterable[Tuple[int, str, int]], batch_size: int = 1000) -> int:
+    """Записать соответствия (anime_pk, источник, внешний ID)
+
+    Upsert по (source, external_id): если внешний ID уже был привязан к
+    другому аниме, побеждает последняя запись.
+    """
+    objs = {
+        (source, int(external_id)): AnimeExternalId(anime_id=anime_pk, source=source,
+                                                    external_id=int(external_id))
+        for anime_pk, source, external_id in rows
+        if external_id
+    }
+    if not objs:
+        return 0
+
+    AnimeExternalId.objects.bulk_create(
+        list(objs.values()),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['source', 'external_id'],
+        update_fields=['anime'],
+    )
+    return len(objs)
+
+
+def sync_from_anime(batch_size: int = 2000) -> int:
+    """Заполнить таблицу соответствий по полям Anime (keyset по pk)"""
+    total = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            Anime.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'shikimori_id', 'mal_id', 'anilist_id')[:batch_size]
+        )
+        if not rows:
+            return total
+        last_pk = rows[-1][0]
+        total += register(
+            (pk, source, external_id)
+            for pk, shikimori_id, mal_id, anilist_id in rows
+            for source, external_id in anime_external_ids(shikimori_id, mal_id, anilist_id)
+        )
+        print(f"Соответствий записано: {total}")
+
+
+def resolve(source: str, external_ids: Iterable[int]) -> Dict[int, int]:
+    """Внешние ID одного источника -> pk аниме; ненайденных в ответе нет"""
+    if source not in SOURCES:
+        raise ValueError(f"Неизвестный источник: {source}")
+    wanted = list(dict.fromkeys(int(external_id) for external_id in external_ids))
+
+    found: Dict[int, int] = {}
+    for start in range(0, len(wanted), RESOLVE_CHUNK):
+        chunk = wanted[start:start + RESOLVE_CHUNK]
+        found.update(
+            AnimeExternalId.objects.filter(source=source, external_id__in=chunk)
+            .values_list('external_id', 'anime_id')
+        )
+
+    # Аниме, записанные до появления таблицы соответствий, ищем по полям модели
+    missing = [external_id for external_id in wanted if external_id not in found]
+    if missing and source in ANIME_ID_FIELDS:
+        found.update(_resolve_by_fields(source, missing))
+    return found
+
+
+def resolve_many(pairs: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], int]:
+    """Пары (источник, ID) вперемешку -> pk аниме; по запросу на источник"""
+    by_source: Dict[str, Set[int]] = {}
+    for source, external_id in pairs:
+        by_source.setdefault(source, set()).add(int(external_id))
+
+    found = {}
+    for source, external_ids in by_source.items():
+        for external_id, anime_pk in resolve(source, external_ids).items():
+            found[(source, external_id)] = anime_pk
+    return found
+
+
+def _resolve_by_fields(source: str, external_ids: List[int]) -> Dict[int, int]:
+    field = ANIME_ID_FIELDS[source]
+    found: Dict[int, int] = {}
+    for start in range(0, len(external_ids), RESOLVE_CHUNK):
+        chunk = external_ids[start:start + RESOLVE_CHUNK]
+        found.update(Anime.objects.filter(**{f'{field}__in': chunk}).values_list(field, 'pk'))
+        if source == 'mal':
+            # mal_id часто не заполнен, но совпадает с shikimori_id
+            rest = [external_id for external_id in chunk if external_id not in found]
+            found.update(
+                Anime.objects.filter(shikimori_id__in=rest, mal_id__isnull=True)
+                .values_list('shikimori_id', 'pk')
+            )
+    return found
+
+
+def find_duplicates() -> List[List[int]]:
+    """Группы pk аниме, которые по внешним ID - один и тот же тайтл
+
+    Ключи - MAL ID (mal_id, а без него shikimori_id) и anilist_id.
+    Повторы ищутся группировкой в БД, в память попадают только они;
+    группы, связанные общими ключами, склеиваются (union-find).
+    """
+    mal_key = Coalesce('mal_id', 'shikimori_id')
+    dup_mal = (
+        Anime.objects.annotate(mal_key=mal_key).filter(mal_key__isnull=False).order_by()
+        .values('mal_key').annotate(n=Count('pk')).filter(n__gt=1).values_list('mal_key', flat=True)
+    )
+    dup_anilist = (
+        Anime.objects.filter(anilist_id__isnull=False).order_by()
+        .values('anilist_id').annotate(n=Count('pk')).filter(n__gt=1).values_list('anilist_id', flat=True)
+    )
+    rows = list(
+        Anime.objects.annotate(mal_key=mal_key)
+        .filter(Q(mal_key__in=dup_mal) | Q(anilist_id__in=dup_anilist))
+        .values_list('pk', 'mal_key', 'anilist_id')
+    )
+
+    parent = {pk: pk for pk, _, _ in rows}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    first_by_key = {}
+    for pk, mal, anilist in rows:
+        for key in (('mal', mal), ('anilist', anilist)):
+            if key[1] is None:
+                continue
+            other = first_by_key.setdefault(key, pk)
+            parent[find(pk)] = find(other)
+
+    groups: Dict[int, List[int]] = {}
+    for pk in parent:
+        groups.setdefault(find(pk), []).append(pk)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+
+def pick_primary(group: List[Anime]) -> Anime:
+    """Кого оставить при слиянии: с shikimori_id, затем самую полную, затем старшую"""
+    def filled(anime: Anime) -> int:
+        return sum(1 for field in Anime._meta.concrete_fields
+                   if getattr(anime, field.attname) not in (None, '', [], {}))
+
+    return min(group, key=lambda anime: (anime.shikimori_id is None, -filled(anime), anime.pk))
+
+
+@transaction.atomic
+def merge_anime(primary: Anime, duplicates: List[Anime]) -> Dict[str, int]:
+    """Слить дубликаты в primary и удалить их
+
+    Все ссылки на дубликаты (FK и M2M из любых приложений - посты,
+    плейлисты, озвучки, внешние ID) переводятся на primary. Где это
+    нарушает уникальность (тайтл уже есть в плейлисте), строка дубликата
+    удаляется. Пустые поля primary заполняются значениями дубликатов.
+    """
+    dup_pks = [anime.pk for anime in duplicates]
+    stats = {'moved': 0, 'dropped': 0}
+
+    for rel in Anime._meta.related_objects:
+        if rel.many_to_many:
+            through = rel.through
+            column = rel.field.m2m_reverse_field_name()
+        else:
+            through = rel.related_model
+            column = rel.field.name
+        _repoint(through, column, dup_pks, primary.pk, stats)
+
+    # Собственные M2M (жанры, студии): объединяем наборы
+    for field in Anime._meta.many_to_many:
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        target_ids = set(through.objects.filter(**{f'{source}__in': dup_pks})
+                         .values_list(f'{target}_id', flat=True))
+        through.objects.bulk_create(
+            [through(**{f'{source}_id': primary.pk, f'{target}_id': target_id}) for target_id in target_ids],
+            ignore_conflicts=True,
+        )
+
+    filled = []
+    for field in Anime._meta.concrete_fields:
+        if field.name in MERGE_SKIP_FIELDS or getattr(primary, field.attname) not in (None, '', [], {}):
+            continue
+        for anime in duplicates:
+            value = getattr(anime, field.attname)
+            if value not in (None, '', [], {}):
+                setattr(primary, field.attname, value)
+                filled.append(field.name)
+                break
+
+    # Сначала удаляем дубликаты: shikimori_id уникален и может переезжать
+    Anime.objects.filter(pk__in=dup_pks).delete()
+    if filled:
+        primary.save(update_fields=filled + ['search_text', 'slug', 'year'])
+
+    register(
+        (primary.pk, source, external_id)
+        for source, external_id in anime_external_ids(primary.shikimori_id, primary.mal_id, primary.anilist_id)
+    )
+    stats['filled'] = len(filled)
+    return stats
+
+
+def _repoint(model, column: str, dup_pks: List[int], primary_pk: int, stats: Dict[str, int]):
+    rows = model.objects.filter(**{f'{column}__in': dup_pks})
+    try:
+        with transaction.atomic():
+            stats['moved'] += rows.update(**{column: primary_pk})
+        return
+    except IntegrityError:
+        pass
+
+    # Массовый перенос упёрся в уникальность - по одной строке
+    for pk in list(rows.values_list('pk', flat=True)):
+        try:
+            with transaction.atomic():
+                model.objects.filter(pk=pk).update(**{column: primary_pk})
+            stats['moved'] += 1
+        except IntegrityError:
+            model.objects.filter(pk=pk).delete()
+            stats['dropped'] += 1
+
+
+def merge_duplicates(dry_run: bool = False) -> Dict[str, int]:
+    """Найти и слить все дубликаты; dry_run - только показать группы"""
+    groups = find_duplicates()
+    stats = {'groups': len(groups), 'merged': 0, 'moved': 0, 'dropped': 0}
+
+    for pks in groups:
+        group = list(Anime.objects.filter(pk__in=pks))
+        primary = pick_primary(group)
+        duplicates = [anime for anime in group if anime.pk != primary.pk]
+        print(f"{primary} (#{primary.pk}) <- {[anime.pk for anime in duplicates]}")
+        if dry_run:
+            continue
+
+        merged = merge_anime(primary, duplicates)
+        stats['merged'] += len(duplicates)
+        stats['moved'] += merged['moved']
+        stats['dropped'] += merged['dropped']
+    return stats
@@ -0,0 +1,217 @@
+import json
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .memory_index import AnimeMemoryIndex, IndexHolder
+from .models import Anime
+from .search_keys import normalize_query
+
+TOKEN_RE = re.compile(r'\w+')
+
+PG_INDEX = 'anime_anime_search_trgm'
+
+# Доля триграмм запроса, которая должна найтись в названии. На PostgreSQL
+# тем же значением задаётся pg_trgm.word_similarity_threshold (по умолчанию
+# 0.6), по которому фильтрует оператор <%
+FUZZY_THRESHOLD = 0.5
+# Больше нечётких совпадений не нужно: дальше идёт шум
+MAX_FUZZY_RESULTS = 200
+# Короче - почти всё совпадает со всем
+MIN_QUERY_LENGTH = 3
+# Триграмма, которая есть у такой доли каталога, считается частой
+FREQUENT_GRAM_SHARE = 0.05
+
+# Прибавка к похожести: до +20% за оценку и до +10% за популярность
+SCORE_BOOST = 0.2
+POPULARITY_BOOST = 0.1
+POPULARITY_SCALE = 1_000_000
+
+def install_trgm(connection, concurrently: bool = False) -> bool:
+    """pg_trgm и GIN-индекс по search_text; на остальных СУБД - индекс в памяти"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {PG_INDEX} "
+            f"ON anime_anime USING GIN (search_text gin_trgm_ops)"
+        )
+    return True
+
+
+def uninstall_trgm(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы как в pg_trgm: по словам, с двумя пробелами в начале и одним в конце"""
+    grams = set()
+    for word in TOKEN_RE.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def boost(score: Optional[float], popularity: Optional[int]) -> float:
+    popularity_norm = min(math.log1p(max(popularity or 0, 0)) / math.log1p(POPULARITY_SCALE), 1.0)
+    return 1 + SCORE_BOOST * (score or 0) / 10 + POPULARITY_BOOST * popularity_norm
+
+
+class TrigramIndex(AnimeMemoryIndex):
+    """Инвертированный триграммный индекс названий в памяти процесса.
+
+    Для каждой триграммы - массив позиций документов, где она есть.
+    Поиск суммирует вхождения по спискам триграмм запроса (Counter
+    считает в C), так что стоимость - длина этих списков, а не размер
+    каталога. Изменившиеся аниме (по updated_at) дописываются новыми
+    позициями; старые позиции и удалённые из базы аниме помечаются мёртвыми.
+    """
+
+    fields = ('pk', 'search_text', 'score', 'popularity')
+
+    def __init__(self):
+        super().__init__()
+        self.postings: Dict[str, array] = {}
+        self.pks = array('q')
+        self.boosts = array('d')
+        self.alive = bytearray()
+        self.position: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.position)
+
+    def dead_count(self) -> int:
+        return len(self.pks) - len(self.position)
+
+    def live_pks(self):
+        return self.position.keys()
+
+    def _remove(self, pk: int):
+        old = self.position.pop(pk, None)
+        if old is not None:
+            self.alive[old] = 0
+
+    def _add(self, row: tuple):
+        pk, search_text, score, popularity = row
+        self._remove(pk)
+
+        pos = len(self.pks)
+        self.pks.append(pk)
+        self.boosts.append(boost(score, popularity))
+        self.alive.append(1)
+        self.position[pk] = pos
+        for gram in trigrams(search_text or ''):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array('I')
+            postings.append(pos)
+
+    def search(self, query: str, limit: int = MAX_FUZZY_RESULTS,
+               threshold: float = FUZZY_THRESHOLD) -> List[Tuple[int, float]]:
+        """[(pk, ранг)] лучших совпадений: доля триграмм запроса в названии × прибавка"""
+        grams = trigrams(normalize_query(query))
+        if not grams:
+            return []
+        min_shared = max(math.ceil(threshold * len(grams)), 1)
+
+        with self._lock:
+            # Триграммы, которые есть у большой доли каталога (« на», «ть »),
+            # почти ничего не различают, а считать их дороже всего. Если
+            # редких достаточно для порога, кандидатов набираем по редким,
+            # а частые проверяем бинарным поиском только у них: позиции в
+            # списках возрастают. Похожесть при этом точная; не находятся
+            # лишь названия, где совпали одни частые триграммы.
+            known = sorted((self.postings[gram] for gram in grams if gram in self.postings), key=len)
+            frequent_limit = max(len(self.position) * FREQUENT_GRAM_SHARE, 1)
+            rare = [postings for postings in known if len(postings) <= frequent_limit]
+            frequent = known[len(rare):] if len(rare) >= min_shared else []
+            if not frequent:
+                rare = known
+
+            counts = Counter()
+            for postings in rare:
+                counts.update(postings)
+            if len(counts) * len(frequent) * 4 > sum(map(len, frequent)):
+                # Кандидатов много - дешевле досчитать частые целиком
+                for postings in frequent:
+                    counts.update(postings)
+                frequent = []
+
+            alive, boosts, pks = self.alive, self.boosts, self.pks
+            scored = []
+            for pos, shared in counts.items():
+                if shared + len(frequent) < min_shared or not alive[pos]:
+                    continue
+                for postings in frequent:
+                    i = bisect_left(postings, pos)
+                    if i < len(postings) and postings[i] == pos:
+                        shared += 1
+                if shared >= min_shared:
+                    scored.append((shared / len(grams) * boosts[pos], pks[pos]))
+        scored.sort(reverse=True)
+        return [(pk, rank) for rank, pk in scored[:limit]]
+
+
+_holder = IndexHolder(TrigramIndex)
+
+
+def get_trigram_index() -> TrigramIndex:
+    """Общий на процесс индекс; строится при первом нечётком поиске"""
+    return _holder.get()
+
+
+def fuzzy_search(queryset, query: str):
+    """Нечёткий поиск по названиям с опечатками, ранг в search_rank
+
+    PostgreSQL - word_similarity из pg_trgm по GIN-индексу, остальные
+    СУБД - TrigramIndex в памяти процесса. Похожесть умножается на
+    прибавку за оценку и популярность.
+    """
+    if len(query.strip()) < MIN_QUERY_LENGTH:
+        return queryset.none()
+
+    ordering = ['-search_rank', *Anime._meta.ordering, 'pk']
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        normalized = normalize_query(query)
+        # Порог сессии: <% сравнивает с ним, а не с аргументом
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                           [str(FUZZY_THRESHOLD)])
+        # log(1 + популярность) / log(1 + POPULARITY_SCALE), не больше 1
+        popularity_norm = (f"LEAST(LN(1 + GREATEST(COALESCE(anime_anime.popularity, 0), 0)) "
+                           f"/ LN(1 + {POPULARITY_SCALE}), 1)")
+        rank = (f"word_similarity(%s, anime_anime.search_text) * (1 + {SCORE_BOOST} * "
+                f"COALESCE(anime_anime.score, 0) / 10 + {POPULARITY_BOOST} * {popularity_norm})")
+        return (
+            queryset
+            .filter(RawSQL("%s <%% anime_anime.search_text", [normalized], output_field=BooleanField()))
+            .annotate(search_rank=RawSQL(rank, [normalized], output_field=FloatField()))
+            .order_by(*ordering)
+        )
+
+    found = get_trigram_index().search(query)
+    if not found:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        # Ранги одним JSON-параметром: CASE на сотни веток Django собирает слишком долго
+        rank = RawSQL("json_extract(%s, '$.\"' || anime_anime.id || '\"')",
+                      [json.dumps({str(pk): rank for pk, rank in found})], output_field=FloatField())
+    else:
+        rank = Case(*[When(pk=pk, then=Value(rank)) for pk, rank in found], output_field=FloatField())
+    return (
+        queryset
+        .filter(pk__in=[pk for pk, _ in found])
+        .annotate(search_rank=rank)
+        .order_by(*ordering)
+    )
@@ -0,0 +1,192 @@
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: без блокировки, параллельные импортёры там не запускаются
+    fcntl = None
+
+from .import_journal import default_state_dir
+from .models import Anime
+
+MAGIC = b'SIDB'
+VERSION = 1
+HEADER = struct.Struct('<4sBI')
+
+
+def _bits(data: bytes, n: int) -> int:
+    # Битовая карта как одно большое число: ИЛИ по всей карте - одна операция
+    return int.from_bytes(data[:n].ljust(n, b'\0'), 'little')
+
+
+class ShikimoriIdBitmap:
+    """Битовые карты пространства ID Shikimori.
+
+    Два бита на ID: "есть в базе" и "точно не существует" (ответ 404).
+    Файл на диске - заголовок и два сырых массива байт, так что на
+    500 000 ID это ~125 КБ, которые читаются за миллисекунды. Проверка
+    существования превращается в проверку бита вместо запроса в БД.
+    """
+
+    DEFAULT_SIZE = 500000
+
+    def __init__(self, path: Optional[Path] = None, size: int = DEFAULT_SIZE):
+        self.path = Path(path) if path else default_state_dir() / 'shikimori_ids.bitmap'
+        self.size = size
+        self.present = bytearray((size + 8) // 8)
+        self.missing = bytearray((size + 8) // 8)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._missing_cleared = False
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> 'ShikimoriIdBitmap':
+        """Прочитать карту с диска; биты "есть в базе" всегда сверяются с БД
+
+        Строки могли удалить после прошлого сохранения (например, слиянием
+        дублей), и такие ID должны снова импортироваться. Биты 404 берутся
+        из файла как есть.
+        """
+        bitmap = cls(path)
+        exists = bitmap.path.exists()
+        if exists:
+            bitmap.size, bitmap.present, bitmap.missing = bitmap._read()
+        bitmap.rebuild_from_db()
+        if not exists:
+            bitmap.save()
+        return bitmap
+
+    def _read(self) -> Tuple[int, bytearray, bytearray]:
+        data = self.path.read_bytes()
+        magic, version, size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{self.path}: неизвестный формат карты ID')
+        n = (size + 8) // 8
+        return (size, bytearray(data[HEADER.size:HEADER.size + n]),
+                bytearray(data[HEADER.size + n:HEADER.size + 2 * n]))
+
+    def rebuild_from_db(self):
+        """Заново заполнить биты "есть в базе" по таблице Anime"""
+        with self._lock:
+            self.present = bytearray(len(self.present))
+        ids = Anime.objects.filter(
+            shikimori_id__isnull=False
+        ).values_list('shikimori_id', flat=True).iterator(chunk_size=10000)
+        self.mark_present(ids)
+
+    @contextmanager
+    def _file_lock(self):
+        """Эксклюзивная блокировка файла карты между процессами (воркеры аренд пишут одну карту)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.lock'), 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self):
+        """Атомарно записать карту на диск, объединив её с тем, что там уже есть
+
+        Под блокировкой файла биты с диска (их мог записать другой процесс)
+        складываются с нашими через ИЛИ, так что параллельные импортёры не
+        теряют отметки друг друга. После clear_missing биты 404 с диска не
+        берутся.
+        """
+        with self._lock:
+            size = self.size
+            present, missing = bytes(self.present), bytes(self.missing)
+            keep_disk_missing = not self._missing_cleared
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+        with self._file_lock():
+            if self.path.exists():
+                disk_size, disk_present, disk_missing = self._read()
+                size = max(size, disk_size)
+                n = (size + 8) // 8
+                present_bits = _bits(present, n) | _bits(disk_present, n)
+                missing_bits = _bits(missing, n)
+                if keep_disk_missing:
+                    missing_bits |= _bits(disk_missing, n)
+                present = present_bits.to_bytes(n, 'little')
+                missing = (missing_bits & ~present_bits).to_bytes(n, 'little')
+
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_bytes(HEADER.pack(MAGIC, VERSION, size) + present + missing)
+            os.replace(tmp_path, self.path)
+        self._missing_cleared = False
+
+    def checkpoint(self, min_interval: float = 5.0):
+        """Сохранить, если есть изменения и с прошлого сохранения прошло min_interval"""
+        if self._dirty and time.monotonic() - self._saved_at >= min_interval:
+            self.save()
+
+    def _grow(self, anime_id: int):
+        if anime_id <= self.size:
+            return
+        size = max(anime_id, self.size * 2)
+        extra = (size + 8) // 8 - len(self.present)
+        self.present.extend(bytes(extra))
+        self.missing.extend(bytes(extra))
+        self.size = size
+
+    @staticmethod
+    def _test(bits: bytearray, anime_id: int) -> bool:
+        index = anime_id >> 3
+        return index < len(bits) and bool(bits[index] & (1 << (anime_id & 7)))
+
+    def is_present(self, anime_id: int) -> bool:
+        return self._test(self.present, anime_id)
+
+    def is_missing(self, anime_id: int) -> bool:
+        return self._test(self.missing, anime_id)
+
+    def is_known(self, anime_id: int) -> bool:
+        return self.is_present(anime_id) or self.is_missing(anime_id)
+
+    def mark_present(self, anime_ids: Iterable[int]):
+        with self._lock:
+            for anime_id in anime_ids:
+                self._grow(anime_id)
+                mask = 1 << (anime_id & 7)
+                self.present[anime_id >> 3] |= mask
+                self.missing[anime_id >> 3] &= ~mask & 0xFF
+            self._dirty = True
+
+    def mark_missing(self, anime_ids: Iterable[int]):
+        with self._lock:
+            for anime_id in anime_ids:
+                self._grow(anime_id)
+                self.missing[anime_id >> 3] |= 1 << (anime_id & 7)
+            self._dirty = True
+
+    def clear_missing(self):
+        """Забыть все 404 (например, чтобы перепроверить новые анонсы)"""
+        with self._lock:
+            self.missing = bytearray(len(self.missing))
+            self._missing_cleared = True
+            self._dirty = True
+
+    def filter_unknown(self, anime_ids: Iterable[int]) -> List[int]:
+        """Оставить ID, которых нет в базе и которые не отвечали 404"""
+        return [aid for aid in anime_ids if not self.is_known(aid)]
+
+    def filter_absent(self, anime_ids: Iterable[int]) -> List[int]:
+        """Оставить ID, которых нет в базе (404 не учитываются)"""
+        return [aid for aid in anime_ids if not self.is_present(aid)]
+
+    def count_present(self) -> int:
+        return sum(bin(b).count('1') for b in self.present)
+
+    def count_missing(self) -> int:
+        return sum(bin(b).count('1') for b in self.missing)
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+
+def default_state_dir() -> Path:
+    return Path(getattr(settings, 'IMPORT_STATE_DIR', settings.BASE_DIR / 'import_state'))
+
+
+class ImportJournal:
+    """Append-only журнал чекпоинтов массового импорта.
+
+    Каждая строка файла - JSON-запись о завершённом диапазоне ID
+    конкретной стратегии. Запуск с resume пропускает диапазоны,
+    завершённые после последнего маркера "start"; запуск без resume
+    проходит всё заново, но накопленный прогресс не стирает. Маркер
+    "start" пишется только по явному reset.
+    """
+
+    def __init__(self, name: str = 'mass_import', resume: bool = False, state_dir: Optional[Path] = None,
+                 reset: bool = False):
+        state_dir = Path(state_dir) if state_dir else default_state_dir()
+        state_dir.mkdir(parents=True, exist_ok=True)
+
+        self.path = state_dir / f'{name}.journal.jsonl'
+        self._lock = threading.Lock()
+        self._done: Dict[str, Dict[Tuple[int, int], int]] = {}
+
+        if resume and not reset:
+            self._load()
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._append({'event': 'start' if reset else 'resume' if resume else 'run'})
+
+    def _load(self):
+        if not self.path.exists():
+            return
+
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после падения
+                    continue
+
+                if entry.get('event') == 'start':
+                    self._done = {}
+                elif 'strategy' in entry:
+                    start, end = entry['range']
+                    self._done.setdefault(entry['strategy'], {})[(start, end)] = entry.get('imported', 0)
+
+    def _append(self, entry: Dict):
+        entry['at'] = datetime.now().isoformat(timespec='seconds')
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def is_done(self, strategy: str, start: int, end: int) -> bool:
+        """Покрыт ли диапазон [start, end] одним из завершённых"""
+        return any(
+            done_start <= start and end <= done_end
+            for done_start, done_end in self._done.get(strategy, {})
+        )
+
+    def mark_done(self, strategy: str, start: int, end: int, imported: int = 0):
+        """Записать завершённый диапазон"""
+        with self._lock:
+            self._done.setdefault(strategy, {})[(start, end)] = imported
+            self._append({'strategy': strategy, 'range': [start, end], 'imported': imported})
+
+    def done_ranges(self, strategy: str) -> List[Tuple[int, int]]:
+        return sorted(self._done.get(strategy, {}))
+
+    def imported_total(self, strategy: str) -> int:
+        return sum(self._done.get(strategy, {}).values())
+
+    def close(self):
+        self._file.close()
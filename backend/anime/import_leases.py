@@ -0,0 +1,213 @@
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Min, Q, Sum
+from django.utils import timezone
+
+from parsers.rate_limit import configure_limiter
+from .mass_import import MassAnimeImporter
+from .models import ImportLease
+
+# После стольких неудачных попыток диапазон помечается failed
+MAX_ATTEMPTS = 5
+# Пауза перед повтором диапазона с ошибками, умножается на номер попытки
+RETRY_DELAY = 60
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def plan_ranges(start_id: int, end_id: int, range_size: int = 5000, plan: str = 'shikimori') -> int:
+    """Нарезать [start_id, end_id] на диапазоны; уже существующие не трогаются"""
+    leases = [
+        ImportLease(plan=plan, start_id=start, end_id=min(start + range_size - 1, end_id))
+        for start in range(start_id, end_id + 1, range_size)
+    ]
+    before = ImportLease.objects.filter(plan=plan).count()
+    ImportLease.objects.bulk_create(leases, batch_size=1000, ignore_conflicts=True)
+    return ImportLease.objects.filter(plan=plan).count() - before
+
+
+def _available(now) -> Q:
+    # У pending после ошибки leased_until - время, раньше которого повторять не нужно
+    return (
+        Q(status='pending', leased_until__isnull=True)
+        | Q(status__in=['pending', 'leased'], leased_until__lt=now)
+    )
+
+
+def acquire(owner: str, plan: str = 'shikimori', ttl: int = 600) -> Optional[ImportLease]:
+    """Захватить свободный или просроченный диапазон
+
+    Захват - условный UPDATE (compare-and-set по статусу и сроку аренды),
+    так что два воркера не получат один диапазон ни на одной СУБД.
+    """
+    while True:
+        now = timezone.now()
+        candidates = list(
+            ImportLease.objects.filter(_available(now), plan=plan)
+            .order_by('start_id').values_list('pk', flat=True)[:20]
+        )
+        if not candidates:
+            return None
+
+        for pk in candidates:
+            won = ImportLease.objects.filter(_available(now), pk=pk).update(
+                status='leased',
+                owner=owner,
+                leased_until=now + timedelta(seconds=ttl),
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if won:
+                return ImportLease.objects.get(pk=pk)
+
+
+def renew(lease: ImportLease, ttl: int = 600) -> bool:
+    """Продлить аренду; False - диапазон уже забрал другой воркер"""
+    now = timezone.now()
+    return bool(ImportLease.objects.filter(pk=lease.pk, owner=lease.owner, status='leased').update(
+        leased_until=now + timedelta(seconds=ttl), updated_at=now,
+    ))
+
+
+def complete(lease: ImportLease, attempted: int, imported: int, errors: int) -> str:
+    """Закрыть аренду: done, либо обратно в pending (или failed), если были ошибки"""
+    now = timezone.now()
+    retry_at = None
+    if not errors:
+        status = 'done'
+    elif lease.attempts >= MAX_ATTEMPTS:
+        status = 'failed'
+    else:
+        # Повтор дёшев: загруженные и 404 уже в битовой карте и не запрашиваются
+        status = 'pending'
+        retry_at = now + timedelta(seconds=RETRY_DELAY * lease.attempts)
+
+    ImportLease.objects.filter(pk=lease.pk, owner=lease.owner).update(
+        status=status,
+        leased_until=retry_at,
+        attempted=attempted,
+        imported=imported,
+        errors=errors,
+        updated_at=now,
+    )
+    return status
+
+
+def release(lease: ImportLease):
+    """Вернуть диапазон без результата (воркер останавливается)"""
+    ImportLease.objects.filter(pk=lease.pk, owner=lease.owner, status='leased').update(
+        status='pending', leased_until=None, updated_at=timezone.now(),
+    )
+
+
+def progress(plan: str = 'shikimori') -> Dict:
+    """Сводный прогресс по всем воркерам"""
+    leases = ImportLease.objects.filter(plan=plan)
+    by_status = {status: 0 for status, _ in ImportLease.STATUS_CHOICES}
+    for status in leases.values_list('status', flat=True):
+        by_status[status] += 1
+
+    totals = leases.aggregate(
+        attempted=Sum('attempted'), imported=Sum('imported'), errors=Sum('errors'),
+        started=Min('created_at'),
+    )
+    ranges = sum(by_status.values())
+    now = timezone.now()
+    elapsed = (now - totals['started']).total_seconds() if totals['started'] else 0
+    imported = totals['imported'] or 0
+
+    return {
+        'plan': plan,
+        'ranges': ranges,
+        'by_status': by_status,
+        'done_percent': round(by_status['done'] * 100 / ranges, 1) if ranges else 0.0,
+        'attempted': totals['attempted'] or 0,
+        'imported': imported,
+        'errors': totals['errors'] or 0,
+        'imported_per_second': round(imported / elapsed, 2) if elapsed else 0.0,
+        'workers': list(
+            leases.filter(status='leased', leased_until__gte=now)
+            .values_list('owner', flat=True).distinct()
+        ),
+    }
+
+
+class LeaseWorker:
+    """Воркер распределённого импорта: берёт диапазоны, пока они есть.
+
+    Пока диапазон грузится, фоновый поток продлевает аренду каждые
+    ttl/3 секунд. Сам импорт - MassAnimeImporter с конвейером, так что
+    внутри воркера работают те же движки загрузки и один писатель в БД.
+    Лимитер у каждого процесса свой: масштабирование идёт за счёт разных
+    машин (и адресов), а не потоков на одной.
+    """
+
+    def __init__(self, plan: str = 'shikimori', owner: Optional[str] = None, engine: str = 'graphql',
+                 max_workers: int = 20, ttl: int = 600, rate: Optional[float] = None):
+        self.plan = plan
+        self.owner = owner or default_owner()
+        self.engine = engine
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.stats = {'ranges': 0, 'attempted': 0, 'imported': 0, 'errors': 0}
+        if rate:
+            # Свой лимит к Shikimori (например, для локального стенда)
+            configure_limiter(settings.SHIKIMORI_URL, rate=rate, burst=max(int(rate), 1))
+
+    def run(self, max_ranges: Optional[int] = None) -> Dict[str, int]:
+        while max_ranges is None or self.stats['ranges'] < max_ranges:
+            lease = acquire(self.owner, plan=self.plan, ttl=self.ttl)
+            if lease is None:
+                break
+            self.run_lease(lease)
+        return self.stats
+
+    def run_lease(self, lease: ImportLease) -> str:
+        print(f"[{self.owner}] Диапазон {lease.start_id}-{lease.end_id} (попытка {lease.attempts})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(lease, stop), daemon=True)
+        heartbeat.start()
+
+        # Чекпоинты здесь - таблица аренд, журнал mass_import не трогаем
+        importer = MassAnimeImporter(max_workers=self.max_workers, engine=self.engine,
+                                     report_interval=None, resolve_posters=False,
+                                     journal_name='distributed_import')
+        try:
+            importer._import_stream(range(lease.start_id, lease.end_id + 1))
+        except BaseException:
+            release(lease)
+            raise
+        finally:
+            stop.set()
+            heartbeat.join()
+            importer.bitmap.save()
+            importer.journal.close()
+            if importer.payload_cache:
+                importer.payload_cache.close()
+
+        stats = importer.stats
+        status = complete(lease, stats['total_attempted'], stats['total_imported'], stats['errors'])
+        self.stats['ranges'] += 1
+        self.stats['attempted'] += stats['total_attempted']
+        self.stats['imported'] += stats['total_imported']
+        self.stats['errors'] += stats['errors']
+        print(f"[{self.owner}] Диапазон {lease.start_id}-{lease.end_id}: {status}, "
+              f"импортировано {stats['total_imported']}, ошибок {stats['errors']}")
+        return status
+
+    def _heartbeat(self, lease: ImportLease, stop: threading.Event):
+        try:
+            while not stop.wait(self.ttl / 3):
+                if not renew(lease, self.ttl):
+                    print(f"[{self.owner}] Аренда {lease.start_id}-{lease.end_id} потеряна")
+                    return
+        finally:
+            connection.close()
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class LatencyHistogram:
+    """Гистограмма длительностей с фиксированными корзинами (мс)"""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        index = len(self.BUCKETS_MS)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        """Оценка перцентиля по верхней границе корзины, мс"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Верхняя граница корзины не может быть больше наблюдённого максимума
+                return min(float(self.BUCKETS_MS[i]), self.max) if i < len(self.BUCKETS_MS) else self.max
+        return self.max
+
+    def as_dict(self) -> Dict:
+        buckets = {f'le_{bound}': n for bound, n in zip(self.BUCKETS_MS, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 2) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 2),
+            'buckets': buckets,
+        }
+
+
+class ImportMetrics:
+    """Метрики массового импорта по стадиям конвейера.
+
+    Копит латентность загрузки, HTTP-статусы, время нормализации и
+    записи, глубину очередей и счётчики строк. Потокобезопасен: в него
+    пишут и загрузчики, и стадии конвейера. Вместо строки на каждое
+    аниме печатает сводку не чаще раза в report_interval секунд.
+    """
+
+    def __init__(self, report_interval: Optional[float] = 5.0):
+        self.report_interval = report_interval
+        self.fetch_latency = LatencyHistogram()
+        self.normalize_time = LatencyHistogram()
+        self.write_time = LatencyHistogram()
+        self.statuses = Counter()
+        self.counters = Counter()
+        self.queues: Dict[str, Dict[str, int]] = {}
+        self.started_at = datetime.now()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._reported_at = self._started
+        self._reported_rows = 0
+
+    def observe_fetch(self, status: int, seconds: Optional[float] = None):
+        """Ответ апстрима; статус 0 - сетевая ошибка"""
+        with self._lock:
+            self.statuses[str(status)] += 1
+            if seconds is not None:
+                self.fetch_latency.observe(seconds)
+
+    def observe_normalize(self, seconds: float):
+        with self._lock:
+            self.normalize_time.observe(seconds)
+
+    def observe_write(self, rows: int, seconds: float):
+        """Один flush в БД"""
+        with self._lock:
+            self.write_time.observe(seconds)
+            self.counters['flushes'] += 1
+            self.counters['rows_written'] += rows
+
+    def observe_queue(self, name: str, depth: int):
+        with self._lock:
+            queue_stats = self.queues.setdefault(name, {'last': 0, 'max': 0})
+            queue_stats['last'] = depth
+            queue_stats['max'] = max(queue_stats['max'], depth)
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def rows_per_second(self) -> float:
+        return self.counters['rows_written'] / max(self.elapsed(), 1e-6)
+
+    def progress_line(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            rows = self.counters['rows_written']
+            window = max(now - self._reported_at, 1e-6)
+            current_rate = (rows - self._reported_rows) / window
+            self._reported_at = now
+            self._reported_rows = rows
+
+            queues = ' '.join(f"{name}={q['last']}" for name, q in sorted(self.queues.items()))
+            return (
+                f"⏱  {int(self.elapsed())}с | записано {rows} "
+                f"({current_rate:.1f}/с, в среднем {self.rows_per_second():.1f}/с) | "
+                f"404: {self.counters['missing']} | ошибок: {self.counters['errors']} | "
+                f"fetch p50/p95: {self.fetch_latency.percentile(50):.0f}/"
+                f"{self.fetch_latency.percentile(95):.0f} мс | очереди: {queues or '-'}"
+            )
+
+    def maybe_report(self, force: bool = False):
+        """Напечатать строку прогресса, если подошло время"""
+        if self.report_interval is None and not force:
+            return
+        if not force and time.monotonic() - self._reported_at < self.report_interval:
+            return
+        print(self.progress_line(), flush=True)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'elapsed_seconds': round(self.elapsed(), 3),
+                'rows_per_second': round(self.rows_per_second(), 2),
+                'counters': dict(self.counters),
+                'http_statuses': dict(self.statuses),
+                'fetch_latency': self.fetch_latency.as_dict(),
+                'normalize_time': self.normalize_time.as_dict(),
+                'write_time': self.write_time.as_dict(),
+                'queues': {name: dict(q) for name, q in self.queues.items()},
+            }
+
+    def write_report(self, path: Path, **extra) -> Path:
+        """Сохранить машиночитаемый отчёт о прогоне в JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.as_dict()
+        report.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
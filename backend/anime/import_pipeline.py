@@ -0,0 +1,217 @@
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection
+
+from .bulk_writer import AnimeBulkWriter
+from .import_metrics import ImportMetrics
+
+# (shikimori_id, http-статус, json); статус 0 - сетевая ошибка
+FetchResult = Tuple[int, int, Optional[Dict]]
+
+_DONE = object()
+
+
+def iter_fetch_threaded(fetch_one: Callable[[int], Tuple[int, Optional[Dict]]],
+                        anime_ids: Iterable[int], workers: int = 20) -> Iterator[FetchResult]:
+    """Загрузка пулом потоков с ограниченным числом запросов в полёте
+
+    fetch_one(id) возвращает (статус, json) и не должен трогать БД.
+    """
+    ids = iter(anime_ids)
+
+    def call(anime_id):
+        try:
+            return (anime_id,) + tuple(fetch_one(anime_id))
+        except Exception:
+            return anime_id, 0, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        while True:
+            # Не больше двух задач на поток, чтобы не вычитывать весь список ID
+            for anime_id in ids:
+                in_flight.add(executor.submit(call, anime_id))
+                if len(in_flight) >= workers * 2:
+                    break
+
+            if not in_flight:
+                return
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+class ImportPipeline:
+    """Конвейер импорта: загрузка → нормализация → запись.
+
+    Каждая стадия - отдельный поток, между ними ограниченные очереди,
+    так что быстрая стадия упирается в медленную, а не копит память.
+    С базой работает только поток записи: он владеет единственным
+    соединением и закрывает его по завершении. Он же отмечает в
+    ImportMetrics глубину очередей и печатает строку прогресса.
+    """
+
+    def __init__(self, fetcher: Callable[[Iterable[int]], Iterator[FetchResult]],
+                 normalize: Callable[[int, Dict], Dict],
+                 writer: AnimeBulkWriter,
+                 metrics: Optional[ImportMetrics] = None,
+                 queue_size: int = 1000,
+                 flush_every: int = 500,
+                 idle_flush: float = 2.0):
+        self.fetcher = fetcher
+        self.normalize = normalize
+        self.writer = writer
+        self.metrics = metrics or ImportMetrics(report_interval=None)
+        self.queue_size = queue_size
+        self.flush_every = flush_every
+        self.idle_flush = idle_flush
+        self.stats = {'fetched': 0, 'missing': 0, 'errors': 0, 'written': 0}
+
+    def run(self, anime_ids: Iterable[int],
+            on_missing: Optional[Callable[[List[int]], None]] = None,
+            on_settled: Optional[Callable[[List[int]], None]] = None) -> int:
+        """Прогнать ID через конвейер, вернуть число записанных аниме
+
+        on_missing получает ID, ответившие 404. on_settled вызывается из
+        потока записи после каждого flush со всеми ID, чья судьба уже
+        зафиксирована (записаны, 404 или ошибка) - по нему удобно вести
+        журнал завершённых диапазонов.
+        """
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        fetched = queue.Queue(maxsize=self.queue_size)
+        normalized = queue.Queue(maxsize=self.queue_size)
+
+        threads = [
+            threading.Thread(target=self._guard, args=(self._fetch_stage, anime_ids, fetched),
+                             name='import-fetch', daemon=True),
+            threading.Thread(target=self._guard, args=(self._normalize_stage, fetched, normalized),
+                             name='import-normalize', daemon=True),
+            threading.Thread(target=self._guard,
+                             args=(self._write_stage, normalized, fetched, on_missing, on_settled),
+                             name='import-write', daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.metrics.maybe_report(force=self.metrics.report_interval is not None)
+
+        if self._errors:
+            raise self._errors[0]
+        return self.stats['written']
+
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except BaseException as e:
+            # Падение любой стадии останавливает весь конвейер
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue, idle: Optional[float] = None):
+        """Следующий элемент очереди; None, если за idle секунд ничего не пришло"""
+        waited = 0.0
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                waited += 0.5
+                if idle is not None and waited >= idle:
+                    return None
+        return _DONE
+
+    def _fetch_stage(self, anime_ids, out: queue.Queue):
+        results = self.fetcher(anime_ids)
+        try:
+            for result in results:
+                if not self._put(out, result):
+                    return
+        finally:
+            results.close()
+            self._put(out, _DONE)
+
+    def _normalize_stage(self, inp: queue.Queue, out: queue.Queue):
+        while True:
+            item = self._get(inp)
+            if item is _DONE:
+                break
+
+            anime_id, status, data = item
+            record = None
+            if status == 200 and data:
+                started = time.monotonic()
+                try:
+                    record = self.normalize(anime_id, data)
+                except Exception:
+                    status = 0
+                self.metrics.observe_normalize(time.monotonic() - started)
+
+            if not self._put(out, (anime_id, status, record)):
+                return
+
+        self._put(out, _DONE)
+
+    def _write_stage(self, inp: queue.Queue, fetched: queue.Queue, on_missing, on_settled):
+        settled: List[int] = []
+        missing: List[int] = []
+
+        def flush():
+            self.writer.flush()
+            if missing and on_missing:
+                on_missing(list(missing))
+            if settled and on_settled:
+                on_settled(list(settled))
+            settled.clear()
+            missing.clear()
+
+        try:
+            while True:
+                item = self._get(inp, idle=self.idle_flush)
+                if item is _DONE:
+                    break
+                if item is None:
+                    # Поток ID иссяк на время - фиксируем то, что уже есть
+                    flush()
+                    continue
+
+                anime_id, status, record = item
+                if record is not None:
+                    self.writer.add(record)
+                    outcome = 'written'
+                elif status == 404:
+                    missing.append(anime_id)
+                    outcome = 'missing'
+                else:
+                    outcome = 'errors'
+                self.stats[outcome] += 1
+                self.stats['fetched'] += 1
+                self.metrics.incr(outcome)
+                self.metrics.incr('fetched')
+                settled.append(anime_id)
+
+                self.metrics.observe_queue('fetch', fetched.qsize())
+                self.metrics.observe_queue('write', inp.qsize())
+                self.metrics.maybe_report()
+
+                if len(settled) >= self.flush_every:
+                    flush()
+
+            if not self._stop.is_set():
+                flush()
+        finally:
+            connection.close()
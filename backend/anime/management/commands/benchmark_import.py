@@ -0,0 +1,122 @@
+import json
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from anime.mass_import import MassAnimeImporter
+from anime.models import Anime
+from anime.services import AnimeImportService
+from parsers.fake_upstream import FakeUpstreamServer, add_upstream_arguments, upstream_from_options
+from parsers.rate_limit import configure_limiter
+
+MODES = ['threads', 'async', 'graphql', 'service-popular', 'service-random', 'service-multi']
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости режимов импорта на локальном fake_upstream'
+
+    def add_arguments(self, parser):
+        add_upstream_arguments(parser)
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            default=MODES,
+            choices=MODES,
+            help='Какие режимы импорта замерять'
+        )
+        parser.add_argument('--workers', type=int, default=50, help='Потоков / запросов в полёте')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=1000,
+            help='Лимит клиента к стенду, запросов в секунду (у настоящего Shikimori ~5)'
+        )
+        parser.add_argument(
+            '--id-offset',
+            type=int,
+            default=10_000_000,
+            help='Сдвиг ID стенда, чтобы не пересечься с настоящими аниме в базе'
+        )
+        parser.add_argument('--keep', action='store_true', help='Не удалять импортированные аниме')
+        parser.add_argument('--json', type=str, default=None, help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        offset = options['id_offset']
+        upstream = upstream_from_options(options, id_offset=offset)
+        results = []
+
+        with FakeUpstreamServer(upstream) as server:
+            self.stdout.write(f"Стенд: {server.url}, аниме в каталоге: {len(upstream.ids)}")
+
+            for mode in options['modes']:
+                # Каждый режим - с чистого листа: своя папка состояния и пустой диапазон ID
+                Anime.objects.filter(shikimori_id__gt=offset).delete()
+                for url in (server.url, server.anilist_url, server.jikan_url):
+                    configure_limiter(url, rate=options['rate'], burst=max(int(options['rate']), 1))
+                counters_before = dict(upstream.counters)
+
+                with tempfile.TemporaryDirectory() as state_dir, override_settings(
+                    IMPORT_STATE_DIR=state_dir,
+                    SHIKIMORI_URL=server.url,
+                    ANILIST_URL=server.anilist_url,
+                    JIKAN_URL=server.jikan_url,
+                ):
+                    started = time.monotonic()
+                    self._run_mode(mode, options, offset)
+                    elapsed = time.monotonic() - started
+
+                titles = Anime.objects.filter(shikimori_id__gt=offset).count()
+                responses = {
+                    status: count - counters_before.get(status, 0)
+                    for status, count in upstream.counters.items()
+                    if count - counters_before.get(status, 0)
+                }
+                results.append({
+                    'mode': mode,
+                    'titles': titles,
+                    'seconds': round(elapsed, 3),
+                    'titles_per_second': round(titles / max(elapsed, 1e-6), 2),
+                    'responses': responses,
+                })
+
+            if not options['keep']:
+                Anime.objects.filter(shikimori_id__gt=offset).delete()
+
+        self._print_results(results)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump({'options': self._describe(options), 'results': results}, f,
+                          ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты: {options['json']}")
+
+    def _run_mode(self, mode: str, options, offset: int):
+        if mode in ('threads', 'async', 'graphql'):
+            importer = MassAnimeImporter(max_workers=options['workers'], engine=mode, report_interval=None,
+                                         resolve_posters=False)
+            importer.import_ultra_fast()
+        elif mode == 'service-popular':
+            AnimeImportService().import_popular_by_pages(total_limit=options['size'])
+        elif mode == 'service-random':
+            AnimeImportService().import_random_by_id_range(
+                start_id=offset + 1, end_id=offset + options['size'], limit=options['size'] // 4
+            )
+        elif mode == 'service-multi':
+            AnimeImportService().import_many(range(offset + 1, offset + options['size'] + 1), source='multi')
+
+    def _print_results(self, results):
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(f"{'Режим':<18}{'Аниме':>8}{'Секунд':>10}{'Аниме/с':>10}  Ответы")
+        self.stdout.write("=" * 72)
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<18}{r['titles']:>8}{r['seconds']:>10.2f}"
+                f"{r['titles_per_second']:>10.1f}  {r['responses']}"
+            )
+
+    @staticmethod
+    def _describe(options):
+        keys = ('size', 'missing', 'latency', 'jitter', 'throttle', 'max_rps', 'slow', 'slow_ms', 'fixtures',
+                'workers', 'rate', 'modes')
+        return {key: options[key] for key in keys}
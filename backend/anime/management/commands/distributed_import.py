@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from anime.import_leases import LeaseWorker, plan_ranges, progress
+from anime.tasks import import_ranges
+
+
+class Command(BaseCommand):
+    help = 'Распределённый импорт: диапазоны ID с арендой, воркеры Celery или локальные'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plan',
+            type=str,
+            default='shikimori',
+            help='Имя плана (набора диапазонов)'
+        )
+        parser.add_argument(
+            '--create',
+            nargs=2,
+            type=int,
+            metavar=('START', 'END'),
+            help='Нарезать диапазон ID на куски для воркеров'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=5000,
+            help='Размер одного диапазона'
+        )
+        parser.add_argument(
+            '--dispatch',
+            type=int,
+            default=0,
+            metavar='N',
+            help='Отправить в Celery N задач import_ranges'
+        )
+        parser.add_argument(
+            '--work',
+            action='store_true',
+            help='Работать воркером в этом процессе, без Celery'
+        )
+        parser.add_argument(
+            '--engine',
+            type=str,
+            default='graphql',
+            choices=['threads', 'async', 'graphql'],
+            help='Движок загрузки внутри воркера'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=20,
+            help='Потоков / запросов в полёте на одного воркера'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=None,
+            help='Лимит запросов в секунду к Shikimori на воркера (по умолчанию из HOST_LIMITS)'
+        )
+        parser.add_argument(
+            '--max-ranges',
+            type=int,
+            default=None,
+            help='Остановиться после стольких диапазонов'
+        )
+        parser.add_argument(
+            '--progress',
+            action='store_true',
+            help='Показать сводный прогресс'
+        )
+
+    def handle(self, *args, **options):
+        plan = options['plan']
+
+        if options['create']:
+            start_id, end_id = options['create']
+            created = plan_ranges(start_id, end_id, range_size=options['range_size'], plan=plan)
+            self.stdout.write(f"Создано диапазонов: {created}")
+
+        if options['dispatch']:
+            for _ in range(options['dispatch']):
+                import_ranges.delay(plan=plan, engine=options['engine'],
+                                    max_workers=options['workers'], max_ranges=options['max_ranges'],
+                                    rate=options['rate'])
+            self.stdout.write(f"Отправлено задач: {options['dispatch']}")
+
+        if options['work']:
+            worker = LeaseWorker(plan=plan, engine=options['engine'], max_workers=options['workers'],
+                                 rate=options['rate'])
+            stats = worker.run(max_ranges=options['max_ranges'])
+            self.stdout.write(self.style.SUCCESS(f"Воркер {worker.owner}: {stats}"))
+
+        if options['progress'] or not (options['create'] or options['dispatch'] or options['work']):
+            self.stdout.write(json.dumps(progress(plan), ensure_ascii=False, indent=2))
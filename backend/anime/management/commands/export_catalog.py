@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from anime.catalog_snapshot import export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить каталог (аниме, жанры, студии и связи) в сжатый файл для load_catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Куда писать, например catalog.jsonl.gz'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            default=None,
+            help='Только аниме, изменённые с этого момента (ISO 8601)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Только изменённые после прошлой выгрузки'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Аниме за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Не разобрать дату: {options['since']}")
+
+        stats = export_catalog(Path(options['path']), since=since, incremental=options['incremental'],
+                               batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Аниме {stats['anime']}, жанров {stats['genres']}, студий {stats['studios']} "
+            f"за {stats['seconds']} с, граница {stats['until'].isoformat()}"
+        ))
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from anime import external_ids
+
+
+class Command(BaseCommand):
+    help = 'Таблица внешних ID (Shikimori, MAL, AniList): заполнение, поиск и слияние дубликатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Заполнить таблицу соответствий по полям Anime'
+        )
+        parser.add_argument(
+            '--duplicates',
+            action='store_true',
+            help='Показать группы дубликатов'
+        )
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='Слить дубликаты в одну запись'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='С --merge: только показать, что будет слито'
+        )
+        parser.add_argument(
+            '--resolve',
+            nargs='+',
+            metavar='SOURCE:ID',
+            help='Найти аниме по внешним ID, например mal:5114 anilist:21'
+        )
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            total = external_ids.sync_from_anime()
+            self.stdout.write(self.style.SUCCESS(f"Соответствий: {total}"))
+
+        if options['duplicates']:
+            groups = external_ids.find_duplicates()
+            for group in groups:
+                self.stdout.write(str(group))
+            self.stdout.write(f"Групп дубликатов: {len(groups)}")
+
+        if options['merge']:
+            stats = external_ids.merge_duplicates(dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(f"Слияние: {stats}"))
+
+        if options['resolve']:
+            pairs = []
+            for item in options['resolve']:
+                source, _, external_id = item.partition(':')
+                pairs.append((source, int(external_id)))
+            found = external_ids.resolve_many(pairs)
+            self.stdout.write(json.dumps(
+                {f"{source}:{external_id}": found.get((source, external_id)) for source, external_id in pairs},
+                indent=2,
+            ))
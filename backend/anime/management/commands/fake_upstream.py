@@ -0,0 +1,73 @@
+import gzip
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parsers.fake_upstream import FakeUpstreamServer, add_upstream_arguments, upstream_from_options
+from parsers.shikimori import ShikimoriParser
+
+
+class Command(BaseCommand):
+    help = 'Локальный поддельный Shikimori/AniList для замеров импорта без обращения к апстриму'
+
+    def add_arguments(self, parser):
+        add_upstream_arguments(parser)
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8800)
+        parser.add_argument(
+            '--record',
+            type=str,
+            default=None,
+            help='Вместо запуска сервера записать фикстуры с настоящего Shikimori в этот файл'
+        )
+        parser.add_argument(
+            '--ids',
+            type=str,
+            default='1-200',
+            help='Диапазон ID для --record, например 1-500'
+        )
+
+    def handle(self, *args, **options):
+        if options['record']:
+            return self._record(Path(options['record']), options['ids'])
+
+        upstream = upstream_from_options(options)
+        server = FakeUpstreamServer(upstream, host=options['host'], port=options['port'])
+
+        self.stdout.write(f"Shikimori: {server.url}  (SHIKIMORI_URL)")
+        self.stdout.write(f"AniList:   {server.anilist_url}  (ANILIST_URL)")
+        self.stdout.write(f"Jikan:     {server.jikan_url}  (JIKAN_URL)")
+        self.stdout.write(f"Аниме в каталоге: {len(upstream.ids)}")
+
+        server.start()
+        try:
+            while True:
+                time.sleep(10)
+                self.stdout.write(f"Ответы: {upstream.counters}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+
+    def _record(self, path: Path, ids: str):
+        try:
+            start, end = (int(x) for x in ids.split('-'))
+        except ValueError:
+            raise CommandError('--ids ожидает диапазон вида 1-500')
+
+        parser = ShikimoriParser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        opener = gzip.open if path.suffix == '.gz' else open
+
+        recorded = 0
+        with opener(path, 'wt', encoding='utf-8') as f:
+            for anime_id in range(start, end + 1):
+                response = parser.session.get(f"{parser.BASE_URL}/animes/{anime_id}", timeout=10)
+                if response.status_code != 200:
+                    continue
+                f.write(json.dumps(response.json(), ensure_ascii=False) + '\n')
+                recorded += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Записано {recorded} аниме в {path}"))
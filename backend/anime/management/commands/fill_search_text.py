@@ -1,22 +1,8 @@
-from django.core.management.base import BaseCommand
-from anime.models import Anime
+from anime.backfill import BackfillCommand, SearchTextBackfill
 
-class Command(BaseCommand):
-    help = 'Fill search_text field for all anime'
 
-    def handle(self, *args, **options):
-        anime_list = Anime.objects.all()
-        updated = 0
+class Command(BackfillCommand):
+    help = 'Fill search_text (and slug/year) for all anime'
 
-        for anime in anime_list:
-            old_search_text = anime.search_text
-            anime.save()  # This will trigger the save method to update search_text
-
-            if anime.search_text != old_search_text:
-                updated += 1
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully updated search_text for {updated} anime out of {anime_list.count()}'
-            )
-        )
\ No newline at end of file
+    def get_backfill(self, options):
+        return SearchTextBackfill()
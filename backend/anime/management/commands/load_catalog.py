@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from anime.catalog_snapshot import load_catalog
+
+
+class Command(BaseCommand):
+    help = 'Загрузить каталог из файла export_catalog (полного или инкрементального)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            type=str,
+            help='Файлы выгрузки; инкрементальные - по порядку после полного'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Аниме в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            try:
+                stats = load_catalog(Path(path), batch_size=options['batch_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: аниме {stats['anime']}, жанров {stats['genres']}, студий {stats['studios']} "
+                f"за {stats['seconds']} с"
+            ))
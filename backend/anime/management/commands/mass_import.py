@@ -20,22 +20,65 @@ class Command(BaseCommand):
         parser.add_argument(
             '--ultra',
             action='store_true',
-            help='Ультра-быстрый режим (200 потоков, без задержек, риск бана)'
+            help='Ультра-быстрый режим (200 потоков, скорость ограничена лимитером хоста)'
+        )
+        parser.add_argument(
+            '--engine',
+            type=str,
+            default='threads',
+            choices=['threads', 'async', 'graphql'],
+            help='Движок загрузки: пул потоков, asyncio (один event loop, keep-alive) '
+                 'или пакетный GraphQL (50 аниме за запрос)'
+        )
+        parser.add_argument(
+            '--recheck-missing',
+            action='store_true',
+            help='Забыть ID, которые раньше отвечали 404, и запросить их снова'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default=None,
+            help='Куда записать JSON-отчёт о прогоне (по умолчанию import_state/mass_import.report.json)'
+        )
+        parser.add_argument(
+            '--progress-interval',
+            type=float,
+            default=5.0,
+            help='Как часто печатать строку прогресса, секунд'
+        )
+        parser.add_argument(
+            '--skip-posters',
+            action='store_true',
+            help='Не искать недостающие постеры на AniList после импорта'
         )
         parser.add_argument(
             '--resume',
             action='store_true',
             help='Продолжить с места остановки'
         )
+        parser.add_argument(
+            '--reset-journal',
+            action='store_true',
+            help='Забыть сохранённый прогресс (журнал чекпоинтов) и начать с нуля'
+        )
     
     def handle(self, *args, **options):
         if options['ultra']:
-            # Ultra mode: 200 workers, no delays, full speed
+            # Ultra mode: 200 workers, pace is set by the shared host limiter
             options['workers'] = 200
             print("🚀 ULTRA MODE: 200 потоков, максимальная скорость!")
-            print("⚠️  Риск бана IP, используйте VPN если нужно\n")
 
-        importer = MassAnimeImporter(max_workers=options['workers'])
+        importer = MassAnimeImporter(
+            max_workers=options['workers'],
+            engine=options['engine'],
+            resume=options['resume'],
+            reset_journal=options['reset_journal'],
+            recheck_missing=options['recheck_missing'],
+            report_path=options['report'],
+            report_interval=options['progress_interval'],
+            resolve_posters=not options['skip_posters']
+        )
 
         if not options['ultra']:
             print("⚠️  ВНИМАНИЕ: Импорт 100000+ аниме займет 10-48 часов!")
@@ -54,6 +97,7 @@ class Command(BaseCommand):
                 importer.import_100k()
         except KeyboardInterrupt:
             print("\nИмпорт прерван пользователем")
+            print(f"Отчёт: {importer.metrics.write_report(importer.report_path, interrupted=True)}")
         except Exception as e:
             print(f"\nКритическая ошибка: {e}")
 
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from anime.bulk_writer import AnimeBulkWriter
+from anime.payload_cache import RawPayloadCache
+from parsers.shikimori import ShikimoriParser
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать аниме из кеша сырых ответов Shikimori без сетевых запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки записи в БД'
+        )
+        parser.add_argument(
+            '--cache-dir',
+            type=str,
+            default=None,
+            help='Папка кеша (по умолчанию import_state/payloads)'
+        )
+
+    def handle(self, *args, **options):
+        cache = RawPayloadCache(options['cache_dir'])
+        parser = ShikimoriParser()
+        total = cache.count('shikimori')
+        graphql_total = cache.count(ShikimoriParser.GRAPHQL_CACHE_SOURCE)
+        self.stdout.write(f'В кеше {total} ответов Shikimori REST и {graphql_total} GraphQL')
+
+        started = time.monotonic()
+        processed = 0
+        errors = 0
+
+        with AnimeBulkWriter(batch_size=options['batch_size'], mark_synced=False) as writer:
+            for shikimori_id, payload in self._payloads(cache):
+                try:
+                    data = parser.normalize_anime_data(payload)
+                except Exception as e:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f'ID {shikimori_id}: {e}'))
+                    continue
+
+                writer.add(data)
+                processed += 1
+                if processed % 10000 == 0:
+                    self.stdout.write(f'  {processed}/{total + graphql_total}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенормализовано {processed} аниме за {elapsed:.1f} с '
+            f'({processed / max(elapsed, 1e-6):.0f}/с), ошибок: {errors}, '
+            f'создано {writer.stats["created"]}, обновлено {writer.stats["updated"]}'
+        ))
+
+    @staticmethod
+    def _payloads(cache: RawPayloadCache):
+        """Ответы REST, а для ID, которые грузились только через GraphQL, - ответы GraphQL"""
+        yield from cache.iter_payloads('shikimori')
+        for shikimori_id, payload in cache.iter_payloads(ShikimoriParser.GRAPHQL_CACHE_SOURCE):
+            if cache.entry('shikimori', shikimori_id) is None:
+                yield shikimori_id, payload
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from anime.sync_scheduler import AnimeSyncScheduler
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальное обновление аниме: онгоинги часто, завершённые редко'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=1000,
+            help='Сколько аниме обновить за проход'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=10,
+            help='Количество потоков'
+        )
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help='Только показать, сколько аниме ждёт обновления'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проход за проходом'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=300,
+            help='Пауза между проходами в режиме --loop, секунд'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = AnimeSyncScheduler(workers=options['workers'])
+
+        plan = scheduler.plan()
+        self.stdout.write(f"Ждут обновления: {sum(plan.values())} {plan}")
+        if options['plan']:
+            return
+
+        while True:
+            started = time.monotonic()
+            stats = dict(scheduler.run(limit=options['limit']))
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f"Проверено {stats['checked']} за {elapsed:.1f} с: "
+                f"без изменений (304) {stats['not_modified']}, "
+                f"изменилось {stats['changed']}, совпало {stats['unchanged']}, "
+                f"удалено на Shikimori {stats['missing']}, ошибок {stats['errors']}"
+            ))
+            if scheduler.changed_fields:
+                self.stdout.write(f"Изменённые поля: {dict(scheduler.changed_fields)}")
+
+            if not options['loop']:
+                break
+            for key in scheduler.stats:
+                scheduler.stats[key] = 0
+            scheduler.changed_fields.clear()
+            time.sleep(options['sleep'])
@@ -1,23 +1,49 @@
-import time
 import random
 import json
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict
-from django.db import transaction
+from typing import Dict, List, Tuple
 from django.core.management.base import BaseCommand
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
 
+from anime.bulk_writer import AnimeBulkWriter
+from anime.id_bitmap import ShikimoriIdBitmap
+from anime.import_journal import ImportJournal, default_state_dir
+from anime.import_metrics import ImportMetrics
+from anime.import_pipeline import ImportPipeline, iter_fetch_threaded
 from anime.models import Anime, Genre, Studio
+from anime.payload_cache import RawPayloadCache
+from anime.poster_resolver import AnilistPosterResolver
 from parsers.multi_source import MultiSourceParser
+from parsers.rate_limit import RateLimitedSession
+from parsers.shikimori import ShikimoriParser
+from parsers.utils import first_title, list_popularity
 
 class MassAnimeImporter:
     """Массовый импортёр аниме"""
     
-    def __init__(self, max_workers=20):
+    def __init__(self, max_workers=20, engine='threads', resume=False, recheck_missing=False,
+                 report_path=None, report_interval=5.0, cache_payloads=True, resolve_posters=True,
+                 journal_name='mass_import', reset_journal=False):
         self.max_workers = max_workers
+        self.engine = engine
+        self.resume = resume
+        self.resolve_posters = resolve_posters
+        self.journal = ImportJournal(journal_name, resume=resume, reset=reset_journal)
+        self._known_ids = None
+        # Кто уже в базе и кто отвечал 404 - в памяти, без запросов в БД
+        self.bitmap = ShikimoriIdBitmap.load()
+        if recheck_missing:
+            self.bitmap.clear_missing()
+        # Метрики по стадиям: строка прогресса раз в report_interval секунд и JSON-отчёт
+        self.metrics = ImportMetrics(report_interval=report_interval)
+        self.report_path = report_path or default_state_dir() / 'mass_import.report.json'
+        self.writer = AnimeBulkWriter(batch_size=500, on_flush=self.bitmap.mark_present,
+                                      metrics=self.metrics)
         self.parser = MultiSourceParser(max_workers=max_workers)
-        self.session = requests.Session()
+        # Сырые ответы на диск, чтобы перенормализовать без повторной загрузки
+        self.payload_cache = RawPayloadCache() if cache_payloads else None
+        self.shikimori = ShikimoriParser(payload_cache=self.payload_cache)
+        self.session = RateLimitedSession()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
@@ -51,6 +77,8 @@ class MassAnimeImporter:
                 print(f"Ошибка в стратегии: {e}")
                 continue
 
+        self.bitmap.save()
+        self._resolve_missing_posters()
         self.stats['end_time'] = datetime.now()
         self._print_stats()
 
@@ -62,28 +90,35 @@ class MassAnimeImporter:
 
         self.stats['start_time'] = datetime.now()
 
-        # Простая стратегия: все ID подряд от 1 до 500000
         total_ids = 500000
         batch_size = 1000  # Огромные батчи для скорости
 
-        print(f"🎯 Цель: {total_ids} аниме")
-        print(f"⚡ Режим: {self.max_workers} потоков, без задержек")
-
-        imported = 0
-        for start in range(1, total_ids + 1, batch_size):
-            end = min(start + batch_size - 1, total_ids)
-            ids = list(range(start, end + 1))
+        # Запрашиваем только ID, которые есть в листинге, а не все 1..500000
+        known_ids = self.discover_ids()
+        if not known_ids:
+            print("⚠️  Листинг недоступен, перебираем все ID подряд")
+            known_ids = list(range(1, total_ids + 1))
 
-            batch_imported = self._import_batch_ultra(ids)
-            imported += batch_imported
-
-            print(f"📊 Прогресс: {start}-{end} → Импортировано: {batch_imported} (Всего: {imported})")
+        print(f"🎯 Цель: {len(known_ids)} аниме")
+        print(f"⚡ Режим: {self.max_workers} потоков, скорость держит общий лимитер")
 
-            if imported % 1000 == 0:
-                print(f"🎉 Достигнуто: {imported} аниме!")
+        # Одним потоком через конвейер: сеть не ждёт записи кусков в БД
+        imported = self._import_stream(known_ids, strategy='ultra', chunk_size=batch_size)
+        print(f"🎉 Импортировано: {imported} аниме")
 
+        self.bitmap.save()
+        self._resolve_missing_posters()
         self.stats['end_time'] = datetime.now()
         self._print_stats()
+
+    def _resolve_missing_posters(self):
+        """Отложенный проход: постеры из AniList пачками, а не на каждую запись"""
+        if not self.resolve_posters:
+            return
+        print("\n🖼  Ищем недостающие постеры на AniList...")
+        resolver = AnilistPosterResolver()
+        updated = resolver.resolve()
+        print(f"🖼  Найдено постеров: {updated} (запросов: {resolver.stats['requests']})")
     
     def _strategy_popular_ids(self):
         """Стратегия 1: Популярные ID (40000)"""
@@ -98,7 +133,7 @@ class MassAnimeImporter:
         ]
         
         total_to_import = 40000
-        imported = 0
+        imported = self.journal.imported_total('popular')
         
         for start, end, target in popular_ranges:
             if imported >= total_to_import:
@@ -108,14 +143,22 @@ class MassAnimeImporter:
             
             # Генерируем ID из диапазона
             ids_needed = min(target, total_to_import - imported)
-            ids = self.parser.get_random_ids_from_range(start, end, ids_needed)
+            ids = self.parser.get_random_ids_from_range(
+                start, end, ids_needed, known_ids=self.discover_ids() or None
+            )
             
             # Импортируем батчами
             batch_size = 500
             for i in range(0, len(ids), batch_size):
                 batch_ids = ids[i:i+batch_size]
-                batch_imported = self._import_batch(batch_ids)
+                if self.journal.is_done('popular', batch_ids[0], batch_ids[-1]):
+                    continue
+
+                batch_imported, failed = self._import_batch(batch_ids)
                 imported += batch_imported
+                # С сетевыми ошибками пачка остаётся открытой и при --resume пойдёт снова
+                if not failed:
+                    self.journal.mark_done('popular', batch_ids[0], batch_ids[-1], batch_imported)
                 
                 print(f"    Импортировано: {imported}/{total_to_import}")
                 
@@ -140,21 +183,26 @@ class MassAnimeImporter:
         ]
         
         total_target = 30000
-        imported = 0
+        imported = self.journal.imported_total('years')
         
         for year, target in productive_years:
             if imported >= total_target:
                 break
+            if self.journal.is_done('years', year, year):
+                continue
             
             print(f"  Год {year} (цель: {target})...")
             
             # Пытаемся найти аниме этого года через поиск
             try:
                 year_ids = self._find_anime_by_year(year, target)
+                batch_imported, failed = 0, 0
                 if year_ids:
-                    batch_imported = self._import_batch(year_ids[:target])
+                    batch_imported, failed = self._import_batch(year_ids[:target])
                     imported += batch_imported
                     print(f"    Найдено: {len(year_ids)}, Импортировано: {batch_imported}")
+                if not failed:
+                    self.journal.mark_done('years', year, year, batch_imported)
             except Exception as e:
                 print(f"    Ошибка года {year}: {e}")
                 continue
@@ -180,17 +228,19 @@ class MassAnimeImporter:
         ]
         
         total_target = 20000
-        imported = 0
+        imported = self.journal.imported_total('genres')
         
         for genre_id, genre_name, target in genres:
             if imported >= total_target:
                 break
+            if self.journal.is_done('genres', genre_id, genre_id):
+                continue
             
             print(f"  Жанр {genre_name} (цель: {target})...")
             
             try:
                 # Получаем аниме по жанру
-                url = "https://shikimori.one/api/animes"
+                url = f"{self.shikimori.BASE_URL}/animes"
                 params = {
                     'genre': genre_id,
                     'limit': min(target, 100),
@@ -203,12 +253,13 @@ class MassAnimeImporter:
                     anime_list = response.json()
                     ids = [item['id'] for item in anime_list]
                     
+                    batch_imported, failed = 0, 0
                     if ids:
-                        batch_imported = self._import_batch(ids[:target])
+                        batch_imported, failed = self._import_batch(ids[:target])
                         imported += batch_imported
                         print(f"    Импортировано: {batch_imported}")
-                        
-                time.sleep(1)
+                    if not failed:
+                        self.journal.mark_done('genres', genre_id, genre_id, batch_imported)
                 
             except Exception as e:
                 print(f"    Ошибка жанра {genre_name}: {e}")
@@ -219,25 +270,33 @@ class MassAnimeImporter:
         print("\n[СТРАТЕГИЯ 4] Случайные ID...")
         
         total_target = 10000
-        imported = 0
-        attempts = 0
+        # Случайные ID не воспроизводятся, поэтому в журнал пишутся номера попыток
+        imported = self.journal.imported_total('random')
+        done_attempts = self.journal.done_ranges('random')
+        attempts = done_attempts[-1][1] + 1 if done_attempts else 0
         max_attempts = total_target * 3
         
         while imported < total_target and attempts < max_attempts:
             batch_size = 100
             batch_ids = []
             
-            # Генерируем случайные ID
-            for _ in range(batch_size):
-                # 80% в диапазоне 1-200000, 20% в 200001-500000
-                if random.random() < 0.8:
-                    anime_id = random.randint(1, 200000)
-                else:
-                    anime_id = random.randint(200001, 500000)
-                batch_ids.append(anime_id)
+            known_ids = self.discover_ids()
+            if known_ids:
+                # Случайная выборка из реально существующих ID
+                batch_ids = random.sample(known_ids, min(batch_size, len(known_ids)))
+            else:
+                # Генерируем случайные ID
+                for _ in range(batch_size):
+                    # 80% в диапазоне 1-200000, 20% в 200001-500000
+                    if random.random() < 0.8:
+                        anime_id = random.randint(1, 200000)
+                    else:
+                        anime_id = random.randint(200001, 500000)
+                    batch_ids.append(anime_id)
             
-            batch_imported = self._import_batch(batch_ids)
+            batch_imported, _ = self._import_batch(batch_ids)
             imported += batch_imported
+            self.journal.mark_done('random', attempts, attempts + batch_size - 1, batch_imported)
             attempts += batch_size
             
             print(f"  Попытка {attempts}: импортировано {imported}/{total_target}")
@@ -246,178 +305,208 @@ class MassAnimeImporter:
             if imported % 1000 == 0:
                 print(f"  [ПРОГРЕСС] {imported}/{total_target}")
     
-    def _import_batch(self, anime_ids: List[int]) -> int:
-        """Импорт батча аниме"""
-        imported = 0
-        
-        # Фильтруем уже существующие
-        existing_ids = set(Anime.objects.filter(
-            shikimori_id__in=anime_ids
-        ).values_list('shikimori_id', flat=True))
-        
-        new_ids = [aid for aid in anime_ids if aid not in existing_ids]
+    def discover_ids(self) -> List[int]:
+        """Точный список существующих ID из листинга Shikimori (по id)
+
+        Результат кешируется в памяти и на диске рядом с журналом, так что
+        при --resume листинг не перечитывается.
+        """
+        if self._known_ids is not None:
+            return self._known_ids
+
+        cache_path = self.journal.path.parent / 'shikimori_ids.json'
+        if self.resume and cache_path.exists():
+            with open(cache_path, encoding='utf-8') as f:
+                self._known_ids = json.load(f)
+            print(f"🔎 ID из кеша листинга: {len(self._known_ids)}")
+            return self._known_ids
+
+        print("🔎 Собираем список существующих ID через листинг...")
+        try:
+            self._known_ids = sorted(set(self.shikimori.iter_anime_ids()))
+        except RuntimeError as e:
+            # Неполный список не сохраняем: по нему ultra и --resume пропустили бы остальные ID
+            print(f"⚠️  {e}")
+            self._known_ids = []
+            return self._known_ids
+        print(f"🔎 Найдено ID: {len(self._known_ids)}")
+
+        if self._known_ids:
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._known_ids, f)
+
+        return self._known_ids
+
+    def _import_batch(self, anime_ids: List[int]) -> Tuple[int, int]:
+        """Импорт батча аниме целиком: (импортировано, ошибок загрузки)"""
+        # Фильтруем уже существующие и известные 404
+        new_ids = self.bitmap.filter_unknown(anime_ids)
         
         if not new_ids:
-            return 0
-        
-        # Многопоточная загрузка
-        with ThreadPoolExecutor(max_workers=self.parser.max_workers) as executor:
-            future_to_id = {
-                executor.submit(self._fetch_and_save, anime_id): anime_id
-                for anime_id in new_ids[:200]  # Увеличенный батч
-            }
-            
-            for future in as_completed(future_to_id):
-                anime_id = future_to_id[future]
-                try:
-                    success = future.result(timeout=30)
-                    if success:
-                        imported += 1
-                except Exception as e:
-                    self.stats['errors'] += 1
-                    if self.stats['errors'] % 100 == 0:
-                        print(f"    [ОШИБКИ] {self.stats['errors']} ошибок")
-        
+            return 0, 0
+
+        errors = self.stats['errors']
+        imported = self._import_stream(new_ids)
+        return imported, self.stats['errors'] - errors
+
+    def _import_stream(self, anime_ids, strategy: str = None, chunk_size: int = 1000) -> int:
+        """Импорт потока ID через конвейер загрузка → нормализация → запись
+
+        Загрузкой занимается выбранный движок, в БД пишет один поток
+        конвейера. Если передана стратегия, куски по chunk_size ID
+        попадают в журнал, когда все их ID записаны или ответили 404.
+        """
+        # Сколько ID ждём в каждом куске, чтобы понять, когда он завершён
+        pending = {}
+        chunk_imported = {}
+        # Куски с сетевыми ошибками, 429 и 5xx: в журнал не попадают, --resume их повторит
+        chunk_failed = set()
+        candidates = []
+        for anime_id in anime_ids:
+            chunk_start = (anime_id - 1) // chunk_size * chunk_size + 1
+            if strategy and self.journal.is_done(strategy, chunk_start, chunk_start + chunk_size - 1):
+                continue
+            if self.bitmap.is_known(anime_id):
+                continue
+            candidates.append(anime_id)
+            pending[chunk_start] = pending.get(chunk_start, 0) + 1
+
+        def on_settled(settled_ids):
+            # Вызывается потоком записи после flush, так что всё уже в БД
+            for anime_id in settled_ids if strategy else ():
+                chunk_start = (anime_id - 1) // chunk_size * chunk_size + 1
+                if self.bitmap.is_present(anime_id):
+                    chunk_imported[chunk_start] = chunk_imported.get(chunk_start, 0) + 1
+                elif not self.bitmap.is_missing(anime_id):
+                    chunk_failed.add(chunk_start)
+                pending[chunk_start] -= 1
+                if pending[chunk_start] == 0 and chunk_start not in chunk_failed:
+                    self.journal.mark_done(
+                        strategy, chunk_start, chunk_start + chunk_size - 1,
+                        chunk_imported.pop(chunk_start, 0)
+                    )
+            self.bitmap.checkpoint()
+
+        pipeline = ImportPipeline(
+            fetcher=self._fetcher(),
+            normalize=self._normalize,
+            writer=self.writer,
+            metrics=self.metrics,
+            queue_size=self.max_workers * 4,
+        )
+        imported = pipeline.run(candidates, on_missing=self.bitmap.mark_missing, on_settled=on_settled)
+        self.stats['total_attempted'] += pipeline.stats['fetched']
+        self.stats['total_imported'] += imported
+        self.stats['errors'] += pipeline.stats['errors']
+
+        if strategy:
+            return self.journal.imported_total(strategy)
         return imported
 
-    def _import_batch_ultra(self, anime_ids: List[int]) -> int:
-        """Ультра-быстрый импорт батча без задержек"""
-        imported = 0
-
-        # Фильтруем уже существующие
-        existing_ids = set(Anime.objects.filter(
-            shikimori_id__in=anime_ids
-        ).values_list('shikimori_id', flat=True))
+    def _fetcher(self):
+        """Стадия загрузки для выбранного движка"""
+        if self.engine == 'async':
+            from parsers.async_fetch import AsyncFetchEngine
 
-        new_ids = [aid for aid in anime_ids if aid not in existing_ids]
+            engine = AsyncFetchEngine(concurrency=self.max_workers, timeout=10,
+                                      on_response=self.metrics.observe_fetch)
+            return lambda anime_ids: self._cache_results(engine.fetch_iter(
+                (anime_id, f"{self.shikimori.BASE_URL}/animes/{anime_id}")
+                for anime_id in anime_ids
+            ))
 
-        if not new_ids:
-            return 0
-
-        # Многопоточная загрузка без лимитов
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_id = {
-                executor.submit(self._fetch_and_save_ultra, anime_id): anime_id
-                for anime_id in new_ids
-            }
+        if self.engine == 'graphql':
+            return self._fetch_graphql
 
-            for future in as_completed(future_to_id):
-                anime_id = future_to_id[future]
-                try:
-                    success = future.result(timeout=5)  # Короткий таймаут
-                    if success:
-                        imported += 1
-                except Exception as e:
-                    pass  # Игнорируем ошибки в ultra mode
+        return lambda anime_ids: iter_fetch_threaded(self._fetch_one, anime_ids, self.max_workers)
 
-        return imported
+    def _fetch_one(self, anime_id: int):
+        """Загрузить одно аниме через REST (без записи в БД)"""
+        url = f"{self.shikimori.BASE_URL}/animes/{anime_id}"
+        headers = {}
+        etag = self.payload_cache.etag('shikimori', anime_id) if self.payload_cache else None
+        if etag:
+            headers['If-None-Match'] = etag
 
-    def _fetch_and_save_ultra(self, anime_id: int) -> bool:
-        """Ультра-быстрая загрузка без retry и задержек"""
         try:
-            url = f"https://shikimori.one/api/animes/{anime_id}"
-            response = self.session.get(url, timeout=3)
-
-            if response.status_code == 404:
-                return False
-
-            response.raise_for_status()
-            data = response.json()
-
-            # Быстрое сохранение без транзакций
-            anime, created = Anime.objects.get_or_create(
-                shikimori_id=anime_id,
-                defaults={
-                    'title_ru': data.get('russian') or data.get('name'),
-                    'title_en': data.get('english') or data.get('name'),
-                    'title_jp': data.get('japanese'),
-                    'description': data.get('description', '')[:2000],
-                    'year': data.get('aired_on', '').split('-')[0] if data.get('aired_on') else None,
-                    'status': self._map_status(data.get('status')),
-                    'episodes': data.get('episodes'),
-                    'score': data.get('score'),
-                    'poster_url': f"https://shikimori.one{data['image']['original']}" if data.get('image') else '',
-                    'trailer_url': data.get('videos', [{}])[0].get('url', '') if data.get('videos') else '',
-                    'data_source': 'shikimori'
-                }
-            )
-
-            if created:
-                # Жанры добавляем отдельно если нужно
-                if data.get('genres'):
-                    for genre_data in data['genres']:
-                        genre_name = genre_data.get('russian') or genre_data.get('name')
-                        if genre_name:
-                            genre, _ = Genre.objects.get_or_create(
-                                name=genre_name,
-                                defaults={'slug': genre_name.lower().replace(' ', '-')}
-                            )
-                            anime.genres.add(genre)
-
-                print(f"✅ {anime.title_ru or anime.title_en} (ID: {anime_id})")
-                return True
-
-            return False
-
-        except Exception as e:
-            return False
-
-    def _fetch_and_save(self, anime_id: int) -> bool:
-        """Получить и сохранить одно аниме"""
+            response = self.session.get(url, headers=headers, timeout=10)
+        except Exception:
+            self.metrics.observe_fetch(0)
+            raise
+
+        # elapsed - чистое время HTTP, без ожидания в лимитере
+        self.metrics.observe_fetch(response.status_code, response.elapsed.total_seconds())
+        if response.status_code == 304:
+            self.payload_cache.touch('shikimori', anime_id)
+            return 200, self.payload_cache.get('shikimori', anime_id)
+        if response.status_code != 200:
+            return response.status_code, None
+
+        data = response.json()
+        if self.payload_cache:
+            self.payload_cache.put('shikimori', anime_id, data, etag=response.headers.get('ETag'))
+        return 200, data
+
+    def _cache_results(self, results):
+        """Сохранить в кеш ответы, пришедшие без участия _fetch_one"""
         try:
-            url = f"https://shikimori.one/api/animes/{anime_id}"
-            response = self.session.get(url, timeout=10)
-            
-            if response.status_code == 404:
-                return False
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            # Сохраняем в базу
-            with transaction.atomic():
-                anime, created = Anime.objects.get_or_create(
-                    shikimori_id=anime_id,
-                    defaults={
-                        'title_ru': data.get('russian') or data.get('name'),
-                        'title_en': data.get('english') or data.get('name'),
-                        'title_jp': data.get('japanese'),
-                        'description': data.get('description', '')[:2000],
-                        'year': data.get('aired_on', '').split('-')[0] if data.get('aired_on') else None,
-                        'status': self._map_status(data.get('status')),
-                        'episodes': data.get('episodes'),
-                        'score': data.get('score'),
-                        'poster_url': f"https://shikimori.one{data['image']['original']}" if data.get('image') else '',
-                        'trailer_url': data.get('videos', [{}])[0].get('url', '') if data.get('videos') else '',
-                        'data_source': 'shikimori'
-                    }
-                )
-                
-                if created and data.get('genres'):
-                    for genre_data in data['genres']:
-                        genre_name = genre_data.get('russian') or genre_data.get('name')
-                        if genre_name:
-                            genre, _ = Genre.objects.get_or_create(
-                                name=genre_name,
-                                defaults={'slug': genre_name.lower().replace(' ', '-')}
-                            )
-                            anime.genres.add(genre)
-            
-            if created:
-                print(f"✅ Imported: {anime.title_ru or anime.title_en} (ID: {anime_id})")
-
-            time.sleep(0.002)  # Умеренная задержка
-            return created
+            for anime_id, status, data in results:
+                if status == 200 and data and self.payload_cache:
+                    self.payload_cache.put('shikimori', anime_id, data)
+                yield anime_id, status, data
+        finally:
+            results.close()
+
+    def _fetch_graphql(self, anime_ids):
+        """Загрузка через GraphQL: один запрос на 50 ID"""
+        anime_ids = list(anime_ids)
+        limit = self.shikimori.GRAPHQL_BATCH_LIMIT
+
+        for i in range(0, len(anime_ids), limit):
+            chunk = anime_ids[i:i + limit]
+            started = time.monotonic()
+            try:
+                items = {data['id']: data for data in self.shikimori.get_anime_chunk(chunk)}
+                self.metrics.observe_fetch(200, time.monotonic() - started)
+            except Exception:
+                self.metrics.observe_fetch(0)
+                items = None
+
+            for chunk_id in chunk:
+                if items is None:
+                    yield chunk_id, 0, None
+                elif chunk_id in items:
+                    yield chunk_id, 200, items[chunk_id]
+                else:
+                    # Чего нет в ответе, того нет и на Shikimori
+                    yield chunk_id, 404, None
+
+    def _normalize(self, anime_id: int, data: Dict) -> Dict:
+        """Привести ответ /api/animes/<id> к формату AnimeBulkWriter"""
+        return {
+            'id': anime_id,
+            'title_ru': data.get('russian') or data.get('name'),
+            'title_en': first_title(data.get('english')) or data.get('name'),
+            'title_jp': first_title(data.get('japanese')),
+            'description': (data.get('description') or '')[:2000],
+            'year': data.get('aired_on', '').split('-')[0] if data.get('aired_on') else None,
+            'status': self._map_status(data.get('status')),
+            'episodes': data.get('episodes'),
+            'score': data.get('score'),
+            'popularity': list_popularity(data.get('rates_statuses_stats')),
+            'poster_url': ShikimoriParser.absolute_url((data.get('image') or {}).get('original') or ''),
+            'trailer_url': data.get('videos', [{}])[0].get('url', '') if data.get('videos') else '',
+            'genres': [
+                {'name': g.get('russian') or g.get('name')}
+                for g in data.get('genres') or []
+            ],
+            'studios': [st['name'] for st in data.get('studios') or [] if st.get('name')],
+        }
 
-        except Exception as e:
-            if "429" in str(e):  # Rate limit
-                time.sleep(5)
-            return False
-    
     def _find_anime_by_year(self, year: int, limit: int = 100) -> List[int]:
         """Найти аниме по году"""
         try:
-            url = "https://shikimori.one/api/animes"
+            url = f"{self.shikimori.BASE_URL}/animes"
             params = {
                 'year': year,
                 'limit': min(limit, 50),
@@ -453,6 +542,24 @@ class MassAnimeImporter:
         print(f"Ошибок: {self.stats['errors']}")
         print(f"Время выполнения: {hours}ч {minutes}м {seconds}с")
         print(f"Скорость: {self.stats['total_imported'] / max(duration.seconds, 1):.1f} аниме/сек")
+
+        fetch = self.metrics.fetch_latency
+        write = self.metrics.write_time
+        print(f"HTTP-статусы: {dict(self.metrics.statuses)}")
+        print(f"Загрузка p50/p95/p99: {fetch.percentile(50):.0f}/{fetch.percentile(95):.0f}/"
+              f"{fetch.percentile(99):.0f} мс")
+        print(f"Запись в БД: {write.count} пачек, p95 {write.percentile(95):.0f} мс")
+
+        report_path = self.metrics.write_report(
+            self.report_path,
+            engine=self.engine,
+            max_workers=self.max_workers,
+            stats={
+                key: value.isoformat(timespec='seconds') if isinstance(value, datetime) else value
+                for key, value in self.stats.items()
+            },
+        )
+        print(f"Отчёт: {report_path}")
         
         # Статистика базы
         print(f"\nВ базе всего: {Anime.objects.count()} аниме")
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Anime
+
+# Как часто процесс сверяет свои индексы с базой, секунд
+REFRESH_INTERVAL = 30
+# Строки перечитываются с запасом: транзакция может закоммититься позже,
+# чем выставила updated_at, и иначе проскочит мимо границы синхронизации
+SYNC_OVERLAP = timedelta(seconds=60)
+# Сколько pk в одном запросе IN (...): у SQLite лимит на число параметров
+PK_CHUNK = 500
+
+
+class AnimeMemoryIndex:
+    """База индексов аниме в памяти процесса.
+
+    Подкласс задаёт колонки (fields, первой - pk), умеет добавить строку
+    (_add, с заменой прежней версии того же pk), убрать её (_remove) и
+    перечислить pk, которые в нём есть (live_pks). Полная сборка читает
+    таблицу keyset-пагинацией, обновление (sync) - строки, у которых
+    сдвинулся updated_at, с перекрытием SYNC_OVERLAP; уже виденные
+    версии строк повторно не добавляются. Удаления по updated_at не
+    видны, поэтому sync сверяет множество pk индекса с базой.
+    """
+
+    fields: Tuple[str, ...] = ('pk', 'search_text')
+    # Доля устаревших позиций, после которой дешевле собрать индекс заново
+    max_dead_share = 0.25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.synced_until = None
+        # pk -> updated_at строк из окна перекрытия: их версия уже в индексе
+        self._seen: Dict[int, datetime] = {}
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def dead_count(self) -> int:
+        return 0
+
+    def live_pks(self) -> Iterable[int]:
+        raise NotImplementedError
+
+    def _add(self, row: tuple):
+        raise NotImplementedError
+
+    def _remove(self, pk: int):
+        raise NotImplementedError
+
+    def _finish(self):
+        """Вызывается после каждой пачки изменений"""
+
+    def load(self, batch_size: int = 5000):
+        started = timezone.now()
+        horizon = started - SYNC_OVERLAP
+        last_pk = 0
+        while True:
+            rows = list(
+                Anime.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list(*self.fields, 'updated_at')[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            with self._lock:
+                self._apply_rows(rows, horizon)
+        with self._lock:
+            self._finish()
+            self.synced_until = started
+
+    def apply(self, rows, horizon: Optional[datetime] = None):
+        """Добавить строки (поля fields + updated_at); уже виденные версии пропускаются"""
+        with self._lock:
+            self._apply_rows(rows, horizon)
+            self._finish()
+
+    def _apply_rows(self, rows, horizon: Optional[datetime]):
+        for *row, updated_at in rows:
+            pk = row[0]
+            if self._seen.get(pk) == updated_at:
+                continue
+            self._add(tuple(row))
+            # Помнить нужно только строки, которые перечитает окно перекрытия
+            if horizon is None or updated_at >= horizon:
+                self._seen[pk] = updated_at
+            else:
+                self._seen.pop(pk, None)
+
+    def sync(self):
+        """Подтянуть изменённые, новые и удалённые с прошлой синхронизации строки"""
+        now = timezone.now()
+        horizon = now - SYNC_OVERLAP
+        changed = list(Anime.objects.filter(updated_at__gte=self.synced_until - SYNC_OVERLAP)
+                       .values_list(*self.fields, 'updated_at'))
+        self.apply(changed, horizon)
+        self._reconcile(horizon)
+        with self._lock:
+            self._seen = {pk: updated_at for pk, updated_at in self._seen.items() if updated_at >= horizon}
+            self.synced_until = now
+
+    def _reconcile(self, horizon: datetime):
+        # Новые строки получают pk больше всех, что уже в индексе, и приходят
+        # через updated_at. Поэтому удаление (в том числе вместе со вставкой)
+        # видно по числу строк до наибольшего pk индекса - запрос по первичному ключу
+        with self._lock:
+            live = set(self.live_pks())
+        if not live:
+            return
+        top = max(live)
+        if Anime.objects.filter(pk__lte=top).count() == len(live):
+            return
+
+        existing = set(Anime.objects.filter(pk__lte=top).values_list('pk', flat=True))
+        removed = live - existing
+        # Строка, закоммиченная позже окна перекрытия, тоже найдётся здесь
+        missing = sorted(existing - live)
+        rows = []
+        for start in range(0, len(missing), PK_CHUNK):
+            rows.extend(Anime.objects.filter(pk__in=missing[start:start + PK_CHUNK])
+                        .values_list(*self.fields, 'updated_at'))
+        with self._lock:
+            for pk in removed:
+                if pk in self._seen:
+                    del self._seen[pk]
+                self._remove(pk)
+            self._apply_rows(rows, horizon)
+            self._finish()
+
+    def needs_rebuild(self) -> bool:
+        return self.dead_count() > len(self) * self.max_dead_share
+
+
+class IndexHolder:
+    """Общий на процесс экземпляр индекса и его обновление.
+
+    Первый вызов get() собирает индекс синхронно. Дальше get() не ходит
+    в базу: раз в refresh_interval он запускает фоновый поток, который
+    синхронизирует индекс с базой или, если в нём накопилось много
+    устаревших позиций, собирает новый рядом и подменяет им старый.
+    """
+
+    def __init__(self, factory: Callable[[], AnimeMemoryIndex], refresh_interval: float = REFRESH_INTERVAL):
+        self.factory = factory
+        self.refresh_interval = refresh_interval
+        self.index: Optional[AnimeMemoryIndex] = None
+        self._build_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._checked_at = 0.0
+        # Сборка могла идти в родителе (gunicorn --preload): её поток в
+        # дочерний процесс не переходит, а захваченная блокировка - да
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._build_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def get(self) -> AnimeMemoryIndex:
+        if self.index is None:
+            with self._build_lock:
+                if self.index is None:
+                    self.index = self._build()
+            return self.index
+
+        if time.monotonic() - self._checked_at >= self.refresh_interval and not self._refresh_lock.locked():
+            self._checked_at = time.monotonic()
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self.index
+
+    def refresh(self):
+        """Синхронно подтянуть изменения (для команд и проверок)"""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _build(self) -> AnimeMemoryIndex:
+        index = self.factory()
+        index.load()
+        self._checked_at = time.monotonic()
+        return index
+
+    def _refresh(self):
+        index = self.index
+        if index is None:
+            self.index = self._build()
+            return
+        index.sync()
+        if index.needs_rebuild():
+            self.index = self._build()
+        self._checked_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh()
+        except Exception as e:
+            print(f"Не удалось обновить индекс {self.factory.__name__}: {e}")
+        finally:
+            self._refresh_lock.release()
+            connection.close()
+
+
+def warm_up(getters: Iterable[Callable[[], AnimeMemoryIndex]]) -> threading.Thread:
+    """Собрать индексы в фоновом потоке при старте процесса
+
+    Сборка на 100k аниме - секунды; без прогрева их ждёт первый запрос.
+    Запрос, пришедший во время прогрева, дождётся той же сборки.
+    """
+    def build():
+        try:
+            for get in getters:
+                started = time.monotonic()
+                index = get()
+                print(f"Индекс {type(index).__name__}: {len(index)} аниме за {time.monotonic() - started:.1f} с")
+        except Exception as e:
+            print(f"Не удалось прогреть индексы: {e}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=build, name='index-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0005_anime_screenshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['status', 'last_synced'], name='anime_anime_status_60f755_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0006_anime_status_last_synced_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plan', models.CharField(default='shikimori', max_length=50)),
+                ('start_id', models.IntegerField()),
+                ('end_id', models.IntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('leased', 'В работе'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('owner', models.CharField(blank=True, max_length=200)),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('attempted', models.IntegerField(default=0)),
+                ('imported', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['plan', 'start_id'],
+                'indexes': [models.Index(fields=['plan', 'status', 'leased_until'], name='anime_impor_plan_fbbf69_idx')],
+                'unique_together': {('plan', 'start_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0008_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimeExternalId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('shikimori', 'Shikimori'), ('mal', 'MyAnimeList'), ('anilist', 'AniList'), ('kitsu', 'Kitsu'), ('anidb', 'AniDB')], max_length=20)),
+                ('external_id', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['mal_id'], name='anime_anime_mal_id_9e5210_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['anilist_id'], name='anime_anime_anilist_b6dbed_idx'),
+        ),
+        migrations.AddField(
+            model_name='animeexternalid',
+            name='anime',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_ids', to='anime.anime'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='animeexternalid',
+            unique_together={('source', 'external_id')},
+        ),
+    ]
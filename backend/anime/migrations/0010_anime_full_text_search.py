@@ -0,0 +1,79 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:05
+
+from django.db import OperationalError, migrations, models
+
+
+# SQL зафиксирован здесь, а не взят из anime.search: модуль может меняться,
+# а миграция должна применяться так же, как в момент написания
+FTS_TABLE = 'anime_anime_fts'
+PG_INDEX = 'anime_anime_search_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='anime_anime', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    # Строки, которые уже есть в таблице
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def install_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {PG_INDEX} "
+                f"ON anime_anime USING GIN (to_tsvector('simple', search_text))"
+            )
+        elif connection.vendor == 'sqlite':
+            try:
+                for sql in SQLITE_FTS_SQL:
+                    cursor.execute(sql)
+            except OperationalError:
+                # SQLite собран без FTS5 - поиск останется на LIKE
+                pass
+
+
+def uninstall_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY на PostgreSQL нельзя выполнять в транзакции
+    atomic = False
+
+    dependencies = [
+        ('anime', '0009_anime_external_ids'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='anime',
+            name='anime_anime_search__3eba09_idx',
+        ),
+        migrations.AlterField(
+            model_name='anime',
+            name='search_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(install_fts, uninstall_fts),
+    ]
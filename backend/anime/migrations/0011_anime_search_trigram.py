@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+# SQL зафиксирован здесь, а не взят из anime.fuzzy: модуль может меняться,
+# а миграция должна применяться так же, как в момент написания
+PG_INDEX = 'anime_anime_search_trgm'
+
+
+def install_trgm(apps, schema_editor):
+    # На остальных СУБД нечёткий поиск идёт по индексу в памяти
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {PG_INDEX} "
+            f"ON anime_anime USING GIN (search_text gin_trgm_ops)"
+        )
+
+
+def uninstall_trgm(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY на PostgreSQL нельзя выполнять в транзакции
+    atomic = False
+
+    dependencies = [
+        ('anime', '0010_anime_full_text_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_trgm, uninstall_trgm),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0011_anime_search_trigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['updated_at'], name='anime_anime_updated_57125c_idx'),
+        ),
+    ]
@@ -1,8 +1,11 @@
-from multiprocessing import connection
-from django.db import models
+import io
+import json
+from django.db import connections, models, transaction
 from django.utils.text import slugify
 from django.db.models import Manager  # Добавляем импорт
 
+from .search_keys import build_search_key
+
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
@@ -18,37 +21,134 @@ class Genre(models.Model):
 class BulkImportManager(Manager):
     """Менеджер для массовой вставки"""
     
-    def bulk_create_fast(self, objs, batch_size=1000):
-        """Быстрая массовая вставка с использованием RAW SQL"""
+    def bulk_create_fast(self, objs, batch_size=1000, update_conflicts=False, unique_fields=None):
+        """Быстрая массовая загрузка.
+
+        На PostgreSQL строки идут через COPY FROM STDIN во временную
+        таблицу и сливаются в основную одним INSERT ... ON CONFLICT. На
+        остальных СУБД - многострочные INSERT пачками по batch_size.
+        Возвращает количество переданных строк.
+        """
+        objs = list(objs)
         if not objs:
-            return
-        
+            return 0
+
         model = self.model
-        fields = [f for f in model._meta.fields if not f.auto_created]
-        field_names = [f.column for f in fields]
-        
-        placeholders = ['%s'] * len(field_names)
-        sql = f"""
-            INSERT INTO {model._meta.db_table} ({','.join(field_names)})
-            VALUES ({','.join(placeholders)})
-            ON CONFLICT DO NOTHING
-        """
-        
+        unique_fields = list(unique_fields or [
+            f.name for f in model._meta.local_concrete_fields
+            if f.unique and not f.primary_key
+        ][:1])
+        fields = [
+            f for f in model._meta.local_concrete_fields
+            if not isinstance(f, models.AutoField)
+        ]
+        update_fields = [
+            f.name for f in fields
+            if f.name not in unique_fields and not getattr(f, 'auto_now_add', False)
+        ]
+
+        objs = self._dedupe(objs, unique_fields)
+        for obj in objs:
+            if hasattr(obj, 'fill_computed_fields'):
+                obj.fill_computed_fields()
+
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(using=self.db):
+                self._copy_merge(connection, objs, fields, batch_size, update_conflicts,
+                                 unique_fields, update_fields)
+        else:
+            self.bulk_create(
+                objs,
+                batch_size=batch_size,
+                ignore_conflicts=not update_conflicts,
+                update_conflicts=update_conflicts,
+                unique_fields=unique_fields if update_conflicts else None,
+                update_fields=update_fields if update_conflicts else None,
+            )
+
+        return len(objs)
+
+    def _dedupe(self, objs, unique_fields):
+        # Один INSERT ... ON CONFLICT не может дважды задеть одну строку
+        if not unique_fields:
+            return objs
+        by_key = {}
+        for obj in objs:
+            key = tuple(getattr(obj, self.model._meta.get_field(f).attname) for f in unique_fields)
+            by_key[key if None not in key else id(obj)] = obj
+        return list(by_key.values())
+
+    def _copy_merge(self, connection, objs, fields, batch_size, update_conflicts,
+                    unique_fields, update_fields):
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        stage = qn(f'{self.model._meta.db_table}_stage')
+        columns = ', '.join(qn(f.column) for f in fields)
+
         with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {stage} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+
+            copy_sql = f'COPY {stage} ({columns}) FROM STDIN'
             for i in range(0, len(objs), batch_size):
-                batch = objs[i:i+batch_size]
-                values = []
-                for obj in batch:
-                    row = []
-                    for field in fields:
-                        value = getattr(obj, field.attname)
-                        row.append(value)
-                    values.append(row)
-                
-                cursor.executemany(sql, values)
-                for obj in batch:
-                    print(f"✅ Bulk imported: {obj.title_ru or obj.title_en or f'ID:{obj.shikimori_id}'}")
-                print(f"Вставлено {i+len(batch)}/{len(objs)} записей")
+                rows = (
+                    '\t'.join(self._copy_value(f, f.pre_save(obj, add=True)) for f in fields)
+                    for obj in objs[i:i + batch_size]
+                )
+                self._copy(cursor.cursor, copy_sql, '\n'.join(rows) + '\n')
+
+            conflict_target = ', '.join(qn(self.model._meta.get_field(f).column) for f in unique_fields)
+            if not unique_fields:
+                on_conflict = 'ON CONFLICT DO NOTHING'
+            elif update_conflicts:
+                assignments = ', '.join(
+                    f'{qn(self.model._meta.get_field(name).column)} = EXCLUDED.{qn(self.model._meta.get_field(name).column)}'
+                    for name in update_fields
+                )
+                on_conflict = f'ON CONFLICT ({conflict_target}) DO UPDATE SET {assignments}'
+            else:
+                on_conflict = f'ON CONFLICT ({conflict_target}) DO NOTHING'
+
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} {on_conflict}'
+            )
+            # ON COMMIT DROP срабатывает только на внешнем коммите: без явного DROP
+            # второй вызов внутри того же atomic() упал бы на CREATE TEMP TABLE
+            cursor.execute(f'DROP TABLE {stage}')
+
+    @staticmethod
+    def _copy(raw_cursor, sql, data):
+        if hasattr(raw_cursor, 'copy_expert'):
+            # psycopg2
+            raw_cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(data)
+
+    @staticmethod
+    def _copy_value(field, value):
+        """Значение в текстовом формате COPY"""
+        value = field.get_prep_value(value)
+        if value is None:
+            return '\\N'
+        if isinstance(field, models.JSONField):
+            value = json.dumps(value, ensure_ascii=False)
+        elif isinstance(value, bool):
+            value = 't' if value else 'f'
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        else:
+            value = str(value)
+        return (
+            value.replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+        )
 
                 
 class Studio(models.Model):
@@ -68,13 +168,6 @@ class Studio(models.Model):
 class Anime(models.Model):
 
     objects = BulkImportManager() 
-    
-    class Meta:
-        indexes = [
-            models.Index(fields=['shikimori_id']),
-            models.Index(fields=['mal_id']),
-            models.Index(fields=['anilist_id']),
-        ]
 
     STATUS_CHOICES = [
         ('ongoing', 'Онгоинг'),
@@ -135,8 +228,8 @@ class Anime(models.Model):
     genres = models.ManyToManyField(Genre, related_name='anime', blank=True)
     studios = models.ManyToManyField(Studio, related_name='anime', blank=True)
     
-    # Поисковый текст
-    search_text = models.TextField(blank=True, db_index=True)
+    # Поисковый текст (полнотекстовый индекс по нему - в anime/search.py)
+    search_text = models.TextField(blank=True)
 
     # Технические поля
     data_source = models.CharField(max_length=100, default='shikimori')
@@ -155,10 +248,16 @@ class Anime(models.Model):
             models.Index(fields=['year']),
             models.Index(fields=['status']),
             models.Index(fields=['score']),
-            models.Index(fields=['search_text']),
+            models.Index(fields=['status', 'last_synced']),
+            # shikimori_id уже проиндексирован через unique
+            models.Index(fields=['mal_id']),
+            models.Index(fields=['anilist_id']),
+            # Индексы в памяти и выгрузка каталога читают изменения по updated_at
+            models.Index(fields=['updated_at']),
         ]
     
-    def save(self, *args, **kwargs):
+    def fill_computed_fields(self):
+        """Заполнить производные поля (вызывается и из save, и при массовой записи)"""
         # Генерируем slug
         if not self.slug:
             base = self.title_ru or self.title_en or str(self.shikimori_id)
@@ -169,9 +268,11 @@ class Anime(models.Model):
         if self.aired_from and not self.year:
             self.year = self.aired_from.year
 
-        # Создаем поисковый текст
-        self.search_text = f"{self.title_ru or ''} {self.title_en or ''} {self.title_jp or ''}".strip().lower()
+        # Поисковый ключ: нормализованные названия с транслитерацией (anime/search_keys.py)
+        self.search_text = build_search_key(self.title_ru, self.title_en, self.title_jp)
 
+    def save(self, *args, **kwargs):
+        self.fill_computed_fields()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -181,6 +282,32 @@ class Anime(models.Model):
     def display_title(self):
         return self.title_ru or self.title_en or 'Без названия'
     
+
+class AnimeExternalId(models.Model):
+    """Внешний ID аниме в одном из источников (Shikimori, MAL, AniList...)
+
+    По (source, external_id) - уникальный индекс, так что поиск по
+    любому внешнему ID - один запрос по индексу.
+    """
+    SOURCE_CHOICES = [
+        ('shikimori', 'Shikimori'),
+        ('mal', 'MyAnimeList'),
+        ('anilist', 'AniList'),
+        ('kitsu', 'Kitsu'),
+        ('anidb', 'AniDB'),
+    ]
+
+    anime = models.ForeignKey(Anime, on_delete=models.CASCADE, related_name='external_ids')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    external_id = models.IntegerField()
+
+    class Meta:
+        unique_together = ['source', 'external_id']
+
+    def __str__(self):
+        return f"{self.source}:{self.external_id} → {self.anime_id}"
+
+
 class VoiceActor(models.Model):
     """Актер озвучки"""
     name = models.CharField(max_length=200)
@@ -349,4 +476,88 @@ class UserDubRating(models.Model):
         unique_together = ['user', 'dub']
     
     def __str__(self):
-        return f"{self.user.username} - {self.dub} - {self.rating}"
\ No newline at end of file
+        return f"{self.user.username} - {self.dub} - {self.rating}"
+
+class ImportLease(models.Model):
+    """Диапазон ID Shikimori для распределённого импорта.
+
+    Воркер захватывает свободный диапазон на время lease_until и
+    продлевает аренду, пока работает; просроченный диапазон может
+    забрать другой воркер.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('leased', 'В работе'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    plan = models.CharField(max_length=50, default='shikimori')
+    start_id = models.IntegerField()
+    end_id = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    owner = models.CharField(max_length=200, blank=True)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+
+    # Итоги последней попытки
+    attempted = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['plan', 'start_id']
+        unique_together = ['plan', 'start_id']
+        indexes = [
+            models.Index(fields=['plan', 'status', 'leased_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.plan} {self.start_id}-{self.end_id} ({self.status})"
+
+
+class ImportJob(models.Model):
+    """Фоновое задание импорта аниме по внешним ID (admin API)"""
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    source = models.CharField(max_length=50, default='shikimori')
+    external_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    # {внешний ID: imported | missing | error}
+    results = models.JSONField(default=dict, blank=True)
+    imported = models.IntegerField(default=0)
+    missing = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='import_jobs')
+    task_id = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Импорт #{self.pk} ({len(self.external_ids)} ID, {self.status})"
+
+    def set_results(self, results):
+        """Сохранить результаты и пересчитать счётчики"""
+        self.results = {str(external_id): result for external_id, result in results.items()}
+        values = list(self.results.values())
+        self.imported = values.count('imported')
+        self.missing = values.count('missing')
+        self.failed = values.count('error')
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from .import_journal import default_state_dir
+
+
+class RawPayloadCache:
+    """Кеш сырых ответов апстримов на диске.
+
+    Сами ответы лежат в objects/ сжатыми zlib-блобами, имя блоба -
+    sha256 от канонического JSON, так что одинаковые ответы хранятся
+    один раз. Индекс (источник, внешний ID) → (sha, ETag, время
+    загрузки) - небольшая SQLite-база рядом. По кешу можно заново
+    прогнать нормализацию без единого сетевого запроса.
+    """
+
+    _shared: Dict[Tuple[int, Path], 'RawPayloadCache'] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, root: Optional[Path] = None) -> 'RawPayloadCache':
+        """Общий кеш процесса для папки root
+
+        Сервисы и задачи создаются на каждый запрос, а соединение с
+        индексом нужно одно. Ключ включает pid: после fork (prefork-воркеры
+        Celery) у дочернего процесса своё соединение.
+        """
+        key = (os.getpid(), Path(root) if root else default_state_dir() / 'payloads')
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls._shared[key] = cls(key[1])
+            return cache
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root else default_state_dir() / 'payloads'
+        self.objects = self.root / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root / 'index.sqlite3', check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS payloads ('
+            ' source TEXT NOT NULL,'
+            ' external_id INTEGER NOT NULL,'
+            ' sha TEXT NOT NULL,'
+            ' etag TEXT,'
+            ' fetched_at TEXT NOT NULL,'
+            ' PRIMARY KEY (source, external_id))'
+        )
+
+    def _object_path(self, sha: str) -> Path:
+        return self.objects / sha[:2] / f'{sha}.json.z'
+
+    def put(self, source: str, external_id: int, payload: Dict, etag: Optional[str] = None) -> str:
+        """Сохранить ответ; вернуть его sha256"""
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        sha = hashlib.sha256(data).hexdigest()
+
+        path = self._object_path(sha)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO payloads (source, external_id, sha, etag, fetched_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (source, external_id) DO UPDATE SET '
+                # Ответ без ETag (asyncio-движок) не стирает ETag того же содержимого
+                'etag = COALESCE(excluded.etag, CASE WHEN payloads.sha = excluded.sha THEN payloads.etag END), '
+                'sha = excluded.sha, fetched_at = excluded.fetched_at',
+                (source, int(external_id), sha, etag, self._now()),
+            )
+        return sha
+
+    def entry(self, source: str, external_id: int) -> Optional[Tuple[str, Optional[str]]]:
+        """(sha, etag) для ID или None"""
+        with self._lock:
+            return self._db.execute(
+                'SELECT sha, etag FROM payloads WHERE source = ? AND external_id = ?',
+                (source, int(external_id)),
+            ).fetchone()
+
+    def etag(self, source: str, external_id: int) -> Optional[str]:
+        entry = self.entry(source, external_id)
+        return entry[1] if entry else None
+
+    def get(self, source: str, external_id: int) -> Optional[Dict]:
+        entry = self.entry(source, external_id)
+        return self._load(entry[0]) if entry else None
+
+    def touch(self, source: str, external_id: int):
+        """Ответ не изменился (304) - обновить только время проверки"""
+        with self._lock:
+            self._db.execute(
+                'UPDATE payloads SET fetched_at = ? WHERE source = ? AND external_id = ?',
+                (self._now(), source, int(external_id)),
+            )
+
+    def iter_payloads(self, source: str) -> Iterator[Tuple[int, Dict]]:
+        """Все ответы источника по возрастанию ID"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT external_id, sha FROM payloads WHERE source = ? ORDER BY external_id',
+                (source,),
+            ).fetchall()
+        for external_id, sha in rows:
+            payload = self._load(sha)
+            if payload is not None:
+                yield external_id, payload
+
+    def count(self, source: str) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM payloads WHERE source = ?', (source,)).fetchone()[0]
+
+    def close(self):
+        with self._shared_lock:
+            for key, cache in list(self._shared.items()):
+                if cache is self:
+                    del self._shared[key]
+        self._db.close()
+
+    def _load(self, sha: str) -> Optional[Dict]:
+        try:
+            return json.loads(zlib.decompress(self._object_path(sha).read_bytes()))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec='seconds')
@@ -0,0 +1,99 @@
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+from parsers.anilist import AnilistParser
+from .models import Anime
+
+
+def missing_poster_q() -> Q:
+    """Аниме без постера: заглушки Shikimori (missing_original / missing_x96) или пусто"""
+    return Q(poster_url='') | Q(poster_url__contains='/missing_')
+
+
+class AnilistPosterResolver:
+    """Поиск недостающих постеров на AniList пачками.
+
+    Запускается после импорта, а не на каждую запись: названия
+    отправляются по POSTER_BATCH_LIMIT штук в одном GraphQL-запросе с
+    алиасами. Сначала ищем по английскому названию, для ненайденных -
+    по японскому, затем по русскому.
+    """
+
+    # Известные заглушки AniList, которые постером не считаются
+    BAD_PATTERNS = [
+        'bx115853',
+        'anilistcdn/media/anime/cover/medium/default',
+    ]
+
+    def __init__(self, parser: Optional[AnilistParser] = None, batch_size: int = 500):
+        self.parser = parser or AnilistParser()
+        self.batch_size = batch_size
+        self.stats = {'checked': 0, 'updated': 0, 'requests': 0, 'errors': 0}
+
+    def resolve(self, queryset=None, shikimori_ids: Optional[Iterable[int]] = None) -> int:
+        """Найти постеры для аниме без постера; вернуть число обновлённых"""
+        if queryset is None:
+            queryset = Anime.objects.all()
+        queryset = queryset.filter(missing_poster_q())
+        if shikimori_ids is not None:
+            queryset = queryset.filter(shikimori_id__in=list(shikimori_ids))
+
+        # Читаем список целиком: найденные строки обновляются по ходу и выпадают из выборки
+        rows = list(queryset.values_list('id', 'title_en', 'title_jp', 'title_ru'))
+
+        updated = 0
+        for i in range(0, len(rows), self.batch_size):
+            updated += self._resolve_batch(rows[i:i + self.batch_size])
+        return updated
+
+    def _resolve_batch(self, rows: List[tuple]) -> int:
+        self.stats['checked'] += len(rows)
+        candidates = {pk: self._titles(titles) for pk, *titles in rows}
+        found: Dict[int, str] = {}
+
+        # Раунд на каждый вариант названия, в раунде - пачки по POSTER_BATCH_LIMIT
+        for round_index in range(3):
+            pending = {
+                pk: titles[round_index]
+                for pk, titles in candidates.items()
+                if pk not in found and round_index < len(titles)
+            }
+            if not pending:
+                break
+
+            titles = list(dict.fromkeys(pending.values()))
+            try:
+                posters = self.parser.get_posters_batch(titles)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Ошибка пакетного поиска постеров: {str(e)[:100]}")
+                continue
+            self.stats['requests'] += -(-len(titles) // self.parser.POSTER_BATCH_LIMIT)
+
+            for pk, title in pending.items():
+                poster = posters.get(title)
+                if poster and not self._is_default_poster(poster):
+                    found[pk] = poster
+
+        if not found:
+            return 0
+
+        now = timezone.now()
+        objs = [Anime(id=pk, poster_url=poster, updated_at=now) for pk, poster in found.items()]
+        Anime.objects.bulk_update(objs, ['poster_url', 'updated_at'], batch_size=self.batch_size)
+        self.stats['updated'] += len(objs)
+        return len(objs)
+
+    @staticmethod
+    def _titles(titles) -> List[str]:
+        cleaned = []
+        for title in titles:
+            title = (title or '').strip('[]"\' ')
+            if title and title not in cleaned:
+                cleaned.append(title)
+        return cleaned
+
+    def _is_default_poster(self, poster_url: str) -> bool:
+        return any(pattern in poster_url for pattern in self.BAD_PATTERNS)
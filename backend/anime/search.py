@@ -0,0 +1,281 @@
+import json
+from base64 import b64decode, b64encode
+from typing import List, Optional, Tuple
+
+from django.db import OperationalError, connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .autocomplete import get_prefix_index
+from .fuzzy import fuzzy_search, get_trigram_index
+from .memory_index import warm_up
+from .models import Anime
+from .search_keys import query_tokens as normalized_tokens
+
+# Без стемминга: в названиях вперемешку русский, английский и японский
+TS_CONFIG = 'simple'
+FTS_TABLE = 'anime_anime_fts'
+PG_INDEX = 'anime_anime_search_fts'
+
+# Больше слов в запросе не бывает осмысленно, а каждое - отдельное условие
+MAX_TOKENS = 8
+
+# Индекс на SQLite - внешняя FTS5-таблица над anime_anime.search_text,
+# которую обновляют триггеры: при save, bulk_create/upsert и bulk_update
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_text, content='anime_anime', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON anime_anime BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+]
+SQLITE_TRIGGERS = {f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'}
+
+
+def install_fts(connection, concurrently: bool = False) -> bool:
+    """Создать полнотекстовый индекс, если его нет; False - СУБД не поддерживается
+
+    На PostgreSQL - GIN по to_tsvector(search_text), его СУБД ведёт сама.
+    На SQLite таблица пересоздаётся миграциями вместе с потерей
+    триггеров, поэтому при их отсутствии индекс перестраивается заново.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {PG_INDEX} "
+                f"ON anime_anime USING GIN (to_tsvector('{TS_CONFIG}', search_text))"
+            )
+            return True
+        if connection.vendor != 'sqlite':
+            return False
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'anime_anime'")
+        triggers = {name for name, in cursor.fetchall()}
+        try:
+            for sql in SQLITE_FTS_SQL:
+                cursor.execute(sql)
+        except OperationalError:
+            # SQLite собран без FTS5 - поиск останется на LIKE
+            return False
+        if not SQLITE_TRIGGERS <= triggers:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _available.pop(connection.alias, None)
+    return True
+
+
+def uninstall_fts(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+        elif connection.vendor == 'sqlite':
+            for name in sorted(SQLITE_TRIGGERS):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _available.pop(connection.alias, None)
+
+
+_available = {}
+
+
+def fts_available(using: str = 'default') -> bool:
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            _available[using] = True
+        elif connection.vendor == 'sqlite':
+            _available[using] = FTS_TABLE in connection.introspection.table_names()
+        else:
+            _available[using] = False
+    return _available[using]
+
+
+def query_tokens(query: str) -> List[str]:
+    # Та же нормализация, что у search_text: регистр, ё, пунктуация
+    return normalized_tokens(query, limit=MAX_TOKENS)
+
+
+def search_anime(queryset, query: str):
+    """Отфильтровать queryset по поисковому запросу, лучшие совпадения первыми
+
+    Каждое слово запроса - префикс («нару» найдёт «наруто»), слова
+    объединяются через И. Без полнотекстового индекса - icontains по
+    search_text, как раньше.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return queryset
+
+    using = queryset.db
+    vendor = connections[using].vendor
+    ordering = ['-search_rank', *Anime._meta.ordering, 'pk']
+
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        vector = f"to_tsvector('{TS_CONFIG}', anime_anime.search_text)"
+        return (
+            queryset
+            .filter(RawSQL(f"{vector} @@ to_tsquery('{TS_CONFIG}', %s)", [tsquery], output_field=BooleanField()))
+            .annotate(search_rank=RawSQL(f"ts_rank({vector}, to_tsquery('{TS_CONFIG}', %s))", [tsquery],
+                                         output_field=FloatField()))
+            .order_by(*ordering)
+        )
+
+    if vendor == 'sqlite' and fts_available(using):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # JOIN с FTS-таблицей: bm25 доступна только в запросе с MATCH
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = anime_anime.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'-bm25({FTS_TABLE})'},
+        ).order_by(*ordering)
+
+    condition = Q()
+    for token in tokens:
+        condition &= Q(search_text__icontains=token)
+    return queryset.filter(condition)
+
+
+def warm_up_indexes(using: str = 'default'):
+    """Прогреть индексы в памяти, которые нужны поиску и подсказкам на этой СУБД
+
+    Триграммный индекс нужен только там, где нет pg_trgm.
+    """
+    getters = [get_prefix_index]
+    if connections[using].vendor != 'postgresql':
+        getters.append(get_trigram_index)
+    return warm_up(getters)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """SearchFilter с тем же параметром ?search=, но через полнотекстовый индекс
+
+    Если полнотекстовый поиск ничего не нашёл, запрос повторяется
+    нечётким поиском по триграммам (anime/fuzzy.py).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        results = search_anime(queryset, query)
+        if results.exists():
+            return results
+        # Точных совпадений нет - вероятно, опечатка
+        return fuzzy_search(queryset, query)
+
+
+def estimate_count(queryset) -> Tuple[int, bool]:
+    """(число строк, точное ли оно)
+
+    На PostgreSQL - оценка планировщика из EXPLAIN без выполнения
+    запроса, на остальных СУБД - COUNT(*), который при поиске
+    обслуживается полнотекстовым индексом.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows']), False
+    return queryset.count(), True
+
+
+class SearchCursorPagination(BasePagination):
+    """Курсорная пагинация результатов поиска.
+
+    Из выдачи, упорядоченной по релевантности, берутся только pk первых
+    max_results строк - это и есть жёсткий предел поиска. Курсор хранит
+    позицию и pk первой строки страницы: если выдача между запросами
+    сдвинулась, страница продолжается с той же строки. Полные объекты
+    грузятся только для одной страницы. count точный, пока совпадений
+    меньше предела, иначе - оценка (count_exact=False).
+    """
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # Глубже первой тысячи совпадений поиск не листается
+    max_results = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ids = list(queryset.values_list('pk', flat=True)[:self.max_results + 1])
+        self.truncated = len(ids) > self.max_results
+        self.ids = ids[:self.max_results]
+        if self.truncated:
+            self.count, self.count_exact = estimate_count(queryset)
+            self.count = max(self.count, len(ids))
+        else:
+            self.count, self.count_exact = len(self.ids), True
+
+        self.offset = self._decode_cursor(request.query_params.get(self.cursor_query_param))
+        page_ids = self.ids[self.offset:self.offset + self.page_size]
+        objs = {obj.pk: obj for obj in queryset.model._base_manager.filter(pk__in=page_ids)
+                .prefetch_related(*getattr(view, 'search_prefetch', ()))}
+        return [objs[pk] for pk in page_ids if pk in objs]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_exact': self.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self) -> Optional[str]:
+        offset = self.offset + self.page_size
+        if offset >= len(self.ids):
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self._encode_cursor(offset))
+
+    def get_previous_link(self) -> Optional[str]:
+        if self.offset <= 0:
+            return None
+        offset = max(self.offset - self.page_size, 0)
+        if offset == 0:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(self.base_url, self.cursor_query_param, self._encode_cursor(offset))
+
+    def _encode_cursor(self, offset: int) -> str:
+        payload = json.dumps({'o': offset, 'p': self.ids[offset]}, separators=(',', ':'))
+        return b64encode(payload.encode()).decode()
+
+    def _decode_cursor(self, cursor: Optional[str]) -> int:
+        if not cursor:
+            return 0
+        try:
+            payload = json.loads(b64decode(cursor.encode(), validate=True))
+            offset, pk = int(payload['o']), payload['p']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Неверный курсор')
+        if 0 <= offset < len(self.ids) and self.ids[offset] == pk:
+            return offset
+        # Выдача сдвинулась: продолжаем с той же строки, если она ещё в ней есть
+        try:
+            return self.ids.index(pk)
+        except ValueError:
+            return min(max(offset, 0), len(self.ids))
@@ -0,0 +1,136 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+# Знаки внутри слова склеивают его части: «Ван-Пис» -> «ванпис», «Re:Zero» -> «rezero»
+JOINERS_RE = re.compile(r"(?<=[^\W_])[-'’`:.·・](?=[^\W_])")
+SEPARATORS_RE = re.compile(r'[\W_]+')
+CYRILLIC_RE = re.compile('[а-я]')
+LATIN_WORD_RE = re.compile('^[a-z]+$')
+
+# Русский -> латиница, как обычно набирают названия в транслите
+RU_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch',
+    'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Ромадзи (Хэпбёрн) -> кириллица по Поливанову; длинные слоги раньше коротких
+ROMAJI_TO_CYRILLIC = {
+    'kya': 'кя', 'kyu': 'кю', 'kyo': 'кё', 'sha': 'ся', 'shu': 'сю', 'sho': 'сё', 'shi': 'си',
+    'cha': 'тя', 'chu': 'тю', 'cho': 'тё', 'chi': 'ти', 'tsu': 'цу', 'nya': 'ня', 'nyu': 'ню',
+    'nyo': 'нё', 'hya': 'хя', 'hyu': 'хю', 'hyo': 'хё', 'mya': 'мя', 'myu': 'мю', 'myo': 'мё',
+    'rya': 'ря', 'ryu': 'рю', 'ryo': 'рё', 'gya': 'гя', 'gyu': 'гю', 'gyo': 'гё', 'bya': 'бя',
+    'byu': 'бю', 'byo': 'бё', 'pya': 'пя', 'pyu': 'пю', 'pyo': 'пё',
+    'ka': 'ка', 'ki': 'ки', 'ku': 'ку', 'ke': 'кэ', 'ko': 'ко', 'sa': 'са', 'si': 'си',
+    'su': 'су', 'se': 'сэ', 'so': 'со', 'ta': 'та', 'ti': 'ти', 'tu': 'цу', 'te': 'тэ',
+    'to': 'то', 'na': 'на', 'ni': 'ни', 'nu': 'ну', 'ne': 'нэ', 'no': 'но', 'ha': 'ха',
+    'hi': 'хи', 'fu': 'фу', 'hu': 'фу', 'he': 'хэ', 'ho': 'хо', 'ma': 'ма', 'mi': 'ми',
+    'mu': 'му', 'me': 'мэ', 'mo': 'мо', 'ya': 'я', 'yu': 'ю', 'yo': 'ё', 'ra': 'ра',
+    'ri': 'ри', 'ru': 'ру', 're': 'рэ', 'ro': 'ро', 'wa': 'ва', 'wo': 'о', 'ga': 'га',
+    'gi': 'ги', 'gu': 'гу', 'ge': 'гэ', 'go': 'го', 'za': 'дза', 'zi': 'дзи', 'zu': 'дзу',
+    'ze': 'дзэ', 'zo': 'дзо', 'ja': 'дзя', 'ji': 'дзи', 'ju': 'дзю', 'jo': 'дзё', 'da': 'да',
+    'di': 'дзи', 'du': 'дзу', 'de': 'дэ', 'do': 'до', 'ba': 'ба', 'bi': 'би', 'bu': 'бу',
+    'be': 'бэ', 'bo': 'бо', 'pa': 'па', 'pi': 'пи', 'pu': 'пу', 'pe': 'пэ', 'po': 'по',
+    'a': 'а', 'i': 'и', 'u': 'у', 'e': 'э', 'o': 'о', 'n': 'н',
+}
+# Удвоенная согласная (сокуон): «Hokkaido» -> «Хоккайдо»
+SOKUON = {'k': 'к', 's': 'с', 't': 'т', 'p': 'п', 'c': 'т'}
+VOWELS = 'аиуэоёюя'
+
+
+def normalize(text) -> str:
+    """Регистр (casefold), ё -> е, латиница без диакритики, пунктуация склеена или в пробелы
+
+    Список названий (как english/japanese в REST Shikimori) склеивается
+    через пробел, прочие не-строки приводятся к str.
+    """
+    if not text:
+        return ''
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(item) for item in text if item)
+    elif not isinstance(text, str):
+        text = str(text)
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    # ō -> o, é -> e; кириллицу не трогаем, иначе й распадётся на и
+    text = ''.join(
+        unicodedata.normalize('NFKD', ch)[0] if 'à' <= ch <= 'ž' else ch
+        for ch in text
+    )
+    return text
+
+
+def tokens(text) -> List[str]:
+    """Слова нормализованного текста: склеенные формы и, если отличаются, части"""
+    text = normalize(text)
+    joined = SEPARATORS_RE.sub(' ', JOINERS_RE.sub('', text)).split()
+    split = SEPARATORS_RE.sub(' ', text).split()
+    return list(dict.fromkeys(joined + split))
+
+
+def ru_to_latin(word: str) -> str:
+    return ''.join(RU_TO_LATIN.get(ch, ch) for ch in word)
+
+
+def romaji_to_cyrillic(word: str) -> Optional[str]:
+    """Слово ромадзи кириллицей; None, если слово не разбирается на слоги (английское)"""
+    if not LATIN_WORD_RE.match(word):
+        return None
+    out = []
+    i = 0
+    while i < len(word):
+        # Сокуон: kk, ss, tt, pp и tch
+        if i + 1 < len(word) and word[i] in SOKUON and (word[i + 1] == word[i] or word[i:i + 3] == 'tch'):
+            out.append(SOKUON[word[i]])
+            i += 1
+            continue
+        # i после гласной - й: «ai» -> «ай», «ei» -> «эй»
+        if word[i] == 'i' and out and out[-1][-1] in VOWELS:
+            out.append('й')
+            i += 1
+            continue
+        for size in (3, 2, 1):
+            syllable = ROMAJI_TO_CYRILLIC.get(word[i:i + size])
+            if syllable:
+                out.append(syllable)
+                i += size
+                break
+        else:
+            return None
+    return ''.join(out)
+
+
+def build_search_key(*titles) -> str:
+    """Поисковый ключ аниме: нормализованные названия и их транслитерации
+
+    Русские слова дописываются латиницей («ванпис» -> «vanpis»), слова
+    ромадзи - кириллицей по Поливанову («kyojin» -> «кёдзин», после ё -> е
+    «кедзин»), в том числе с «е» вместо «э». Повторы слов убираются.
+    """
+    words = []
+    for title in titles:
+        words.extend(tokens(title))
+
+    variants = []
+    for word in words:
+        if CYRILLIC_RE.search(word):
+            variants.append(ru_to_latin(word))
+        else:
+            cyrillic = romaji_to_cyrillic(word)
+            if cyrillic:
+                cyrillic = cyrillic.replace('ё', 'е')
+                # По-русски чаще пишут «е», чем поливановское «э»
+                variants.extend([cyrillic, cyrillic.replace('э', 'е')])
+    return ' '.join(dict.fromkeys(words + variants))
+
+
+def query_tokens(query: str, limit: Optional[int] = None) -> List[str]:
+    """Слова запроса после той же нормализации, что у ключей (склеенные формы)"""
+    text = normalize(query)
+    words = SEPARATORS_RE.sub(' ', JOINERS_RE.sub('', text)).split()
+    return words[:limit] if limit else words
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query_tokens(query))
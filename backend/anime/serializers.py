@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Anime, Genre
+from .models import Anime, Genre, ImportJob
 
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,4 +15,15 @@ class AnimeSerializer(serializers.ModelSerializer):
             'id', 'title_ru', 'title_en', 'title_jp',
             'description', 'year', 'status', 'episodes',
             'score', 'poster_url', 'trailer_url', 'genres', 'created_at'
-        ]
\ No newline at end of file
+        ]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    requested_by = serializers.StringRelatedField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'source', 'status', 'external_ids', 'imported', 'missing', 'failed',
+            'results', 'error', 'requested_by', 'created_at', 'started_at', 'finished_at'
+        ]
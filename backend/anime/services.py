@@ -1,74 +1,175 @@
-import time
 import random
 from datetime import datetime
-from django.db import transaction
+from typing import Callable, Dict, Iterable, Optional
+from parsers.multi_source import MultiSourceParser
 from parsers.shikimori import ShikimoriParser
-from .models import Anime, Genre, Studio
+from .bulk_writer import AnimeBulkWriter
+from .id_bitmap import ShikimoriIdBitmap
+from .models import Anime
+from .payload_cache import RawPayloadCache
+from .poster_resolver import AnilistPosterResolver
+
+
+# Поля нормализованной записи, которые сохраняет импорт
+RECORD_FIELDS = (
+    'id', 'title_ru', 'title_en', 'title_jp', 'description', 'year', 'status',
+    'episodes', 'score', 'popularity', 'poster_url', 'screenshots', 'genres',
+)
+
 
 class AnimeImportService:
     """Упрощенный сервис импорта"""
     
     def __init__(self):
-        self.parser = ShikimoriParser()
+        self.parser = ShikimoriParser(payload_cache=RawPayloadCache.shared())
+        self._bitmap = None
+
+    @property
+    def bitmap(self) -> ShikimoriIdBitmap:
+        """Карта известных ID (читается с диска при первом обращении)"""
+        if self._bitmap is None:
+            self._bitmap = ShikimoriIdBitmap.load()
+        return self._bitmap
+
+    def _batch_writer(self, batch_size: int) -> AnimeBulkWriter:
+        return AnimeBulkWriter(batch_size=batch_size, on_flush=self.bitmap.mark_present)
     
     def import_single_anime(self, shikimori_id: int) -> Anime:
         """Импорт одного аниме"""
+        data = self._fetch_normalized(shikimori_id)
+        if not data:
+            return None
+
+        writer = AnimeBulkWriter()
+        writer.add(self._to_record(data))
+        created_ids = writer.flush()
+        anime = Anime.objects.get(shikimori_id=shikimori_id)
+        if not anime.poster_url or '/missing_' in anime.poster_url:
+            # Одиночный импорт не ждёт AniList: постер найдёт резолвер в фоне
+            from .tasks import resolve_posters
+            resolve_posters.delay([shikimori_id])
+
+        action = "Создано" if shikimori_id in created_ids else "Обновлено"
+        print(f"  ✓ {action}: {anime.title_ru}")
+
+        return anime
+
+    def import_many(self, shikimori_ids: Iterable[int],
+                    on_progress: Optional[Callable[[Dict[int, str]], None]] = None,
+                    source: str = 'shikimori') -> Dict[int, str]:
+        """Импорт (или обновление) явного списка ID пачками GraphQL
+
+        Возвращает статус каждого ID: imported, missing или error.
+        on_progress получает промежуточные результаты после каждой пачки.
+        source='multi' - опрос Shikimori, AniList и Jikan сразу со слиянием полей.
+        """
+        if source == 'multi':
+            return self._import_many_multi(shikimori_ids, on_progress)
+
+        shikimori_ids = list(dict.fromkeys(int(aid) for aid in shikimori_ids))
+        results: Dict[int, str] = {}
+        writer = self._batch_writer(self.parser.GRAPHQL_BATCH_LIMIT)
+
+        for i in range(0, len(shikimori_ids), self.parser.GRAPHQL_BATCH_LIMIT):
+            chunk = shikimori_ids[i:i + self.parser.GRAPHQL_BATCH_LIMIT]
+            try:
+                chunk_items = self.parser.get_anime_chunk(chunk)
+            except Exception as e:
+                print(f"Ошибка пакетного получения {chunk[0]}-{chunk[-1]}: {e}")
+                results.update({aid: 'error' for aid in chunk})
+            else:
+                for raw_data in chunk_items:
+                    writer.add(self._to_record(self.parser.normalize_anime_data(raw_data)))
+                    results[raw_data['id']] = 'imported'
+                missing = [aid for aid in chunk if aid not in results]
+                self.bitmap.mark_missing(missing)
+                results.update({aid: 'missing' for aid in missing})
+                writer.flush()
+
+            if on_progress:
+                on_progress(results)
+
+        self.bitmap.save()
+        self._resolve_posters([aid for aid, result in results.items() if result == 'imported'])
+        return results
+
+    def _import_many_multi(self, shikimori_ids: Iterable[int],
+                           on_progress: Optional[Callable[[Dict[int, str]], None]] = None) -> Dict[int, str]:
+        """import_many через MultiSourceParser (fan-out по всем источникам)"""
+        shikimori_ids = list(dict.fromkeys(int(aid) for aid in shikimori_ids))
+        multi = MultiSourceParser()
+        results: Dict[int, str] = {}
+        writer = self._batch_writer(50)
+
+        for i in range(0, len(shikimori_ids), 50):
+            chunk = shikimori_ids[i:i + 50]
+            errors: Dict[int, Exception] = {}
+            for data in multi.fetch_anime_batch(chunk, fan_out=True, errors=errors):
+                writer.add(self._to_record(data))
+                results[data['id']] = 'imported'
+            results.update({aid: 'error' for aid in errors})
+            results.update({aid: 'missing' for aid in chunk if aid not in results})
+            writer.flush()
+
+            if on_progress:
+                on_progress(results)
+
+        print(f"Fan-out: {multi.stats}")
+        self._resolve_posters([aid for aid, result in results.items() if result == 'imported'])
+        return results
+
+    def _to_record(self, data: dict) -> dict:
+        """Оставить в нормализованных данных только то, что сохраняет импорт
+
+        Берутся только пришедшие поля: в слитой записи без ответа Shikimori
+        нет title_ru, жанров и скриншотов, и сохранённые раньше не затираются.
+        """
+        record = {key: data[key] for key in RECORD_FIELDS if key in data}
+        record['studios'] = data.get('studios') or []
+        # Есть только в записях, слитых из нескольких источников
+        record.update({key: data[key] for key in ('trailer_url', 'mal_id', 'anilist_id') if data.get(key)})
+        return record
+
+    def _resolve_posters(self, shikimori_ids: list):
+        """Постеры из AniList для только что импортированных аниме без постера"""
+        if shikimori_ids:
+            AnilistPosterResolver().resolve(shikimori_ids=shikimori_ids)
+
+    def _fetch_normalized(self, shikimori_id: int):
+        """Загрузить и нормализовать одно аниме без записи в БД"""
         print(f"[{datetime.now().strftime('%H:%M:%S')}] ID: {shikimori_id}")
-        
-        # Получаем данные
+
         raw_data = self.parser.get_anime_by_id(shikimori_id)
         if not raw_data:
             print(f"  ✗ Не найдено")
             return None
-        
-        # Нормализуем
-        data = self.parser.normalize_anime_data(raw_data)
-        
-        with transaction.atomic():
-            # Создаем/обновляем аниме
-            anime, created = Anime.objects.update_or_create(
-                shikimori_id=shikimori_id,
-                defaults={
-                    'title_ru': data['title_ru'],
-                    'title_en': data['title_en'],
-                    'title_jp': data['title_jp'],
-                    'description': data['description'],
-                    'year': data['year'],
-                    'status': data['status'],
-                    'episodes': data['episodes'],
-                    'score': data['score'],
-                    'poster_url': data['poster_url'],
-                    'screenshots': data.get('screenshots'),
-                    'data_source': 'shikimori'
-                }
-            )
-            
-            # Жанры
-            if data['genres']:
-                for genre_data in data['genres']:
-                    genre_name = genre_data['name']
-                    if genre_name:
-                        genre, _ = Genre.objects.get_or_create(
-                            name=genre_name,
-                            defaults={'slug': genre_name.lower().replace(' ', '-')}
-                        )
-                        anime.genres.add(genre)
-            
-            # Студии (если есть в данных)
-            if 'studios' in data and data['studios']:
-                for studio_name in data['studios']:
-                    if studio_name:
-                        studio, _ = Studio.objects.get_or_create(
-                            name=studio_name,
-                            defaults={'slug': studio_name.lower().replace(' ', '-')}
-                        )
-                        anime.studios.add(studio)
-            
-            action = "Создано" if created else "Обновлено"
-            print(f"  ✓ {action}: {anime.title_ru}")
-            
-            return anime
-    
+
+        return self.parser.normalize_anime_data(raw_data)
+
+    def _import_buffered_batch(self, writer: AnimeBulkWriter, shikimori_ids: list) -> list:
+        """Загрузить пачку аниме через GraphQL и поставить в буфер записи"""
+        imported = []
+        items = []
+        for i in range(0, len(shikimori_ids), self.parser.GRAPHQL_BATCH_LIMIT):
+            chunk = shikimori_ids[i:i + self.parser.GRAPHQL_BATCH_LIMIT]
+            try:
+                chunk_items = self.parser.get_anime_chunk(chunk)
+            except Exception as e:
+                print(f"Ошибка пакетного получения {chunk[0]}-{chunk[-1]}: {e}")
+                continue
+
+            # Чего нет в успешном ответе, того нет и на Shikimori
+            returned_ids = {raw_data['id'] for raw_data in chunk_items}
+            self.bitmap.mark_missing(aid for aid in chunk if aid not in returned_ids)
+            items.extend(chunk_items)
+
+        for raw_data in items:
+            data = self.parser.normalize_anime_data(raw_data)
+            writer.add(self._to_record(data))
+            imported.append(data['id'])
+            print(f"  ✓ {data['title_ru']}")
+        return imported
+
     def import_popular_by_pages(self, total_limit: int = 200) -> list:
         """Импорт популярных аниме по страницам"""
         print(f"Импорт {total_limit} популярных аниме...")
@@ -76,6 +177,7 @@ class AnimeImportService:
         imported = []
         page = 1
         limit_per_page = 50
+        writer = self._batch_writer(limit_per_page)
         
         while len(imported) < total_limit:
             print(f"Страница {page}...")
@@ -85,30 +187,26 @@ class AnimeImportService:
                 print("Нет больше данных")
                 break
             
+            page_ids = [item['id'] for item in popular if item.get('id')]
+
             for item in popular:
-                if len(imported) >= total_limit:
-                    break
-                
-                shikimori_id = item.get('id')
-                if shikimori_id:
-                    exists = Anime.objects.filter(shikimori_id=shikimori_id).exists()
-                    if not exists:
-                        try:
-                            anime = self.import_single_anime(shikimori_id)
-                            if anime:
-                                imported.append(anime)
-                                print(f"  [{len(imported)}/{total_limit}]")
-                        except Exception as e:
-                            print(f"  ✗ Ошибка: {e}")
-                        time.sleep(0.3)
-                    else:
-                        title = item.get('russian') or item.get('name')
-                        print(f"  [{len(imported)}/{total_limit}] Уже есть: {title}")
+                if self.bitmap.is_present(item.get('id') or 0):
+                    title = item.get('russian') or item.get('name')
+                    print(f"  [{len(imported)}/{total_limit}] Уже есть: {title}")
+
+            # Вся страница новых аниме - одним запросом
+            new_ids = self.bitmap.filter_absent(page_ids)
+            new_ids = new_ids[:total_limit - len(imported)]
+            if new_ids:
+                imported.extend(self._import_buffered_batch(writer, new_ids))
+                print(f"  [{len(imported)}/{total_limit}]")
             
             page += 1
-            time.sleep(1)
-        
-        return imported
+
+        writer.flush()
+        self.bitmap.save()
+        self._resolve_posters(imported)
+        return list(Anime.objects.filter(shikimori_id__in=imported))
     
     def import_classics(self) -> list:
         """Импорт классических аниме"""
@@ -162,26 +260,23 @@ class AnimeImportService:
         ]
         
         imported = []
+        for anime_id in classic_ids:
+            if self.bitmap.is_present(anime_id):
+                print(f"Уже есть ID {anime_id}")
         
-        for idx, anime_id in enumerate(classic_ids):
-            if Anime.objects.filter(shikimori_id=anime_id).exists():
-                print(f"[{idx+1}/{len(classic_ids)}] Уже есть ID {anime_id}")
-                continue
-            
-            try:
-                anime = self.import_single_anime(anime_id)
-                if anime:
-                    imported.append(anime)
-                    print(f"[{idx+1}/{len(classic_ids)}]")
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"[{idx+1}/{len(classic_ids)}] ✗ Ошибка ID {anime_id}: {e}")
+        with self._batch_writer(50) as writer:
+            new_ids = self.bitmap.filter_absent(classic_ids)
+            imported = self._import_buffered_batch(writer, new_ids)
+            print(f"[{len(imported)}/{len(new_ids)}]")
         
-        return imported
+        self.bitmap.save()
+        self._resolve_posters(imported)
+        return list(Anime.objects.filter(shikimori_id__in=imported))
     
     def import_by_years(self, start_year: int = 2000, end_year: int = 2024, limit_per_year: int = 10) -> list:
         """Импорт по годам"""
         imported = []
+        writer = self._batch_writer(50)
         
         for year in range(end_year, start_year - 1, -1):
             print(f"Год {year}...")
@@ -195,50 +290,49 @@ class AnimeImportService:
                 if not anime_list:
                     break
                 
-                for item in anime_list:
-                    if year_imported >= limit_per_year:
-                        break
-                    
-                    shikimori_id = item.get('id')
-                    if shikimori_id and not Anime.objects.filter(shikimori_id=shikimori_id).exists():
-                        try:
-                            anime = self.import_single_anime(shikimori_id)
-                            if anime:
-                                imported.append(anime)
-                                year_imported += 1
-                                print(f"  [{year}] {year_imported}/{limit_per_year}")
-                        except Exception as e:
-                            print(f"  ✗ Ошибка: {e}")
-                        time.sleep(0.3)
+                page_ids = [item['id'] for item in anime_list if item.get('id')]
+                new_ids = self.bitmap.filter_absent(page_ids)
+                new_ids = new_ids[:limit_per_year - year_imported]
+                if new_ids:
+                    year_ids = self._import_buffered_batch(writer, new_ids)
+                    imported.extend(year_ids)
+                    year_imported += len(year_ids)
+                    print(f"  [{year}] {year_imported}/{limit_per_year}")
                 
                 page += 1
-                time.sleep(1)
             
             print(f"Год {year}: импортировано {year_imported} аниме")
-        
-        return imported
+
+        writer.flush()
+        self.bitmap.save()
+        self._resolve_posters(imported)
+        return list(Anime.objects.filter(shikimori_id__in=imported))
     
     def import_random_by_id_range(self, start_id: int = 1000, end_id: int = 50000, limit: int = 50) -> list:
         """Импорт случайных аниме"""
         imported = []
         attempts = 0
         max_attempts = limit * 3
+        writer = self._batch_writer(50)
         
         while len(imported) < limit and attempts < max_attempts:
-            random_id = random.randint(start_id, end_id)
-            attempts += 1
+            # Случайные ID проверяем пачками: несуществующие просто не вернутся
+            batch_size = min(limit - len(imported), max_attempts - attempts, 50)
+            random_ids = {random.randint(start_id, end_id) for _ in range(batch_size)}
+            attempts += batch_size
+
+            # Уже импортированные и известные 404 не запрашиваем
+            random_ids = set(self.bitmap.filter_unknown(random_ids))
+            random_ids -= set(imported)
             
-            if Anime.objects.filter(shikimori_id=random_id).exists():
+            if not random_ids:
                 continue
             
-            try:
-                anime = self.import_single_anime(random_id)
-                if anime:
-                    imported.append(anime)
-                    print(f"[{len(imported)}/{limit}] Случайное ID {random_id}")
-                time.sleep(0.5)
-            except Exception as e:
-                if "404" not in str(e):
-                    print(f"ID {random_id}: {e}")
+            batch_imported = self._import_buffered_batch(writer, sorted(random_ids))
+            imported.extend(batch_imported)
+            print(f"[{len(imported)}/{limit}] Случайные ID: найдено {len(batch_imported)} из {len(random_ids)}")
         
-        return imported
\ No newline at end of file
+        writer.flush()
+        self.bitmap.save()
+        self._resolve_posters(imported)
+        return list(Anime.objects.filter(shikimori_id__in=imported))
\ No newline at end of file
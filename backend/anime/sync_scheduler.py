@@ -0,0 +1,220 @@
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from parsers.shikimori import ShikimoriParser
+from .bulk_writer import ANIME_FIELDS, TITLE_FIELDS, AnimeBulkWriter, _slug
+from .import_pipeline import iter_fetch_threaded
+from .models import Anime
+from .payload_cache import RawPayloadCache
+
+# Как часто обновлять аниме в зависимости от статуса
+DEFAULT_SYNC_INTERVALS = {
+    'ongoing': timedelta(hours=6),
+    'announced': timedelta(days=1),
+    'finished': timedelta(days=30),
+}
+
+# Порядок в очереди: онгоинги первыми
+STATUS_PRIORITY = {'ongoing': 0, 'announced': 1, 'finished': 2}
+
+
+def sync_intervals() -> Dict[str, timedelta]:
+    intervals = dict(DEFAULT_SYNC_INTERVALS)
+    intervals.update(getattr(settings, 'ANIME_SYNC_INTERVALS', {}))
+    return intervals
+
+
+class AnimeSyncScheduler:
+    """Инкрементальное обновление уже импортированных аниме.
+
+    Очередь строится по базе: аниме «созрело», когда с последней
+    синхронизации (или записи, если синхронизации не было) прошло больше
+    интервала его статуса. Созревшие идут по приоритету статуса и
+    давности. Запросы условные (If-None-Match по кешу сырых ответов),
+    ответ 304 только сдвигает last_synced, а при изменениях в БД пишутся
+    лишь поля, которые действительно поменялись. Жанры и студии
+    сравниваются как множества и при расхождении переписываются целиком
+    тем же кодом, что и в AnimeBulkWriter.
+    """
+
+    def __init__(self, workers: int = 10, batch_size: int = 500,
+                 payload_cache: Optional[RawPayloadCache] = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.intervals = sync_intervals()
+        self.payload_cache = payload_cache or RawPayloadCache.shared()
+        self.parser = ShikimoriParser(payload_cache=self.payload_cache)
+        self.stats = {'checked': 0, 'not_modified': 0, 'changed': 0, 'unchanged': 0,
+                      'missing': 0, 'errors': 0}
+        self.changed_fields = Counter()
+
+    def due_queryset(self, now=None):
+        """Аниме, которые пора обновить, в порядке очереди"""
+        now = now or timezone.now()
+        synced = Coalesce('last_synced', 'updated_at')
+        due = Q()
+        for status, interval in self.intervals.items():
+            due |= Q(status=status, synced_at__lte=now - interval)
+
+        return (
+            Anime.objects
+            .filter(shikimori_id__isnull=False)
+            .annotate(
+                synced_at=synced,
+                priority=Case(
+                    *[When(status=status, then=Value(p)) for status, p in STATUS_PRIORITY.items()],
+                    default=Value(len(STATUS_PRIORITY)),
+                    output_field=IntegerField(),
+                ),
+            )
+            .filter(due)
+            .order_by('priority', F('synced_at').asc())
+        )
+
+    def plan(self, now=None) -> Dict[str, int]:
+        """Сколько аниме каждого статуса ждёт обновления"""
+        rows = self.due_queryset(now).order_by().values_list('status')
+        return dict(Counter(status for status, in rows))
+
+    def run(self, limit: int = 1000) -> Dict[str, int]:
+        """Обновить до limit созревших аниме"""
+        ids = list(self.due_queryset().values_list('shikimori_id', flat=True)[:limit])
+        if not ids:
+            return self.stats
+
+        batch: List[Tuple[int, Optional[Dict]]] = []
+        for shikimori_id, status, data in iter_fetch_threaded(self._fetch_one, ids, self.workers):
+            self.stats['checked'] += 1
+            if status == 0 or status >= 500 or status == 429:
+                # Не трогаем last_synced: аниме останется в очереди
+                self.stats['errors'] += 1
+                continue
+            if status == 404:
+                self.stats['missing'] += 1
+            elif status == 304:
+                self.stats['not_modified'] += 1
+            batch.append((shikimori_id, data if status == 200 else None))
+            if len(batch) >= self.batch_size:
+                self._apply(batch)
+                batch = []
+
+        if batch:
+            self._apply(batch)
+        return self.stats
+
+    def _fetch_one(self, shikimori_id: int):
+        """(статус, json); 304 - ответ не изменился с прошлого раза"""
+        url = f"{self.parser.BASE_URL}/animes/{shikimori_id}"
+        headers = {}
+        etag = self.payload_cache.etag('shikimori', shikimori_id)
+        if etag:
+            headers['If-None-Match'] = etag
+
+        response = self.parser.session.get(url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            self.payload_cache.touch('shikimori', shikimori_id)
+            return 304, None
+        if response.status_code != 200:
+            return response.status_code, None
+
+        data = response.json()
+        self.payload_cache.put('shikimori', shikimori_id, data, etag=response.headers.get('ETag'))
+        return 200, data
+
+    def _apply(self, batch: List[Tuple[int, Optional[Dict]]]):
+        """Записать изменившиеся поля и отметить всю пачку синхронизированной"""
+        now = timezone.now()
+        fresh = {sid: self.parser.normalize_anime_data(data) for sid, data in batch if data}
+        current = {a.shikimori_id: a for a in Anime.objects.filter(shikimori_id__in=fresh.keys())}
+        related = self._current_related([anime.pk for anime in current.values()])
+
+        # Как в AnimeBulkWriter: одна пачка UPDATE на каждый набор полей
+        groups: Dict[tuple, List[Anime]] = {}
+        related_changes: Dict[str, Dict[int, Dict]] = {'genres': {}, 'studios': {}}
+        for shikimori_id, record in fresh.items():
+            anime = current.get(shikimori_id)
+            if anime is None:
+                continue
+            fields = self._diff(anime, record)
+            changed_related = self._diff_related(record, related['genres'].get(anime.pk, set()),
+                                                 related['studios'].get(anime.pk, set()))
+            if not fields and not changed_related:
+                self.stats['unchanged'] += 1
+                continue
+
+            self.stats['changed'] += 1
+            self.changed_fields.update(fields + changed_related)
+            for name in changed_related:
+                related_changes[name][shikimori_id] = record
+            if TITLE_FIELDS & set(fields):
+                anime.fill_computed_fields()
+                fields += ('search_text',)
+            anime.updated_at = now
+            groups.setdefault(fields, []).append(anime)
+
+        for fields, objs in groups.items():
+            Anime.objects.bulk_update(objs, list(fields) + ['updated_at'], batch_size=self.batch_size)
+        self._write_related(related_changes, {sid: anime.pk for sid, anime in current.items()})
+
+        Anime.objects.filter(shikimori_id__in=[sid for sid, _ in batch]).update(last_synced=now)
+
+    @staticmethod
+    def _current_related(anime_pks: List[int]) -> Dict[str, Dict[int, set]]:
+        """Жанры (по имени) и студии (по slug) аниме из БД, как их сопоставляет AnimeBulkWriter"""
+        related = {'genres': {}, 'studios': {}}
+        rows = Anime.genres.through.objects.filter(anime_id__in=anime_pks).values_list('anime_id', 'genre__name')
+        for anime_pk, name in rows:
+            related['genres'].setdefault(anime_pk, set()).add(name)
+        rows = Anime.studios.through.objects.filter(anime_id__in=anime_pks).values_list('anime_id', 'studio__slug')
+        for anime_pk, slug in rows:
+            related['studios'].setdefault(anime_pk, set()).add(slug)
+        return related
+
+    @staticmethod
+    def _diff_related(record: Dict, genres: set, studios: set) -> tuple:
+        """'genres' и/или 'studios', если их набор в record отличается от БД"""
+        changed = []
+        if 'genres' in record and {g['name'] for g in record['genres'] or [] if g.get('name')} != genres:
+            changed.append('genres')
+        if 'studios' in record and {_slug(name) for name in record['studios'] or [] if name} != studios:
+            changed.append('studios')
+        return tuple(changed)
+
+    def _write_related(self, changes: Dict[str, Dict[int, Dict]], pk_by_shikimori: Dict[int, int]):
+        """Переписать жанры и студии аниме, у которых они поменялись"""
+        if not any(changes.values()):
+            return
+        writer = AnimeBulkWriter(batch_size=self.batch_size)
+        with transaction.atomic():
+            for name, write in (('genres', writer._write_genres), ('studios', writer._write_studios)):
+                records = changes[name]
+                if not records:
+                    continue
+                Through = getattr(Anime, name).through
+                Through.objects.filter(anime_id__in=[pk_by_shikimori[sid] for sid in records]).delete()
+                write(records, pk_by_shikimori)
+
+    @staticmethod
+    def _diff(anime: Anime, record: Dict) -> tuple:
+        """Поля, значения которых в record отличаются от БД; anime обновляется на месте"""
+        changed = []
+        for name in ANIME_FIELDS:
+            if name not in record:
+                continue
+            # Заглушка Shikimori не должна затирать постер, найденный на AniList
+            if name == 'poster_url' and '/missing_' in (record[name] or '') and anime.poster_url:
+                continue
+
+            field = Anime._meta.get_field(name)
+            value = field.to_python(AnimeBulkWriter._clean_value(name, record[name]))
+            if value != getattr(anime, name):
+                setattr(anime, name, value)
+                changed.append(name)
+        return tuple(changed)
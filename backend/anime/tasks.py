@@ -0,0 +1,68 @@
+from celery import shared_task
+from django.utils import timezone
+
+from .import_leases import LeaseWorker, default_owner, plan_ranges, progress
+from .models import ImportJob
+from .poster_resolver import AnilistPosterResolver
+from .services import AnimeImportService
+
+
+@shared_task(bind=True, acks_late=True)
+def import_ranges(self, plan='shikimori', engine='graphql', max_workers=20, max_ranges=None, ttl=600,
+                  rate=None):
+    """Брать диапазоны ID плана, пока они не кончатся"""
+    owner = f"{default_owner()}:{self.request.id or 'local'}"
+    worker = LeaseWorker(plan=plan, owner=owner, engine=engine, max_workers=max_workers, ttl=ttl,
+                         rate=rate)
+    return worker.run(max_ranges=max_ranges)
+
+
+@shared_task
+def start_distributed_import(start_id, end_id, range_size=5000, concurrency=4, plan='shikimori',
+                             engine='graphql', max_workers=20, rate=None):
+    """Нарезать диапазоны и запустить concurrency задач import_ranges"""
+    created = plan_ranges(start_id, end_id, range_size=range_size, plan=plan)
+    for _ in range(concurrency):
+        import_ranges.delay(plan=plan, engine=engine, max_workers=max_workers, rate=rate)
+    return {'created': created, 'dispatched': concurrency}
+
+
+@shared_task
+def import_progress(plan='shikimori'):
+    return progress(plan)
+
+
+@shared_task
+def resolve_posters(shikimori_ids):
+    """Найти на AniList постеры аниме, импортированных без постера"""
+    return AnilistPosterResolver().resolve(shikimori_ids=shikimori_ids)
+
+
+@shared_task(acks_late=True)
+def run_import_job(job_id):
+    """Выполнить ImportJob; при повторной доставке законченное задание не перезапускается"""
+    job = ImportJob.objects.get(pk=job_id)
+    if job.status in ('done', 'failed'):
+        return job.status
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    def on_progress(results):
+        job.set_results(results)
+        job.save(update_fields=['results', 'imported', 'missing', 'failed'])
+
+    try:
+        results = AnimeImportService().import_many(job.external_ids, on_progress=on_progress,
+                                                   source=job.source)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)[:1000]
+    else:
+        job.set_results(results)
+        job.status = 'done'
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job.status
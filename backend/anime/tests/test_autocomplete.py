@@ -0,0 +1,119 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from anime import autocomplete
+from anime.autocomplete import PrefixIndex
+from anime.fuzzy import TrigramIndex
+from anime.memory_index import IndexHolder
+from anime.models import Anime
+
+
+def titles(results):
+    return [item['title_ru'] for item in results]
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        Anime.objects.create(shikimori_id=1, title_ru='Наруто', title_en='Naruto', popularity=500)
+        Anime.objects.create(shikimori_id=2, title_ru='Наруто: Ураганные хроники', title_en='Naruto: Shippuuden',
+                             popularity=900)
+        Anime.objects.create(shikimori_id=3, title_ru='Нана', title_en='Nana', popularity=100)
+        Anime.objects.create(shikimori_id=4, title_ru='Тетрадь смерти', title_en='Death Note', score=8.6)
+        self.index = PrefixIndex()
+        self.index.load()
+
+    def test_prefix_by_popularity(self):
+        self.assertEqual(titles(self.index.search('на')), ['Наруто: Ураганные хроники', 'Наруто', 'Нана'])
+        self.assertEqual(titles(self.index.search('на', limit=1)), ['Наруто: Ураганные хроники'])
+        self.assertEqual(titles(self.index.search('нару')), ['Наруто: Ураганные хроники', 'Наруто'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(titles(self.index.search('наруто ур')), ['Наруто: Ураганные хроники'])
+        self.assertEqual(titles(self.index.search('death no')), ['Тетрадь смерти'])
+        self.assertEqual(self.index.search('наруто смерт'), [])
+        self.assertEqual(self.index.search('   '), [])
+
+    def test_payload_is_served_from_memory(self):
+        with self.assertNumQueries(0):
+            result = self.index.search('тетр')[0]
+        self.assertEqual(result['title_en'], 'Death Note')
+        self.assertEqual(result['id'], Anime.objects.get(shikimori_id=4).pk)
+
+    def test_popularity_change_reorders_in_place(self):
+        nana = Anime.objects.get(shikimori_id=3)
+        Anime.objects.filter(pk=nana.pk).update(popularity=1000, updated_at=timezone.now())
+        with mock.patch('anime.autocomplete.sorted', create=True, side_effect=AssertionError) as full_sort:
+            self.index.sync()
+        self.assertFalse(full_sort.called)
+        self.assertEqual(titles(self.index.search('на')), ['Нана', 'Наруто: Ураганные хроники', 'Наруто'])
+        self.assertEqual(self.index.order, sorted(doc[1] for doc in self.index.docs.values()))
+
+    def test_large_batch_is_resorted(self):
+        Anime.objects.update(popularity=1, updated_at=timezone.now())
+        Anime.objects.filter(shikimori_id=3).update(popularity=50)
+        with mock.patch('anime.autocomplete.RESORT_AFTER', 2):
+            self.index.sync()
+        self.assertEqual(titles(self.index.search('на')), ['Нана', 'Наруто', 'Наруто: Ураганные хроники'])
+        self.assertEqual(self.index.order, sorted(doc[1] for doc in self.index.docs.values()))
+
+    def test_endpoint(self):
+        autocomplete._holder.index = self.index
+        self.addCleanup(setattr, autocomplete._holder, 'index', None)
+        # Только что собран: без фонового обновления в отдельном потоке
+        autocomplete._holder._checked_at = time.monotonic()
+        response = APIClient(HTTP_HOST='localhost').get(reverse('anime-autocomplete'), {'q': 'nar', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(titles(response.data['results']), ['Наруто: Ураганные хроники'])
+
+
+class IndexSyncTests(TestCase):
+    def setUp(self):
+        self.first = Anime.objects.create(shikimori_id=1, title_ru='Наруто', title_en='Naruto')
+        self.second = Anime.objects.create(shikimori_id=2, title_ru='Блич', title_en='Bleach')
+        self.holder = IndexHolder(PrefixIndex)
+        self.index = self.holder.get()
+
+    def test_delete_and_insert_in_one_interval(self):
+        # Число строк не меняется, но удалённое аниме должно пропасть
+        self.first.delete()
+        Anime.objects.create(shikimori_id=3, title_ru='Ван-Пис', title_en='One Piece')
+        self.holder.refresh()
+        self.assertEqual(self.index.search('наруто'), [])
+        self.assertEqual(titles(self.index.search('ван')), ['Ван-Пис'])
+        self.assertEqual(len(self.index), 2)
+
+    def test_late_commit_inside_overlap_is_picked_up(self):
+        # Транзакция выставила updated_at до прошлой синхронизации, а закоммитилась после
+        late = Anime.objects.create(shikimori_id=3, title_ru='Ван-Пис', title_en='One Piece')
+        Anime.objects.filter(pk=late.pk).update(updated_at=self.index.synced_until - timedelta(seconds=10))
+        self.holder.refresh()
+        self.assertEqual(titles(self.index.search('ван')), ['Ван-Пис'])
+
+    def test_missing_row_below_top_pk_is_added(self):
+        self.first.delete()
+        self.holder.refresh()
+        # Строка с pk внутри индекса и давним updated_at: её находит только сверка pk
+        Anime.objects.create(pk=self.first.pk, shikimori_id=1, title_ru='Наруто', title_en='Naruto')
+        Anime.objects.filter(pk=self.first.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        self.holder.refresh()
+        self.assertEqual(titles(self.index.search('нар')), ['Наруто'])
+
+    def test_reread_does_not_add_dead_positions(self):
+        holder = IndexHolder(TrigramIndex)
+        index = holder.get()
+        for _ in range(3):
+            holder.refresh()
+        self.assertEqual((len(index), index.dead_count()), (2, 0))
+
+        self.second.title_en = 'Bleach TYBW'
+        self.second.save()
+        holder.refresh()
+        holder.refresh()
+        self.assertEqual((len(index), index.dead_count()), (2, 1))
+        self.assertEqual([pk for pk, _ in index.search('tybw')], [self.second.pk])
@@ -0,0 +1,88 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from anime.backfill import BackfillRunner, CleanDescriptionsBackfill
+from anime.models import Anime
+
+from .utils import StateDirMixin
+
+
+class BackfillRunnerTests(StateDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for shikimori_id in range(1, 6):
+            Anime.objects.create(
+                shikimori_id=shikimori_id,
+                title_ru=f'Аниме {shikimori_id}',
+                description=f'Герой [character={shikimori_id}]Имя[/character]  ищет   друга',
+            )
+        # Без тегов - вне queryset бэкфилла
+        Anime.objects.create(shikimori_id=6, title_ru='Аниме 6', description='Без тегов')
+        self.pks = list(Anime.objects.filter(shikimori_id__lte=5).order_by('pk').values_list('pk', flat=True))
+
+    def runner(self, **kwargs):
+        kwargs.setdefault('chunk_size', 2)
+        with mock.patch('builtins.print'):
+            return BackfillRunner(CleanDescriptionsBackfill(), state_dir=self.state_dir, **kwargs)
+
+    def run_quietly(self, runner, **kwargs):
+        with mock.patch('builtins.print'):
+            return runner.run(**kwargs)
+
+    def test_chunks_follow_pk_order(self):
+        chunks = list(self.runner()._chunks())
+        self.assertEqual([[row['pk'] for row in rows] for rows in chunks],
+                         [self.pks[0:2], self.pks[2:4], self.pks[4:5]])
+        self.assertEqual(set(chunks[0][0]), {'pk', 'description'})
+
+    def test_bulk_update_writes_only_changed_rows(self):
+        before = Anime.objects.get(shikimori_id=6).updated_at
+        stats = self.run_quietly(self.runner())
+
+        self.assertEqual((stats['scanned'], stats['changed'], stats['chunks']), (5, 5, 3))
+        self.assertEqual(
+            set(Anime.objects.filter(pk__in=self.pks).values_list('description', flat=True)),
+            {'Герой Имя ищет друга'},
+        )
+        untouched = Anime.objects.get(shikimori_id=6)
+        self.assertEqual(untouched.description, 'Без тегов')
+        self.assertEqual(untouched.updated_at, before)
+
+    def test_resume_continues_after_checkpoint(self):
+        stats = self.run_quietly(self.runner(), limit=2)
+        self.assertEqual(stats['last_pk'], self.pks[1])
+        state = json.loads(self.runner().state_path.read_text(encoding='utf-8'))
+        self.assertEqual(state['last_pk'], self.pks[1])
+
+        # Строку до чекпоинта возвращаем в грязное состояние: продолжение её не видит
+        Anime.objects.filter(pk=self.pks[0]).update(description='[b]Снова[/b]')
+        resumed = self.runner(resume=True)
+        with mock.patch.object(CleanDescriptionsBackfill, 'transform_batch',
+                               wraps=resumed.backfill.transform_batch) as transform_batch:
+            stats = self.run_quietly(resumed)
+
+        seen = [row['pk'] for call in transform_batch.call_args_list for row in call.args[0]]
+        self.assertEqual(seen, self.pks[2:])
+        self.assertEqual(stats['scanned'], 5)
+        self.assertEqual(Anime.objects.get(pk=self.pks[0]).description, '[b]Снова[/b]')
+
+    def test_full_pass_removes_checkpoint(self):
+        runner = self.runner()
+        self.run_quietly(runner)
+        self.assertFalse(runner.state_path.exists())
+
+        # Следующий --resume начинает с начала, а не с последнего pk
+        Anime.objects.filter(pk=self.pks[0]).update(description='[b]Снова[/b]')
+        stats = self.run_quietly(self.runner(resume=True))
+        self.assertEqual((stats['scanned'], stats['changed']), (1, 1))
+
+    def test_dry_run_does_not_write(self):
+        runner = self.runner(dry_run=True)
+        stats = self.run_quietly(runner)
+
+        self.assertEqual(stats['changed'], 5)
+        self.assertFalse(runner.state_path.exists())
+        self.assertTrue(all('[character=' in description for description in
+                            Anime.objects.filter(pk__in=self.pks).values_list('description', flat=True)))
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.test import TestCase
+
+from anime.models import Anime
+
+
+class BulkCreateFastTests(TestCase):
+    def test_upsert_by_shikimori_id(self):
+        Anime.objects.bulk_create_fast([Anime(shikimori_id=1, title_ru='Старое')])
+        count = Anime.objects.bulk_create_fast(
+            [Anime(shikimori_id=1, title_ru='Новое'), Anime(shikimori_id=2, title_ru='Второе')],
+            update_conflicts=True, unique_fields=['shikimori_id'],
+        )
+        self.assertEqual(count, 2)
+        self.assertEqual(Anime.objects.get(shikimori_id=1).title_ru, 'Новое')
+        self.assertIn('vtoroe', Anime.objects.get(shikimori_id=2).search_text.split())
+
+    def test_duplicates_in_one_call_keep_last(self):
+        Anime.objects.bulk_create_fast(
+            [Anime(shikimori_id=1, title_ru='A'), Anime(shikimori_id=1, title_ru='B')],
+            update_conflicts=True, unique_fields=['shikimori_id'],
+        )
+        self.assertEqual(list(Anime.objects.values_list('title_ru', flat=True)), ['B'])
+
+    def test_repeated_calls_in_one_transaction(self):
+        with transaction.atomic():
+            for i in range(3):
+                Anime.objects.bulk_create_fast([Anime(shikimori_id=i + 1, title_ru=f'T{i}')],
+                                               update_conflicts=True, unique_fields=['shikimori_id'])
+        self.assertEqual(Anime.objects.count(), 3)
+
+    def test_without_update_conflicts_existing_rows_are_kept(self):
+        Anime.objects.bulk_create_fast([Anime(shikimori_id=1, title_ru='Старое')])
+        Anime.objects.bulk_create_fast([Anime(shikimori_id=1, title_ru='Новое')])
+        self.assertEqual(Anime.objects.get(shikimori_id=1).title_ru, 'Старое')
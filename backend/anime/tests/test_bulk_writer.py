@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+from anime import external_ids
+from anime.bulk_writer import AnimeBulkWriter
+from anime.models import Anime
+from parsers.shikimori import ShikimoriParser
+
+from .utils import shikimori_payload
+
+
+def record(anime_id: int, **extra) -> dict:
+    data = ShikimoriParser().normalize_anime_data(shikimori_payload(anime_id))
+    data.update(extra)
+    return data
+
+
+class AnimeBulkWriterTests(TestCase):
+    def test_flush_writes_anime_and_relations(self):
+        flushed = []
+        writer = AnimeBulkWriter(batch_size=2, on_flush=lambda ids: flushed.append(sorted(ids)))
+        writer.add(record(1))
+        self.assertFalse(Anime.objects.exists())
+        writer.add(record(2, genres=[{'name': 'Drama'}], studios=['Madhouse']))
+        writer.add(record(3))
+        self.assertEqual(flushed, [[1, 2]])
+        self.assertEqual(writer.flush(), {3})
+
+        anime = Anime.objects.get(shikimori_id=2)
+        self.assertEqual(anime.title_ru, 'Название 2')
+        self.assertEqual(anime.title_en, 'English 2')
+        self.assertEqual(list(anime.genres.values_list('name', flat=True)), ['Drama'])
+        self.assertEqual(list(anime.studios.values_list('name', flat=True)), ['Madhouse'])
+        self.assertEqual(writer.stats, {'created': 3, 'updated': 0, 'flushes': 2})
+        self.assertEqual(external_ids.resolve('mal', [2]), {2: anime.pk})
+
+    def test_update_keeps_fields_that_did_not_come(self):
+        with AnimeBulkWriter() as writer:
+            writer.add(record(1))
+        with AnimeBulkWriter() as writer:
+            writer.add({'id': 1, 'title_en': 'New English', 'score': 8.1})
+
+        anime = Anime.objects.get(shikimori_id=1)
+        self.assertEqual((anime.title_ru, anime.title_en, anime.score), ('Название 1', 'New English', 8.1))
+        self.assertEqual(anime.episodes, 12)
+        # search_text пересчитан по строке из БД с новым английским названием
+        self.assertIn('new', anime.search_text.split())
+        self.assertIn('nazvanie', anime.search_text.split())
+
+    def test_same_id_in_buffer_keeps_last(self):
+        writer = AnimeBulkWriter()
+        writer.add(record(1, title_ru='Первое'))
+        writer.add(record(1, title_ru='Второе'))
+        self.assertEqual(writer.flush(), {1})
+        self.assertEqual(Anime.objects.get().title_ru, 'Второе')
@@ -0,0 +1,77 @@
+import gzip
+from unittest import mock
+
+from django.test import TestCase
+
+from anime import external_ids
+from anime.bulk_writer import AnimeBulkWriter
+from anime.catalog_snapshot import CatalogExporter, CatalogLoader
+from anime.models import Anime, Genre, Studio
+from parsers.shikimori import ShikimoriParser
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+@mock.patch('builtins.print')
+class CatalogSnapshotTests(StateDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        parser = ShikimoriParser()
+        with AnimeBulkWriter() as writer:
+            for anime_id in (1, 2, 3):
+                data = parser.normalize_anime_data(shikimori_payload(anime_id))
+                data['studios'] = [f'Studio {anime_id}']
+                data['mal_id'] = anime_id
+                writer.add(data)
+        self.path = self.state_dir / 'catalog.jsonl.gz'
+
+    def snapshot(self):
+        return sorted(
+            (anime.shikimori_id, anime.title_ru, anime.title_en, anime.score, anime.year, anime.search_text,
+             tuple(anime.genres.values_list('name', flat=True)),
+             tuple(anime.studios.values_list('name', flat=True)))
+            for anime in Anime.objects.all()
+        )
+
+    def test_round_trip(self, _print):
+        before = self.snapshot()
+        stats = CatalogExporter(batch_size=2).export(self.path)
+        self.assertEqual((stats['anime'], stats['genres'], stats['studios']), (3, 1, 3))
+
+        Anime.objects.all().delete()
+        Genre.objects.all().delete()
+        Studio.objects.all().delete()
+        stats = CatalogLoader(batch_size=2).load(self.path)
+
+        self.assertEqual(stats['anime'], 3)
+        self.assertEqual(self.snapshot(), before)
+        pk = Anime.objects.get(shikimori_id=2).pk
+        self.assertEqual(external_ids.resolve('shikimori', [2]), {2: pk})
+
+    def test_loading_twice_does_not_duplicate(self, _print):
+        CatalogExporter().export(self.path)
+        CatalogLoader().load(self.path)
+        CatalogLoader().load(self.path)
+        self.assertEqual(Anime.objects.count(), 3)
+        self.assertEqual(Anime.objects.get(shikimori_id=1).genres.count(), 1)
+
+    def test_truncated_file_is_an_error(self, _print):
+        CatalogExporter().export(self.path)
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            lines = f.readlines()
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.writelines(lines[:-2])
+
+        Anime.objects.all().delete()
+        with self.assertRaises(ValueError):
+            CatalogLoader().load(self.path)
+        # Всё, что успело дойти целиком, загружено
+        self.assertEqual(Anime.objects.count(), 2)
+
+    def test_incremental_export_takes_only_changed(self, _print):
+        until = CatalogExporter().export(self.path)['until']
+        anime = Anime.objects.get(shikimori_id=2)
+        anime.title_ru = 'Новое'
+        anime.save()
+        stats = CatalogExporter(since=until).export(self.path)
+        self.assertEqual(stats['anime'], 1)
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from anime import external_ids
+from anime.models import Anime, AnimeExternalId, Genre
+
+
+class ResolveTests(TestCase):
+    def test_index_then_model_fields(self):
+        indexed = Anime.objects.create(shikimori_id=1, title_ru='Один')
+        external_ids.register([(indexed.pk, 'anilist', 501)])
+        # Записано до таблицы соответствий: находится по полям модели
+        legacy = Anime.objects.create(shikimori_id=2, title_ru='Два', anilist_id=502)
+        AnimeExternalId.objects.filter(anime=legacy).delete()
+
+        self.assertEqual(external_ids.resolve('anilist', [501, 502, 503]), {501: indexed.pk, 502: legacy.pk})
+        # MAL ID без mal_id совпадает с shikimori_id
+        self.assertEqual(external_ids.resolve('mal', [2]), {2: legacy.pk})
+        self.assertEqual(
+            external_ids.resolve_many([('shikimori', 1), ('anilist', 502)]),
+            {('shikimori', 1): indexed.pk, ('anilist', 502): legacy.pk},
+        )
+        with self.assertRaises(ValueError):
+            external_ids.resolve('unknown', [1])
+
+    def test_register_moves_id_to_last_anime(self):
+        first = Anime.objects.create(title_ru='Первое')
+        second = Anime.objects.create(title_ru='Второе')
+        external_ids.register([(first.pk, 'kitsu', 7)])
+        external_ids.register([(second.pk, 'kitsu', 7)])
+        self.assertEqual(external_ids.resolve('kitsu', [7]), {7: second.pk})
+
+
+@mock.patch('builtins.print')
+class MergeDuplicatesTests(TestCase):
+    def test_groups_linked_by_any_key_are_merged(self, _print):
+        drama = Genre.objects.create(name='Drama', slug='drama')
+        action = Genre.objects.create(name='Action', slug='action')
+        primary = Anime.objects.create(shikimori_id=1, title_ru='Тетрадь смерти')
+        primary.genres.add(action)
+        by_mal = Anime.objects.create(title_en='Death Note', mal_id=1, description='Описание')
+        by_mal.genres.add(drama)
+        by_anilist = Anime.objects.create(title_en='Death Note', mal_id=1, anilist_id=1535)
+        by_anilist_only = Anime.objects.create(title_en='DN', anilist_id=1535, episodes=37)
+        unrelated = Anime.objects.create(shikimori_id=2, title_ru='Другое')
+        external_ids.register([(by_anilist_only.pk, 'kitsu', 1376)])
+
+        groups = external_ids.find_duplicates()
+        self.assertEqual(groups, [sorted([primary.pk, by_mal.pk, by_anilist.pk, by_anilist_only.pk])])
+
+        stats = external_ids.merge_duplicates()
+        self.assertEqual((stats['groups'], stats['merged']), (1, 3))
+        self.assertEqual(set(Anime.objects.values_list('pk', flat=True)), {primary.pk, unrelated.pk})
+
+        primary.refresh_from_db()
+        self.assertEqual(primary.title_ru, 'Тетрадь смерти')
+        self.assertEqual((primary.description, primary.anilist_id, primary.episodes), ('Описание', 1535, 37))
+        self.assertEqual(set(primary.genres.values_list('name', flat=True)), {'Action', 'Drama'})
+        self.assertEqual(
+            external_ids.resolve_many([('anilist', 1535), ('kitsu', 1376), ('mal', 1)]),
+            {('anilist', 1535): primary.pk, ('kitsu', 1376): primary.pk, ('mal', 1): primary.pk},
+        )
+
+    def test_dry_run_changes_nothing(self, _print):
+        Anime.objects.create(shikimori_id=1, title_ru='A')
+        Anime.objects.create(mal_id=1, title_en='A')
+        self.assertEqual(external_ids.merge_duplicates(dry_run=True)['groups'], 1)
+        self.assertEqual(Anime.objects.count(), 2)
@@ -0,0 +1,60 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from anime.models import Anime
+from anime.services import AnimeImportService
+from parsers import rate_limit
+from parsers.fake_upstream import FakeUpstream, FakeUpstreamServer
+from parsers.rate_limit import configure_limiter
+
+from .utils import StateDirMixin
+
+
+@mock.patch('builtins.print')
+class FakeUpstreamImportTests(StateDirMixin, TestCase):
+    def test_import_through_shikimori_url(self, _print):
+        upstream = FakeUpstream(size=20, missing_ratio=0.3, latency_ms=0, jitter_ms=0)
+        missing = next(anime_id for anime_id in range(1, 21) if anime_id not in upstream.catalog)
+        ids = upstream.ids[:3] + [missing]
+
+        with FakeUpstreamServer(upstream) as server, override_settings(
+            SHIKIMORI_URL=server.url, ANILIST_URL=server.anilist_url, JIKAN_URL=server.jikan_url,
+        ):
+            configure_limiter(server.url, rate=1000, burst=1000)
+            self.addCleanup(rate_limit._limiters.pop, '127.0.0.1', None)
+            results = AnimeImportService().import_many(ids)
+
+        self.assertEqual(results, {**{anime_id: 'imported' for anime_id in ids[:3]}, missing: 'missing'})
+        anime = Anime.objects.get(shikimori_id=ids[0])
+        self.assertEqual(anime.title_ru, f'Тестовое аниме {ids[0]}')
+        # Ссылки на картинки стенд отдаёт как настоящий сайт Shikimori
+        self.assertEqual(anime.poster_url, f'{FakeUpstream.SHIKIMORI_SITE}/system/animes/original/{ids[0]}.jpg')
+        self.assertEqual(anime.genres.count(), 2)
+        self.assertGreater(upstream.counters['200'], 0)
+
+
+class FakeUpstreamCommandTests(StateDirMixin, TransactionTestCase):
+    def test_benchmark_import(self):
+        report = self.state_dir / 'benchmark.json'
+        with mock.patch('builtins.print'):
+            call_command('benchmark_import', '--modes', 'graphql', 'threads', '--size', '40',
+                         '--latency', '0', '--jitter', '0', '--workers', '4', '--json', str(report),
+                         stdout=StringIO())
+        self.addCleanup(rate_limit._limiters.pop, '127.0.0.1', None)
+
+        results = json.loads(report.read_text(encoding='utf-8'))['results']
+        expected = len(FakeUpstream(size=40, id_offset=10_000_000).ids)
+        self.assertEqual({r['mode']: r['titles'] for r in results}, {'graphql': expected, 'threads': expected})
+        # Без --keep стенд за собой убирает
+        self.assertEqual(Anime.objects.count(), 0)
+
+    def test_fake_upstream_serves_until_interrupted(self):
+        out = StringIO()
+        with mock.patch('anime.management.commands.fake_upstream.time.sleep', side_effect=KeyboardInterrupt):
+            call_command('fake_upstream', '--port', '0', '--size', '10', stdout=out)
+        self.assertIn('Shikimori: http://127.0.0.1:', out.getvalue())
+        self.assertIn(f'Аниме в каталоге: {len(FakeUpstream(size=10).ids)}', out.getvalue())
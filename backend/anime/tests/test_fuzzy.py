@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from anime import autocomplete, fuzzy
+from anime.bulk_writer import AnimeBulkWriter
+from anime.fuzzy import TrigramIndex, boost
+from anime.mass_import import MassAnimeImporter
+from anime.models import Anime
+from anime.search import warm_up_indexes
+from parsers.shikimori import ShikimoriParser
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+def reset_indexes(test):
+    for holder in (fuzzy._holder, autocomplete._holder):
+        holder.index = None
+        test.addCleanup(setattr, holder, 'index', None)
+
+
+class TrigramIndexTests(TestCase):
+    def index(self, rows):
+        index = TrigramIndex()
+        index.apply([row + (timezone.now(),) for row in rows])
+        return index
+
+    def test_typo_is_found(self):
+        index = self.index([(1, 'naruto наруто', 8.0, 100), (2, 'death note тетрадь смерти', 8.6, 100)])
+        self.assertEqual([pk for pk, _ in index.search('naruot')], [1])
+        self.assertEqual([pk for pk, _ in index.search('тетрать')], [2])
+        self.assertEqual(index.search('совсем другое'), [])
+
+    def test_popularity_breaks_ties(self):
+        index = self.index([(1, 'monogatari', 8.0, 10), (2, 'monogatari', 8.0, 200000)])
+        self.assertEqual([pk for pk, _ in index.search('monogatri')], [2, 1])
+        self.assertGreater(boost(8.0, 200000), boost(8.0, None))
+
+    def test_frequent_grams_are_not_credited(self):
+        # «tale» есть почти у всех названий: его триграммы частые
+        rows = [(pk, f'tale w{pk}', None, None) for pk in range(1, 99)]
+        index = self.index(rows + [(99, 'naruto', None, None), (100, 'naruto tale', None, None)])
+        # 12 триграмм запроса: 7 у naruto и 5 у tale
+        self.assertEqual(index.search('naruto tale'), [(100, 1.0), (99, 7 / 12)])
+
+    def test_changed_row_replaces_old_one(self):
+        index = self.index([(1, 'naruto', None, None)])
+        index.apply([(1, 'bleach', None, None, timezone.now())])
+        self.assertEqual(index.search('naruto'), [])
+        self.assertEqual([pk for pk, _ in index.search('bleach')], [1])
+        self.assertEqual((len(index), index.dead_count()), (1, 1))
+
+
+class FuzzySearchEndpointTests(TestCase):
+    def setUp(self):
+        reset_indexes(self)
+        Anime.objects.create(shikimori_id=1, title_ru='Тетрадь смерти', title_en='Death Note')
+        Anime.objects.create(shikimori_id=2, title_ru='Наруто', title_en='Naruto')
+
+    def test_typo_falls_back_to_trigrams(self):
+        client = APIClient(HTTP_HOST='localhost')
+        response = client.get(reverse('anime-list'), {'search': 'тетрать смерти'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['title_ru'] for item in response.data['results']], ['Тетрадь смерти'])
+
+    def test_short_query_is_not_fuzzy(self):
+        self.assertFalse(fuzzy.fuzzy_search(Anime.objects.all(), 'ны').exists())
+
+
+class PopularityImportTests(StateDirMixin, TestCase):
+    stats = [{'name': 'Запланировано', 'value': 120}, {'name': 'Просмотрено', 'value': 880}]
+
+    def test_rest_payload(self):
+        data = ShikimoriParser().normalize_anime_data(shikimori_payload(1, rates_statuses_stats=self.stats))
+        self.assertEqual(data['popularity'], 1000)
+        self.assertIsNone(ShikimoriParser().normalize_anime_data(shikimori_payload(2))['popularity'])
+
+    def test_graphql_payload(self):
+        node = {'id': '1', 'statusesStats': [{'status': 'planned', 'count': 120},
+                                             {'status': 'completed', 'count': 880}]}
+        parser = ShikimoriParser()
+        self.assertEqual(parser.normalize_anime_data(parser._graphql_to_rest(node))['popularity'], 1000)
+
+    def test_mass_import_writes_popularity(self):
+        importer = MassAnimeImporter(cache_payloads=False, report_interval=None)
+        self.addCleanup(importer.journal.close)
+        with AnimeBulkWriter() as writer:
+            writer.add(importer._normalize(1, shikimori_payload(1, rates_statuses_stats=self.stats)))
+        self.assertEqual(Anime.objects.get(shikimori_id=1).popularity, 1000)
+
+
+@mock.patch('builtins.print')
+class WarmUpTests(TransactionTestCase):
+    def setUp(self):
+        reset_indexes(self)
+        Anime.objects.create(shikimori_id=1, title_ru='Наруто', title_en='Naruto')
+
+    def test_indexes_are_built_in_background(self, _print):
+        warm_up_indexes().join(timeout=30)
+        self.assertEqual(len(fuzzy._holder.index), 1)
+        self.assertEqual(len(autocomplete._holder.index), 1)
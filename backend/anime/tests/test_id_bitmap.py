@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from anime.id_bitmap import ShikimoriIdBitmap
+from anime.models import Anime
+
+from .utils import StateDirMixin
+
+
+class ShikimoriIdBitmapTests(StateDirMixin, TestCase):
+    def test_first_load_is_built_from_db(self):
+        Anime.objects.create(shikimori_id=5, title_ru='A')
+        bitmap = ShikimoriIdBitmap.load()
+        self.assertTrue(bitmap.is_present(5))
+        self.assertFalse(bitmap.is_known(6))
+        self.assertTrue(bitmap.path.exists())
+
+    def test_deleted_rows_lose_present_bit_on_load(self):
+        anime = Anime.objects.create(shikimori_id=5, title_ru='A')
+        bitmap = ShikimoriIdBitmap.load()
+        bitmap.mark_missing([7])
+        bitmap.save()
+
+        anime.delete()
+        reloaded = ShikimoriIdBitmap.load()
+        self.assertFalse(reloaded.is_present(5))
+        self.assertEqual(reloaded.filter_unknown([5, 7]), [5])
+
+    def test_concurrent_saves_are_merged(self):
+        first, second = ShikimoriIdBitmap.load(), ShikimoriIdBitmap.load()
+        first.mark_missing([10])
+        second.mark_missing([20])
+        # За пределами исходного размера карта растёт
+        second.mark_present([ShikimoriIdBitmap.DEFAULT_SIZE + 100])
+        first.save()
+        second.save()
+
+        third = ShikimoriIdBitmap(first.path)
+        third.size, third.present, third.missing = third._read()
+        self.assertTrue(third.is_missing(10))
+        self.assertTrue(third.is_missing(20))
+        self.assertTrue(third.is_present(ShikimoriIdBitmap.DEFAULT_SIZE + 100))
+
+    def test_present_clears_missing_from_other_process(self):
+        first, second = ShikimoriIdBitmap.load(), ShikimoriIdBitmap.load()
+        first.mark_missing([10])
+        first.save()
+        second.mark_present([10])
+        second.save()
+        self.assertFalse(ShikimoriIdBitmap.load().is_missing(10))
+
+    def test_clear_missing_is_not_undone_by_merge(self):
+        bitmap = ShikimoriIdBitmap.load()
+        bitmap.mark_missing([10, 11])
+        bitmap.save()
+
+        bitmap.clear_missing()
+        bitmap.save()
+        self.assertEqual(ShikimoriIdBitmap.load().count_missing(), 0)
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+
+from anime.import_journal import ImportJournal
+from anime.mass_import import MassAnimeImporter
+from anime.models import Anime
+
+from .utils import FakeFetcher, StateDirMixin
+
+
+class ImportJournalTests(StateDirMixin, TestCase):
+    def journal(self, **kwargs):
+        journal = ImportJournal('test', state_dir=self.state_dir, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_resume_skips_done_ranges(self):
+        journal = self.journal()
+        journal.mark_done('ultra', 1, 1000, imported=7)
+        journal.close()
+
+        resumed = self.journal(resume=True)
+        self.assertTrue(resumed.is_done('ultra', 1, 1000))
+        self.assertTrue(resumed.is_done('ultra', 10, 20))
+        self.assertFalse(resumed.is_done('ultra', 1001, 2000))
+        self.assertEqual(resumed.imported_total('ultra'), 7)
+
+    def test_run_without_resume_keeps_progress(self):
+        self.journal().mark_done('ultra', 1, 1000)
+        fresh = self.journal()
+        self.assertFalse(fresh.is_done('ultra', 1, 1000))
+        fresh.mark_done('ultra', 1001, 2000)
+
+        self.assertEqual(self.journal(resume=True).done_ranges('ultra'), [(1, 1000), (1001, 2000)])
+
+    def test_reset_forgets_progress(self):
+        self.journal().mark_done('ultra', 1, 1000)
+        self.journal(reset=True)
+        self.assertEqual(self.journal(resume=True).done_ranges('ultra'), [])
+
+    def test_torn_last_line_is_ignored(self):
+        journal = self.journal()
+        journal.mark_done('ultra', 1, 1000)
+        journal.close()
+        with open(journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"strategy": "ultra", "ran')
+        self.assertEqual(self.journal(resume=True).done_ranges('ultra'), [(1, 1000)])
+
+
+class MassImportJournalTests(StateDirMixin, TransactionTestCase):
+    """Конвейер пишет в БД из своего потока, поэтому без общей транзакции теста"""
+
+    def importer(self, fetcher, **kwargs):
+        importer = MassAnimeImporter(cache_payloads=False, report_interval=None, resolve_posters=False,
+                                     **kwargs)
+        importer._fetcher = lambda: fetcher
+        self.addCleanup(importer.journal.close)
+        return importer
+
+    def test_chunk_with_errors_stays_open(self):
+        fetcher = FakeFetcher({3: 404, 15: 0, 17: 503})
+        importer = self.importer(fetcher)
+        importer._import_stream(range(1, 21), strategy='ultra', chunk_size=10)
+        importer.bitmap.save()
+
+        self.assertTrue(importer.journal.is_done('ultra', 1, 10))
+        self.assertFalse(importer.journal.is_done('ultra', 11, 20))
+        self.assertEqual(Anime.objects.count(), 17)
+
+        # --resume повторяет только то, что не записано и не ответило 404
+        retry = FakeFetcher()
+        resumed = self.importer(retry, resume=True)
+        resumed._import_stream(range(1, 21), strategy='ultra', chunk_size=10)
+        self.assertEqual(sorted(retry.requested), [15, 17])
+        self.assertTrue(resumed.journal.is_done('ultra', 11, 20))
+
+    def test_import_batch_fetches_every_id(self):
+        fetcher = FakeFetcher({anime_id: 404 for anime_id in range(1, 501)})
+        importer = self.importer(fetcher)
+        self.assertEqual(importer._import_batch(list(range(1, 501))), (0, 0))
+        self.assertEqual(len(fetcher.requested), 500)
+
+    def test_import_batch_reports_failures(self):
+        importer = self.importer(FakeFetcher({2: 0}))
+        self.assertEqual(importer._import_batch([1, 2, 3]), (2, 1))
+
+
+class DiscoverIdsTests(StateDirMixin, TestCase):
+    @mock.patch('parsers.shikimori.time.sleep')
+    def test_partial_listing_is_not_cached(self, sleep):
+        importer = MassAnimeImporter(cache_payloads=False, report_interval=None)
+        self.addCleanup(importer.journal.close)
+
+        def broken_listing():
+            yield 1
+            raise RuntimeError('Листинг Shikimori оборван на странице 2')
+
+        importer.shikimori.iter_anime_ids = broken_listing
+        self.assertEqual(importer.discover_ids(), [])
+        self.assertFalse((self.state_dir / 'shikimori_ids.json').exists())
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from anime import import_leases
+from anime.import_leases import acquire, complete, plan_ranges, progress, renew
+from anime.mass_import import MassAnimeImporter
+from anime.models import Anime, ImportLease
+from anime.tasks import start_distributed_import
+from config.celery import app
+
+from .utils import FakeFetcher, StateDirMixin
+
+
+class PlanRangesTests(TestCase):
+    def test_ranges_cover_interval_once(self):
+        self.assertEqual(plan_ranges(1, 12001, range_size=5000, plan='p'), 3)
+        self.assertEqual(
+            list(ImportLease.objects.order_by('start_id').values_list('start_id', 'end_id')),
+            [(1, 5000), (5001, 10000), (10001, 12001)],
+        )
+        # Повторная нарезка ничего не дублирует
+        self.assertEqual(plan_ranges(1, 12001, range_size=5000, plan='p'), 0)
+        self.assertEqual(plan_ranges(1, 5000, range_size=5000, plan='other'), 1)
+
+
+class LeaseTests(TestCase):
+    def setUp(self):
+        plan_ranges(1, 30, range_size=10, plan='p')
+
+    def test_acquire_takes_ranges_in_order(self):
+        first, second = acquire('a', plan='p'), acquire('b', plan='p')
+        self.assertEqual((first.start_id, first.owner, first.status, first.attempts), (1, 'a', 'leased', 1))
+        self.assertEqual(second.start_id, 11)
+        acquire('c', plan='p')
+        self.assertIsNone(acquire('d', plan='p'))
+
+    def test_lost_race_moves_to_next_range(self):
+        # Пока b выбирал кандидатов, a успел забрать тот же диапазон
+        original = QuerySet.update
+        stolen = []
+
+        def racing_update(queryset, **kwargs):
+            if kwargs.get('owner') == 'b' and not stolen:
+                stolen.append(acquire('a', plan='p'))
+            return original(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            lease = acquire('b', plan='p')
+
+        self.assertEqual(stolen[0].start_id, 1)
+        self.assertEqual(lease.start_id, 11)
+        self.assertEqual(ImportLease.objects.get(start_id=1).owner, 'a')
+        self.assertEqual(ImportLease.objects.get(start_id=1).attempts, 1)
+
+    def test_expired_lease_is_taken_over(self):
+        lease = acquire('a', plan='p', ttl=60)
+        self.assertTrue(renew(lease, ttl=60))
+        ImportLease.objects.filter(pk=lease.pk).update(leased_until=timezone.now() - timedelta(seconds=1))
+
+        taken = acquire('b', plan='p')
+        self.assertEqual((taken.pk, taken.owner, taken.attempts), (lease.pk, 'b', 2))
+        # Старый владелец больше не может ни продлить, ни закрыть диапазон
+        self.assertFalse(renew(lease))
+        complete(lease, attempted=10, imported=10, errors=0)
+        self.assertEqual(ImportLease.objects.get(pk=lease.pk).status, 'leased')
+        self.assertTrue(renew(taken))
+
+    def test_errors_return_range_after_delay(self):
+        lease = acquire('a', plan='p')
+        self.assertEqual(complete(lease, attempted=10, imported=8, errors=2), 'pending')
+        retry = ImportLease.objects.get(pk=lease.pk)
+        self.assertGreater(retry.leased_until, timezone.now())
+        self.assertNotEqual(acquire('b', plan='p').pk, lease.pk)
+
+        ImportLease.objects.filter(pk=lease.pk).update(
+            leased_until=timezone.now() - timedelta(seconds=1), attempts=import_leases.MAX_ATTEMPTS - 1)
+        again = acquire('c', plan='p')
+        self.assertEqual(again.pk, lease.pk)
+        self.assertEqual(complete(again, attempted=10, imported=8, errors=2), 'failed')
+
+
+@mock.patch('builtins.print')
+class DistributedImportTaskTests(StateDirMixin, TransactionTestCase):
+    """Задачи Celery выполняются сразу (task_always_eager, брокер memory://)"""
+
+    def setUp(self):
+        super().setUp()
+        # Настройки приложения читаются из Django с префиксом CELERY_
+        eager = {'CELERY_TASK_ALWAYS_EAGER': True, 'CELERY_TASK_EAGER_PROPAGATES': True,
+                 'CELERY_BROKER_URL': 'memory://'}
+        previous = {key: app.conf.get(key) for key in eager}
+        app.conf.update(eager)
+        self.addCleanup(app.conf.update, previous)
+
+    def test_ranges_are_imported_and_closed(self, _print):
+        fetcher = FakeFetcher({7: 404, 25: 503})
+        with mock.patch.object(MassAnimeImporter, '_fetcher', lambda importer: fetcher):
+            result = start_distributed_import.delay(1, 30, range_size=10, concurrency=2, plan='p').get()
+
+        self.assertEqual(result, {'created': 3, 'dispatched': 2})
+        self.assertEqual(sorted(fetcher.requested), list(range(1, 31)))
+        self.assertEqual(Anime.objects.count(), 28)
+        statuses = dict(ImportLease.objects.values_list('start_id', 'status'))
+        self.assertEqual(statuses, {1: 'done', 11: 'done', 21: 'pending'})
+
+        stats = progress('p')
+        self.assertEqual(stats['by_status']['done'], 2)
+        self.assertEqual((stats['imported'], stats['errors']), (28, 1))
+        self.assertEqual(stats['workers'], [])
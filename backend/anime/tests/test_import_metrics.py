@@ -0,0 +1,121 @@
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from anime.import_metrics import ImportMetrics, LatencyHistogram
+
+
+class LatencyHistogramTests(SimpleTestCase):
+    def histogram(self, *seconds):
+        histogram = LatencyHistogram()
+        for value in seconds:
+            histogram.observe(value)
+        return histogram
+
+    def test_buckets_and_percentiles(self):
+        # 0.5 мс, 3 мс дважды, 40 мс и 12 с - за последней корзиной
+        histogram = self.histogram(0.0005, 0.003, 0.003, 0.04, 12.0)
+        stats = histogram.as_dict()
+
+        self.assertEqual(stats['buckets']['le_1'], 1)
+        self.assertEqual(stats['buckets']['le_5'], 2)
+        self.assertEqual(stats['buckets']['le_50'], 1)
+        self.assertEqual(stats['buckets']['inf'], 1)
+        self.assertEqual(stats['count'], 5)
+        self.assertEqual(stats['avg_ms'], 2409.3)
+        self.assertEqual(stats['max_ms'], 12000.0)
+
+        # Перцентиль - верхняя граница корзины, где набирается p% наблюдений
+        self.assertEqual(histogram.percentile(20), 1.0)
+        self.assertEqual(histogram.percentile(50), 5.0)
+        self.assertEqual(histogram.percentile(80), 50.0)
+        self.assertEqual(histogram.percentile(95), 12000.0)
+
+    def test_bucket_bound_is_inclusive(self):
+        histogram = self.histogram(0.005)
+        self.assertEqual(histogram.counts[LatencyHistogram.BUCKETS_MS.index(5)], 1)
+
+    def test_percentile_is_capped_by_max(self):
+        histogram = self.histogram(0.002, 0.0021)
+        self.assertEqual(histogram.percentile(99), 2.1)
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        self.assertEqual(histogram.as_dict()['avg_ms'], 0.0)
+
+
+class ImportMetricsTests(SimpleTestCase):
+    def test_counters(self):
+        metrics = ImportMetrics(report_interval=None)
+        metrics.observe_fetch(200, 0.01)
+        metrics.observe_fetch(200, 0.01)
+        metrics.observe_fetch(404, 0.02)
+        # Сетевая ошибка - без латентности
+        metrics.observe_fetch(0)
+        metrics.observe_write(100, 0.05)
+        metrics.observe_write(50, 0.1)
+        metrics.observe_queue('fetch', 5)
+        metrics.observe_queue('fetch', 2)
+        metrics.incr('missing', 3)
+
+        stats = metrics.as_dict()
+        self.assertEqual(stats['http_statuses'], {'200': 2, '404': 1, '0': 1})
+        self.assertEqual(stats['fetch_latency']['count'], 3)
+        self.assertEqual(stats['counters'], {'flushes': 2, 'rows_written': 150, 'missing': 3})
+        self.assertEqual(stats['write_time']['count'], 2)
+        self.assertEqual(stats['queues'], {'fetch': {'last': 2, 'max': 5}})
+
+    def test_rates(self):
+        with mock.patch('anime.import_metrics.time.monotonic', return_value=100.0):
+            metrics = ImportMetrics()
+            metrics.observe_write(150, 0.1)
+        with mock.patch('anime.import_metrics.time.monotonic', return_value=110.0):
+            self.assertEqual(metrics.rows_per_second(), 15.0)
+            self.assertIn('записано 150 (15.0/с, в среднем 15.0/с)', metrics.progress_line())
+        # Текущая скорость - с прошлой строки прогресса, средняя - с начала
+        with mock.patch('anime.import_metrics.time.monotonic', return_value=115.0):
+            self.assertIn('(0.0/с, в среднем 10.0/с)', metrics.progress_line())
+
+    def test_maybe_report_respects_interval(self):
+        with mock.patch('anime.import_metrics.time.monotonic', return_value=100.0):
+            metrics = ImportMetrics(report_interval=5)
+        with mock.patch('builtins.print') as print_mock:
+            with mock.patch('anime.import_metrics.time.monotonic', return_value=103.0):
+                metrics.maybe_report()
+            self.assertFalse(print_mock.called)
+            with mock.patch('anime.import_metrics.time.monotonic', return_value=106.0):
+                metrics.maybe_report()
+            self.assertEqual(print_mock.call_count, 1)
+
+    def test_concurrent_updates(self):
+        metrics = ImportMetrics(report_interval=None)
+
+        def work():
+            for _ in range(1000):
+                metrics.incr('rows')
+                metrics.observe_fetch(200, 0.001)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.counters['rows'], 8000)
+        self.assertEqual(metrics.fetch_latency.count, 8000)
+
+    def test_write_report(self):
+        directory = Path(tempfile.mkdtemp(prefix='animecore-test-'))
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics = ImportMetrics(report_interval=None)
+        metrics.observe_write(10, 0.01)
+
+        path = metrics.write_report(directory / 'reports' / 'run.json', mode='graphql')
+        report = json.loads(path.read_text(encoding='utf-8'))
+        self.assertEqual(report['mode'], 'graphql')
+        self.assertEqual(report['counters']['rows_written'], 10)
@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from anime.models import Anime
+from anime.services import AnimeImportService
+from parsers.multi_source import MultiSourceParser
+from parsers.tests import FakeSource
+
+from .utils import StateDirMixin
+
+
+@mock.patch('builtins.print')
+@mock.patch.object(AnimeImportService, '_resolve_posters')
+class MultiSourceImportTests(StateDirMixin, TestCase):
+    def import_many(self, ids, **sources):
+        parser = MultiSourceParser(max_workers=2, hedge_after=5, grace=0.05, timeout=2, sources=sources)
+        with mock.patch('anime.services.MultiSourceParser', return_value=parser):
+            return AnimeImportService().import_many(ids, source='multi')
+
+    def test_failed_sources_are_errors_not_missing(self, resolve, _print):
+        results = self.import_many(
+            [1, 2, 3],
+            shikimori=FakeSource({1: {'id': 1, 'title_ru': 'Один', 'title_en': 'One'}}),
+            anilist=FakeSource({3: {'id': 3}}, error=False),
+            jikan=FakeSource(error=True),
+        )
+        # 2 нигде не нашлось, но Jikan упал: отсутствие не доказано
+        self.assertEqual(results, {1: 'imported', 2: 'error', 3: 'imported'})
+
+    def test_russian_fields_survive_update_without_shikimori(self, resolve, _print):
+        self.import_many(
+            [1],
+            shikimori=FakeSource({1: {'id': 1, 'title_ru': 'Тетрадь смерти', 'title_en': 'Death Note',
+                                      'genres': [{'name': 'Триллер'}]}}),
+        )
+        self.import_many(
+            [1],
+            shikimori=FakeSource({1: {'id': 1}}, delay=0.5),
+            anilist=FakeSource({1: {'id': 1, 'title_en': 'Death Note (TV)', 'genres': [{'name': 'Thriller'}]}}),
+        )
+        anime = Anime.objects.get(shikimori_id=1)
+        self.assertEqual(anime.title_ru, 'Тетрадь смерти')
+        self.assertEqual(anime.title_en, 'Death Note (TV)')
+        self.assertEqual(list(anime.genres.values_list('name', flat=True)), ['Триллер'])
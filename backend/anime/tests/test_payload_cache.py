@@ -0,0 +1,81 @@
+import json
+from io import StringIO
+
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from anime.models import Anime
+from anime.payload_cache import RawPayloadCache
+from parsers.shikimori import ShikimoriParser
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+class FakeGraphQLSession:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def post(self, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'data': {'animes': self.nodes}}).encode()
+        return response
+
+
+class RawPayloadCacheTests(StateDirMixin, SimpleTestCase):
+    def cache(self):
+        cache = RawPayloadCache()
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_roundtrip_and_dedupe(self):
+        cache = self.cache()
+        sha = cache.put('shikimori', 1, shikimori_payload(1), etag='"v1"')
+        self.assertEqual(cache.put('shikimori', 2, shikimori_payload(1)), sha)
+        self.assertEqual(cache.get('shikimori', 1), shikimori_payload(1))
+        self.assertEqual(cache.etag('shikimori', 1), '"v1"')
+        self.assertEqual(len(list(cache.objects.rglob('*.json.z'))), 1)
+        self.assertEqual([i for i, _ in cache.iter_payloads('shikimori')], [1, 2])
+
+    def test_same_payload_without_etag_keeps_etag(self):
+        cache = self.cache()
+        cache.put('shikimori', 1, shikimori_payload(1), etag='"v1"')
+        cache.put('shikimori', 1, shikimori_payload(1))
+        self.assertEqual(cache.etag('shikimori', 1), '"v1"')
+
+        # Изменившийся ответ без ETag - старый ETag к нему уже не относится
+        cache.put('shikimori', 1, shikimori_payload(1, episodes=24))
+        self.assertIsNone(cache.etag('shikimori', 1))
+
+    def test_graphql_does_not_overwrite_rest(self):
+        cache = self.cache()
+        cache.put('shikimori', 5, shikimori_payload(5), etag='"rest"')
+        parser = ShikimoriParser(payload_cache=cache)
+        parser.session = FakeGraphQLSession([{'id': '5', 'name': 'Title 5'}])
+
+        self.assertEqual([item['id'] for item in parser.get_anime_chunk([5])], [5])
+        self.assertEqual(cache.get('shikimori', 5), shikimori_payload(5))
+        self.assertEqual(cache.etag('shikimori', 5), '"rest"')
+        self.assertEqual(cache.get(ShikimoriParser.GRAPHQL_CACHE_SOURCE, 5)['name'], 'Title 5')
+
+    def test_shared_instance_per_process(self):
+        shared = RawPayloadCache.shared()
+        self.assertIs(RawPayloadCache.shared(), shared)
+        shared.close()
+        reopened = RawPayloadCache.shared()
+        self.assertIsNot(reopened, shared)
+        reopened.close()
+
+
+class RenormalizeTests(StateDirMixin, TestCase):
+    def test_rest_first_then_graphql_only_ids(self):
+        cache = RawPayloadCache()
+        cache.put('shikimori', 1, shikimori_payload(1))
+        cache.put(ShikimoriParser.GRAPHQL_CACHE_SOURCE, 1, shikimori_payload(1, russian='Из GraphQL'))
+        cache.put(ShikimoriParser.GRAPHQL_CACHE_SOURCE, 2, shikimori_payload(2))
+        cache.close()
+
+        call_command('renormalize', stdout=StringIO())
+        self.assertEqual(dict(Anime.objects.values_list('shikimori_id', 'title_ru')),
+                         {1: 'Название 1', 2: 'Название 2'})
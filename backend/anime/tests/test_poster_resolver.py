@@ -0,0 +1,134 @@
+import json
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from anime.models import Anime
+from anime.poster_resolver import AnilistPosterResolver
+from anime.services import AnimeImportService
+from parsers.anilist import AnilistParser
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+class FakeAliasSession:
+    """AniList GraphQL с алиасами t0..tN: постер есть у названий из posters"""
+
+    def __init__(self, posters):
+        self.posters = posters
+        self.variables = []
+
+    def post(self, url, **kwargs):
+        variables = kwargs['json']['variables']
+        self.variables.append(variables)
+        data = {}
+        for alias, title in variables.items():
+            poster = self.posters.get(title)
+            media = [{'id': 1, 'coverImage': {'large': poster, 'medium': None}}] if poster else []
+            data[alias] = {'media': media}
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'data': data}).encode()
+        return response
+
+
+class PostersBatchTests(SimpleTestCase):
+    def test_titles_are_sent_in_aliased_batches(self):
+        titles = [f'Title {n}' for n in range(30)]
+        parser = AnilistParser()
+        parser.session = FakeAliasSession({'Title 0': 'https://img/0.jpg', 'Title 29': 'https://img/29.jpg'})
+
+        # Повторы и пустые названия в запрос не попадают
+        posters = parser.get_posters_batch(titles + ['Title 0', ''])
+
+        sizes = [len(variables) for variables in parser.session.variables]
+        self.assertEqual(sizes, [AnilistParser.POSTER_BATCH_LIMIT, 30 - AnilistParser.POSTER_BATCH_LIMIT])
+        self.assertEqual(parser.session.variables[1]['t0'], 'Title 25')
+        self.assertEqual(len(posters), 30)
+        self.assertEqual(posters['Title 0'], 'https://img/0.jpg')
+        self.assertEqual(posters['Title 29'], 'https://img/29.jpg')
+        self.assertIsNone(posters['Title 1'])
+
+
+class FakePosterParser:
+    POSTER_BATCH_LIMIT = 25
+
+    def __init__(self, posters, error=None):
+        self.posters = posters
+        self.error = error
+        self.calls = []
+
+    def get_posters_batch(self, titles):
+        self.calls.append(list(titles))
+        if self.error:
+            raise self.error
+        return {title: self.posters.get(title) for title in titles}
+
+
+class AnilistPosterResolverTests(TestCase):
+    def setUp(self):
+        self.by_japanese = Anime.objects.create(
+            shikimori_id=1, title_ru='Тетрадь смерти', title_en='Death Note EN', title_jp='Death Note',
+            poster_url='/missing_original.jpg')
+        self.by_russian = Anime.objects.create(
+            shikimori_id=2, title_ru='Наруто', title_en='', title_jp='', poster_url='')
+        self.default_poster = Anime.objects.create(
+            shikimori_id=3, title_ru='Заглушка', title_en='Placeholder', poster_url='/missing_x96.jpg')
+        self.with_poster = Anime.objects.create(
+            shikimori_id=4, title_ru='Есть постер', title_en='Has Poster', poster_url='https://img/own.jpg')
+
+    def test_fallback_through_title_variants(self):
+        parser = FakePosterParser({
+            'Death Note': 'https://img/dn.jpg',
+            'Наруто': 'https://img/naruto.jpg',
+            'Placeholder': 'https://s4.anilist.co/file/anilistcdn/media/anime/cover/medium/default.jpg',
+            'Has Poster': 'https://img/other.jpg',
+        })
+        resolver = AnilistPosterResolver(parser=parser)
+        self.assertEqual(resolver.resolve(), 2)
+
+        # Английское, затем японское и русское; в следующий раунд - только ненайденные,
+        # в том числе те, для которых нашлась лишь заглушка AniList
+        self.assertEqual(parser.calls, [
+            ['Death Note EN', 'Наруто', 'Placeholder'],
+            ['Death Note', 'Заглушка'],
+        ])
+        self.assertEqual(Anime.objects.get(pk=self.by_japanese.pk).poster_url, 'https://img/dn.jpg')
+        self.assertEqual(Anime.objects.get(pk=self.by_russian.pk).poster_url, 'https://img/naruto.jpg')
+        # Заглушка AniList постером не считается, а свой постер не трогаем
+        self.assertEqual(Anime.objects.get(pk=self.default_poster.pk).poster_url, '/missing_x96.jpg')
+        self.assertEqual(Anime.objects.get(pk=self.with_poster.pk).poster_url, 'https://img/own.jpg')
+        self.assertEqual(resolver.stats['updated'], 2)
+
+    def test_only_given_ids(self):
+        parser = FakePosterParser({'Наруто': 'https://img/naruto.jpg'})
+        AnilistPosterResolver(parser=parser).resolve(shikimori_ids=[2])
+        self.assertEqual(parser.calls, [['Наруто']])
+
+    def test_request_error_keeps_placeholder(self):
+        parser = FakePosterParser({}, error=requests.ConnectionError('reset'))
+        resolver = AnilistPosterResolver(parser=parser)
+        with mock.patch('builtins.print'):
+            self.assertEqual(resolver.resolve(), 0)
+        self.assertEqual(resolver.stats['errors'], 3)
+        self.assertEqual(Anime.objects.get(pk=self.by_japanese.pk).poster_url, '/missing_original.jpg')
+
+
+@mock.patch('builtins.print')
+@mock.patch('anime.tasks.resolve_posters.delay')
+class SingleImportPosterTests(StateDirMixin, TestCase):
+    def import_payload(self, payload):
+        service = AnimeImportService()
+        with mock.patch.object(service.parser, 'get_anime_by_id', return_value=payload):
+            return service.import_single_anime(payload['id'])
+
+    def test_missing_poster_is_resolved_in_background(self, delay, _print):
+        anime = self.import_payload(shikimori_payload(
+            5, image={'original': '/assets/globals/missing_original.jpg'}))
+        self.assertEqual(anime.poster_url, '/missing_original.jpg')
+        delay.assert_called_once_with([5])
+
+    def test_poster_from_shikimori_is_kept(self, delay, _print):
+        self.import_payload(shikimori_payload(6))
+        delay.assert_not_called()
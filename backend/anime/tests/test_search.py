@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from anime.bulk_writer import AnimeBulkWriter
+from anime.models import Anime
+from anime.search import SearchCursorPagination, search_anime
+
+
+def titles(queryset):
+    return [anime.title_ru for anime in queryset]
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        Anime.objects.create(shikimori_id=1, title_ru='Наруто', title_en='Naruto', score=8.0)
+        Anime.objects.create(shikimori_id=2, title_ru='Наруто: Ураганные хроники', title_en='Naruto: Shippuuden',
+                             score=8.3)
+        Anime.objects.create(shikimori_id=3, title_ru='Тетрадь смерти', title_en='Death Note', score=8.6)
+
+    def search(self, query):
+        return titles(search_anime(Anime.objects.all(), query))
+
+    def test_words_are_prefixes_joined_by_and(self):
+        self.assertEqual(sorted(self.search('нару')), ['Наруто', 'Наруто: Ураганные хроники'])
+        self.assertEqual(self.search('нару хрон'), ['Наруто: Ураганные хроники'])
+        self.assertEqual(self.search('нару смерт'), [])
+
+    def test_query_is_normalized_like_titles(self):
+        self.assertEqual(self.search('  DEATH  note!'), ['Тетрадь смерти'])
+        # Транслитерация названий: латиницей находится русское название
+        self.assertEqual(self.search('tetrad'), ['Тетрадь смерти'])
+
+    def test_index_follows_updates(self):
+        anime = Anime.objects.get(shikimori_id=3)
+        anime.title_ru = 'Тетрадь жизни'
+        anime.save()
+        self.assertEqual(self.search('смерти'), [])
+        self.assertEqual(self.search('жизни'), ['Тетрадь жизни'])
+
+        with AnimeBulkWriter() as writer:
+            writer.add({'id': 4, 'title_ru': 'Атака титанов', 'title_en': 'Attack on Titan', 'title_jp': ''})
+        self.assertEqual(self.search('титан'), ['Атака титанов'])
+
+        Anime.objects.filter(shikimori_id=4).delete()
+        self.assertEqual(self.search('титан'), [])
+
+    def test_search_endpoint(self):
+        client = APIClient(HTTP_HOST='localhost')
+        response = client.get(reverse('anime-list'), {'search': 'naruto shipp'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['title_ru'] for item in response.data['results']], ['Наруто: Ураганные хроники'])
+
+
+class SearchCursorPaginationTests(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Anime.objects.create(shikimori_id=i + 1, title_ru=f'Сага {i}', score=9 - i * 0.5)
+        self.client = APIClient(HTTP_HOST='localhost')
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walks_all_results_by_cursor(self):
+        page = self.get(reverse('anime-list'), search='сага', page_size=3)
+        self.assertEqual((page['count'], page['count_exact'], page['previous']), (7, True, None))
+        seen = [item['title_ru'] for item in page['results']]
+        while page['next']:
+            page = self.get(page['next'])
+            seen.extend(item['title_ru'] for item in page['results'])
+        self.assertEqual(seen, [f'Сага {i}' for i in range(7)])
+        self.assertIsNotNone(page['previous'])
+
+    def test_page_continues_from_same_row_after_shift(self):
+        page = self.get(reverse('anime-list'), search='сага', page_size=3)
+        # Новый лидер выдачи сдвигает все позиции на одну
+        Anime.objects.create(shikimori_id=100, title_ru='Сага лучшая', score=9.9)
+        page = self.get(page['next'])
+        self.assertEqual([item['title_ru'] for item in page['results']], ['Сага 3', 'Сага 4', 'Сага 5'])
+
+    def test_results_are_bounded(self):
+        with mock.patch.object(SearchCursorPagination, 'max_results', 4):
+            page = self.get(reverse('anime-list'), search='сага', page_size=3)
+            self.assertEqual(page['count'], 7)
+            page = self.get(page['next'])
+        self.assertEqual([item['title_ru'] for item in page['results']], ['Сага 3'])
+        self.assertIsNone(page['next'])
+
+    def test_bad_cursor(self):
+        response = self.client.get(reverse('anime-list'), {'search': 'сага', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
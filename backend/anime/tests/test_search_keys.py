@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase, TestCase
+
+from anime.bulk_writer import AnimeBulkWriter
+from anime.mass_import import MassAnimeImporter
+from anime.models import Anime
+from anime.search_keys import build_search_key, normalize, query_tokens, romaji_to_cyrillic, tokens
+from parsers.shikimori import ShikimoriParser
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+class SearchKeyTests(SimpleTestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('Ёжик в Тумане'), 'ежик в тумане')
+        self.assertEqual(normalize('Shōnen Pokémon'), 'shonen pokemon')
+        self.assertEqual(normalize(None), '')
+
+    def test_tokens_join_and_split(self):
+        self.assertEqual(tokens('Ван-Пис'), ['ванпис', 'ван', 'пис'])
+        self.assertEqual(tokens('Re:Zero'), ['rezero', 're', 'zero'])
+
+    def test_tokens_accept_title_lists(self):
+        self.assertEqual(tokens(['One Piece', None]), ['one', 'piece'])
+        self.assertEqual(tokens(2011), ['2011'])
+
+    def test_transliteration_both_ways(self):
+        key = build_search_key('Атака титанов', 'Shingeki no Kyojin')
+        for word in ('ataka', 'titanov', 'сингэки', 'сингеки', 'кедзин'):
+            self.assertIn(word, key.split())
+        self.assertIsNone(romaji_to_cyrillic('xylophone'))
+
+    def test_rest_shaped_titles(self):
+        key = build_search_key('Ван-Пис', ['One Piece'], ['ワンピース'])
+        self.assertIn('one', key.split())
+        self.assertIn('vanpis', key.split())
+
+    def test_query_tokens(self):
+        self.assertEqual(query_tokens('  Ван-Пис  ёлка ', limit=1), ['ванпис'])
+
+
+class RestPayloadImportTests(StateDirMixin, TestCase):
+    """english/japanese в REST Shikimori - списки; раньше они роняли build_search_key"""
+
+    def assert_imported(self, record):
+        self.assertEqual(record['title_en'], 'English 5114')
+        self.assertEqual(record['title_jp'], '日本 5114')
+        with AnimeBulkWriter() as writer:
+            writer.add(record)
+        anime = Anime.objects.get(shikimori_id=5114)
+        self.assertEqual(anime.title_en, 'English 5114')
+        self.assertIn('english', anime.search_text.split())
+
+    def test_parser_normalizer(self):
+        self.assert_imported(ShikimoriParser().normalize_anime_data(shikimori_payload(5114)))
+
+    def test_mass_import_normalizer(self):
+        importer = MassAnimeImporter(cache_payloads=False, report_interval=None)
+        self.assert_imported(importer._normalize(5114, shikimori_payload(5114)))
@@ -0,0 +1,134 @@
+import json
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import TestCase
+from django.utils import timezone
+
+from anime.bulk_writer import AnimeBulkWriter
+from anime.models import Anime
+from anime.payload_cache import RawPayloadCache
+from anime.sync_scheduler import AnimeSyncScheduler
+
+from .utils import StateDirMixin, shikimori_payload
+
+
+class FakeRestSession:
+    """Ответы REST Shikimori по ID; на совпавший If-None-Match - 304"""
+
+    def __init__(self, payloads, etags=None):
+        self.payloads = payloads
+        self.etags = etags or {}
+        self.headers = {}
+
+    def get(self, url, headers=None, **kwargs):
+        anime_id = int(url.rsplit('/', 1)[1])
+        self.headers[anime_id] = dict(headers or {})
+        response = requests.Response()
+        etag = self.etags.get(anime_id)
+        if etag and self.headers[anime_id].get('If-None-Match') == etag:
+            response.status_code = 304
+            return response
+        if anime_id not in self.payloads:
+            response.status_code = 404
+            return response
+        response.status_code = 200
+        response._content = json.dumps(self.payloads[anime_id]).encode()
+        if etag:
+            response.headers['ETag'] = etag
+        return response
+
+
+class AnimeSyncSchedulerTests(StateDirMixin, TestCase):
+    def scheduler(self, session=None):
+        cache = RawPayloadCache(self.state_dir / 'payloads')
+        self.addCleanup(cache.close)
+        scheduler = AnimeSyncScheduler(workers=2, payload_cache=cache)
+        if session:
+            scheduler.parser.session = session
+        return scheduler
+
+    def import_payloads(self, *payloads):
+        parser = self.scheduler().parser
+        with AnimeBulkWriter() as writer:
+            writer.add_many(parser.normalize_anime_data(payload) for payload in payloads)
+
+    def synced(self, shikimori_id, ago, status):
+        Anime.objects.filter(shikimori_id=shikimori_id).update(
+            status=status, last_synced=timezone.now() - ago)
+
+    def test_due_queryset_uses_status_intervals(self):
+        self.import_payloads(*[shikimori_payload(i) for i in range(1, 7)])
+        self.synced(1, timedelta(hours=1), 'ongoing')
+        self.synced(2, timedelta(hours=7), 'ongoing')
+        self.synced(3, timedelta(hours=2), 'announced')
+        self.synced(4, timedelta(days=2), 'announced')
+        self.synced(5, timedelta(days=40), 'finished')
+        self.synced(6, timedelta(days=10), 'finished')
+        # Ни разу не синхронизировалось - считаем от updated_at
+        Anime.objects.create(shikimori_id=7, title_ru='Без синхронизации', status='finished',
+                             last_synced=None)
+        Anime.objects.filter(shikimori_id=7).update(updated_at=timezone.now() - timedelta(days=31))
+
+        scheduler = self.scheduler()
+        due = list(scheduler.due_queryset().values_list('shikimori_id', flat=True))
+        # Онгоинги первыми, внутри статуса - давно не обновлённые
+        self.assertEqual(due, [2, 4, 5, 7])
+        self.assertEqual(scheduler.plan(), {'ongoing': 1, 'announced': 1, 'finished': 2})
+
+    def test_not_modified_only_moves_last_synced(self):
+        self.import_payloads(shikimori_payload(1))
+        self.synced(1, timedelta(days=40), 'finished')
+        before = Anime.objects.get(shikimori_id=1)
+
+        session = FakeRestSession({1: shikimori_payload(1, score='9.9')}, etags={1: '"v1"'})
+        scheduler = self.scheduler(session)
+        scheduler.payload_cache.put('shikimori', 1, shikimori_payload(1), etag='"v1"')
+        stats = scheduler.run()
+
+        self.assertEqual(session.headers[1], {'If-None-Match': '"v1"'})
+        self.assertEqual((stats['checked'], stats['not_modified'], stats['changed']), (1, 1, 0))
+        after = Anime.objects.get(shikimori_id=1)
+        self.assertEqual(after.score, before.score)
+        self.assertEqual(after.updated_at, before.updated_at)
+        self.assertGreater(after.last_synced, before.last_synced)
+
+    def test_writes_only_changed_fields(self):
+        self.import_payloads(shikimori_payload(1), shikimori_payload(2))
+        for shikimori_id in (1, 2):
+            self.synced(shikimori_id, timedelta(days=40), 'finished')
+        untouched = Anime.objects.get(shikimori_id=2)
+
+        session = FakeRestSession({
+            1: shikimori_payload(1, score='8.1', genres=[{'id': 2, 'name': 'Drama', 'russian': 'Драма'}]),
+            2: shikimori_payload(2),
+        })
+        scheduler = self.scheduler(session)
+        with mock.patch.object(Anime.objects, 'bulk_update', wraps=Anime.objects.bulk_update) as bulk_update:
+            stats = scheduler.run()
+
+        self.assertEqual((stats['changed'], stats['unchanged']), (1, 1))
+        self.assertEqual(scheduler.changed_fields, Counter({'score': 1, 'genres': 1}))
+        self.assertEqual(bulk_update.call_args.args[1], ['score', 'updated_at'])
+
+        anime = Anime.objects.get(shikimori_id=1)
+        self.assertEqual(float(anime.score), 8.1)
+        # Жанр заменён, а не добавлен; студии не тронуты
+        self.assertEqual(list(anime.genres.values_list('name', flat=True)), ['Драма'])
+        self.assertEqual(list(anime.studios.values_list('name', flat=True)), ['Studio'])
+        self.assertEqual(Anime.objects.get(shikimori_id=2).updated_at, untouched.updated_at)
+
+    def test_studio_change_is_written(self):
+        self.import_payloads(shikimori_payload(1))
+        self.synced(1, timedelta(days=40), 'finished')
+
+        session = FakeRestSession({1: shikimori_payload(1, studios=[{'id': 2, 'name': 'Madhouse'}])})
+        scheduler = self.scheduler(session)
+        scheduler.run()
+
+        self.assertEqual(scheduler.changed_fields, Counter({'studios': 1}))
+        anime = Anime.objects.get(shikimori_id=1)
+        self.assertEqual(list(anime.studios.values_list('name', flat=True)), ['Madhouse'])
+        self.assertEqual(list(anime.genres.values_list('name', flat=True)), ['Экшен'])
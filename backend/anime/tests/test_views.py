@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from anime.models import ImportJob
+
+from .utils import create_admin
+
+
+@mock.patch('anime.views.run_import_job')
+class ImportAnimeViewTests(TestCase):
+    def setUp(self):
+        admin = create_admin()
+        self.client = APIClient(HTTP_HOST='localhost')
+        self.client.force_authenticate(admin)
+
+    def post(self, data, format='json'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('import-anime'), data, format=format)
+
+    def test_list_is_queued(self, task):
+        task.delay.return_value.id = 'task-1'
+        response = self.post({'external_ids': [5114, '1', 5114]})
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.external_ids, [5114, 1])
+        self.assertEqual(job.task_id, 'task-1')
+        task.delay.assert_called_once_with(job.pk)
+
+    def test_string_is_rejected(self, task):
+        response = self.post({'external_ids': '5114'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+        task.delay.assert_not_called()
+
+    def test_single_external_id(self, task):
+        task.delay.return_value.id = 'task-1'
+        response = self.post({'external_id': '5114'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ImportJob.objects.get().external_ids, [5114])
+
+    def test_form_list(self, task):
+        task.delay.return_value.id = 'task-1'
+        response = self.post({'external_ids': ['5114', '1']}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ImportJob.objects.get().external_ids, [5114, 1])
@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+
+
+class StateDirMixin:
+    """Свой IMPORT_STATE_DIR на каждый тест: журналы, карты ID и кеши не текут между тестами"""
+
+    def setUp(self):
+        super().setUp()
+        self.state_dir = Path(tempfile.mkdtemp(prefix='animecore-test-'))
+        self.addCleanup(shutil.rmtree, self.state_dir, ignore_errors=True)
+        override = override_settings(IMPORT_STATE_DIR=self.state_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+def shikimori_payload(anime_id: int, **extra) -> dict:
+    """Ответ /api/animes/<id> в том виде, в каком его отдаёт REST Shikimori"""
+    data = {
+        'id': anime_id,
+        'name': f'Title {anime_id}',
+        'russian': f'Название {anime_id}',
+        'english': [f'English {anime_id}'],
+        'japanese': [f'日本 {anime_id}'],
+        'aired_on': '2020-04-01',
+        'status': 'released',
+        'episodes': 12,
+        'score': '7.5',
+        'image': {'original': f'/system/animes/original/{anime_id}.jpg'},
+        'genres': [{'id': 1, 'name': 'Action', 'russian': 'Экшен'}],
+        'studios': [{'id': 1, 'name': 'Studio'}],
+    }
+    data.update(extra)
+    return data
+
+
+def create_admin(username: str = 'admin'):
+    """Суперпользователь для тестов API.
+
+    В миграциях users остался NOT NULL phone_verified, которого уже нет
+    в модели, поэтому такие колонки заполняем False вручную.
+    """
+    User = get_user_model()
+    user = User(username=username, is_staff=True, is_superuser=True)
+    user.set_unusable_password()
+    fields = [field for field in User._meta.local_concrete_fields if not field.primary_key]
+    columns = [field.column for field in fields]
+    values = [field.get_db_prep_save(field.pre_save(user, True), connection) for field in fields]
+    with connection.cursor() as cursor:
+        table = User._meta.db_table
+        for column in connection.introspection.get_table_description(cursor, table):
+            if column.name not in columns and column.name != User._meta.pk.column and not column.null_ok:
+                columns.append(column.name)
+                values.append(False)
+        cursor.execute(
+            f"INSERT INTO {connection.ops.quote_name(table)} ({', '.join(map(connection.ops.quote_name, columns))}) "
+            f"VALUES ({', '.join(['%s'] * len(values))})",
+            values,
+        )
+    return User.objects.get(username=username)
+
+
+class FakeFetcher:
+    """Стадия загрузки без сети: статусы по ID, всё остальное - 200"""
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.requested = []
+
+    def __call__(self, anime_ids):
+        for anime_id in anime_ids:
+            self.requested.append(anime_id)
+            status = self.statuses.get(anime_id, 200)
+            yield anime_id, status, shikimori_payload(anime_id) if status == 200 else None
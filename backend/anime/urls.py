@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import AnimeViewSet, GenreViewSet
-from .views import import_anime_view
+from .views import import_anime_view, import_job_view
 
 router = DefaultRouter()
 router.register(r'anime', AnimeViewSet, basename='anime')
@@ -10,4 +10,5 @@ router.register(r'genres', GenreViewSet, basename='genre')
 urlpatterns = [
     path('', include(router.urls)),
     path('import/', import_anime_view, name='import-anime'),
+    path('import/<int:job_id>/', import_job_view, name='import-job'),
 ]
\ No newline at end of file
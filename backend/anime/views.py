@@ -2,11 +2,20 @@ from rest_framework import viewsets, filters, status
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Anime, Genre
-from .serializers import AnimeSerializer, GenreSerializer
-from rest_framework.decorators import api_view, permission_classes
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from . import external_ids
+from .autocomplete import DEFAULT_LIMIT, get_prefix_index
+from .models import Anime, Genre, ImportJob
+from .search import FullTextSearchFilter, SearchCursorPagination
+from .serializers import AnimeSerializer, GenreSerializer, ImportJobSerializer
+from .tasks import run_import_job
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from anime.services import AnimeImportService
+
+# Сколько внешних ID можно сопоставить за один запрос
+MAX_RESOLVE_IDS = 5000
 
 class AnimePagination(PageNumberPagination):
     page_size = 1000
@@ -23,42 +32,145 @@ class AnimeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AnimeSerializer
     permission_classes = [AllowAny]
     pagination_class = AnimePagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # ?search= идёт через полнотекстовый индекс по search_text, лучшие совпадения первыми
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'year']
-    search_fields = ['search_text']
     ordering_fields = ['title_ru', 'year', 'score', 'episodes']
 
-    def paginate_queryset(self, queryset):
-        if 'search' in self.request.query_params:
-            # Для поиска отключаем пагинацию
-            return None
-        return super().paginate_queryset(queryset)
+    # Страница поиска грузится отдельным запросом по pk, без аннотаций поиска
+    search_prefetch = ['genres']
+
+    @property
+    def paginator(self):
+        # Поиск листается курсором по ограниченной выдаче, остальное - страницами
+        if not hasattr(self, '_paginator'):
+            query = self.request.query_params.get(FullTextSearchFilter.search_param, '') if self.request else ''
+            self._paginator = SearchCursorPagination() if query.strip() else self.pagination_class()
+        return self._paginator
+
+    @action(detail=False, methods=['get', 'post'])
+    def resolve(self, request):
+        """Внешние ID -> наши: {source, ids} в запросе, {source, found, missing} в ответе"""
+        params = request.data if request.method == 'POST' else request.query_params
+        source = params.get('source', 'shikimori')
+        ids = params.get('ids') or []
+        if isinstance(ids, str):
+            ids = [i for i in ids.split(',') if i.strip()]
+
+        if source not in external_ids.SOURCES:
+            return Response(
+                {'error': f'Неизвестный источник: {source}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = list(dict.fromkeys(int(external_id) for external_id in ids))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'ids должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > MAX_RESOLVE_IDS:
+            return Response(
+                {'error': f'Не больше {MAX_RESOLVE_IDS} ID за запрос'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        found = external_ids.resolve(source, ids)
+        return Response({
+            'source': source,
+            'found': {str(external_id): anime_id for external_id, anime_id in found.items()},
+            'missing': [external_id for external_id in ids if external_id not in found],
+        })
+
+    # Без аутентификации: сессия и токен - это запрос в базу на каждую букву
+    @action(detail=False, methods=['get'], authentication_classes=[], permission_classes=[AllowAny])
+    def autocomplete(self, request):
+        """Подсказки при наборе: ?q=нару&limit=10, из индекса в памяти, без запросов к базе"""
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        query = request.query_params.get('q', '')
+        return Response({'query': query, 'results': get_prefix_index().search(query, limit)})
+
+# Сколько ID можно поставить в одно задание импорта
+MAX_IMPORT_JOB_IDS = 1000
+# multi - Shikimori, AniList и Jikan сразу со слиянием полей
+IMPORT_SOURCES = ('shikimori', 'multi')
 
-@api_view(['POST'])
+
+@api_view(['GET', 'POST'])
 @permission_classes([IsAdminUser])
 def import_anime_view(request):
-    """API endpoint для импорта аниме"""
-    external_id = request.data.get('external_id')
+    """API импорта аниме: POST ставит задание в очередь, GET - последние задания"""
+    if request.method == 'GET':
+        jobs = ImportJob.objects.all()[:50]
+        return Response(ImportJobSerializer(jobs, many=True).data)
+
     source = request.data.get('source', 'shikimori')
-    
-    if not external_id:
+    if hasattr(request.data, 'getlist') and 'external_ids' in request.data:
+        # Форма: external_ids=1&external_ids=2
+        external_ids = request.data.getlist('external_ids')
+    else:
+        external_ids = request.data.get('external_ids')
+    if external_ids is None and request.data.get('external_id'):
+        external_ids = [request.data.get('external_id')]
+
+    if not external_ids:
         return Response(
-            {'error': 'external_id обязателен'},
+            {'error': 'external_id или external_ids обязателен'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    service = AnimeImportService()
-    anime = service.import_anime_from_external(int(external_id), source)
-    
-    if anime:
-        from .serializers import AnimeSerializer
-        return Response({
-            'success': True,
-            'message': f'Аниме "{anime.display_title}" успешно импортировано',
-            'anime': AnimeSerializer(anime).data
-        })
-    
+    # Строку "5114" иначе разберём по символам в ID 5, 1, 1, 4
+    if not isinstance(external_ids, list):
+        return Response(
+            {'error': 'external_ids должен быть списком'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if source not in IMPORT_SOURCES:
+        return Response(
+            {'error': f'Неизвестный источник: {source}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        external_ids = list(dict.fromkeys(int(external_id) for external_id in external_ids))
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'external_ids должны быть числами'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(external_ids) > MAX_IMPORT_JOB_IDS:
+        return Response(
+            {'error': f'Не больше {MAX_IMPORT_JOB_IDS} ID в одном задании'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    job = ImportJob.objects.create(source=source, external_ids=external_ids, requested_by=request.user)
+
+    def enqueue():
+        result = run_import_job.delay(job.pk)
+        ImportJob.objects.filter(pk=job.pk).update(task_id=result.id or '')
+
+    # Задание должно быть в БД до того, как его увидит воркер
+    transaction.on_commit(enqueue)
+
     return Response(
-        {'success': False, 'error': 'Не удалось импортировать аниме'},
-        status=status.HTTP_400_BAD_REQUEST
-    )
\ No newline at end of file
+        dict(ImportJobSerializer(job).data,
+             status_url=request.build_absolute_uri(reverse('import-job', args=[job.pk]))),
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def import_job_view(request, job_id):
+    """Статус задания импорта; ?include=anime - вместе с импортированными аниме"""
+    job = get_object_or_404(ImportJob, pk=job_id)
+    data = ImportJobSerializer(job).data
+
+    if request.query_params.get('include') == 'anime':
+        imported_ids = [int(external_id) for external_id, result in job.results.items() if result == 'imported']
+        anime = Anime.objects.filter(shikimori_id__in=imported_ids).prefetch_related('genres')
+        data['anime'] = AnimeSerializer(anime, many=True).data
+
+    return Response(data)
@@ -1 +1,4 @@
+# Celery-приложение загружается вместе с Django, чтобы работал @shared_task
+from .celery import app as celery_app
 
+__all__ = ('celery_app',)
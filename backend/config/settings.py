@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -160,6 +161,25 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Служебные файлы импорта (журналы чекпоинтов и т.п.)
+IMPORT_STATE_DIR = BASE_DIR / 'import_state'
+
+# Апстримы импорта; benchmark_import подменяет их на локальный fake_upstream
+SHIKIMORI_URL = 'https://shikimori.one'
+ANILIST_URL = 'https://graphql.anilist.co'
+JIKAN_URL = 'https://api.jikan.moe/v4'
+
+# Индексы поиска и подсказок в памяти собираются в фоне при старте веб-процесса
+SEARCH_INDEX_WARMUP = os.environ.get('SEARCH_INDEX_WARMUP', '1') == '1'
+
+# Celery: распределённый импорт по диапазонам ID (anime.tasks).
+# Для тестов и локального запуска без Redis: CELERY_BROKER_URL=memory://,
+# а с CELERY_TASK_ALWAYS_EAGER=1 задачи выполняются сразу в вызывающем процессе
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'cache+memory://')
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER') == '1'
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Email settings для России
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.yandex.ru'  # Или 'smtp.mail.ru' для Mail.ru
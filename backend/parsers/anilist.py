@@ -1,11 +1,47 @@
+import re
 import requests
 from typing import Dict, List, Optional
+from django.conf import settings
 from .base import BaseAnimeParser
 
 class AnilistParser(BaseAnimeParser):
     """Парсер Anilist для получения постеров"""
 
     BASE_URL = "https://graphql.anilist.co"
+    # Сколько поисков помещается в один запрос с алиасами (лимит сложности AniList - 500)
+    POSTER_BATCH_LIMIT = 25
+
+    STATUS_MAP = {
+        'FINISHED': 'finished',
+        'CANCELLED': 'finished',
+        'RELEASING': 'ongoing',
+        'HIATUS': 'ongoing',
+        'NOT_YET_RELEASED': 'announced',
+    }
+
+    # Поля карточки, которые использует normalize_anime_data
+    MEDIA_BY_MAL_QUERY = """
+    query ($idMal: Int) {
+      Media(idMal: $idMal, type: ANIME) {
+        id
+        idMal
+        title { romaji english native }
+        description(asHtml: false)
+        status
+        episodes
+        averageScore
+        startDate { year month day }
+        coverImage { extraLarge large medium }
+        genres
+        studios(isMain: true) { nodes { name } }
+        trailer { id site }
+      }
+    }
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.BASE_URL = getattr(settings, 'ANILIST_URL', self.BASE_URL)
 
     def search_anime(self, query: str, limit: int = 20) -> List[Dict]:
         """Поиск аниме по названию"""
@@ -55,6 +91,58 @@ class AnilistParser(BaseAnimeParser):
         data = response.json()
         return data.get("data", {}).get("Media")
 
+    def get_anime_by_mal_id(self, mal_id: int) -> Optional[Dict]:
+        """Карточка аниме по MAL ID (он же shikimori_id); None, если на AniList такого нет"""
+        response = self.session.post(
+            self.BASE_URL,
+            json={"query": self.MEDIA_BY_MAL_QUERY, "variables": {"idMal": mal_id}},
+            timeout=10,
+        )
+        # «Не найдено» AniList отдаёт статусом 404 с errors в теле
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return (response.json().get("data") or {}).get("Media")
+
+    def normalize_anime_data(self, raw_data: Dict) -> Dict:
+        """Нормализация в формат ShikimoriParser.normalize_anime_data (без русских полей)"""
+        title = raw_data.get("title") or {}
+        cover = raw_data.get("coverImage") or {}
+        start = raw_data.get("startDate") or {}
+        trailer = raw_data.get("trailer") or {}
+        score = raw_data.get("averageScore")
+
+        normalized = {
+            'id': raw_data.get('idMal'),
+            'mal_id': raw_data.get('idMal'),
+            'anilist_id': raw_data.get('id'),
+            'title_ru': None,
+            'title_en': title.get('english') or title.get('romaji'),
+            'title_jp': title.get('native'),
+            'description': self._clean_description(raw_data.get('description') or ''),
+            'poster_url': cover.get('extraLarge') or cover.get('large') or cover.get('medium') or '',
+            'trailer_url': (
+                f"https://www.youtube.com/watch?v={trailer['id']}"
+                if trailer.get('site') == 'youtube' and trailer.get('id') else ''
+            ),
+            'year': start.get('year'),
+            'status': self.STATUS_MAP.get(raw_data.get('status'), 'finished'),
+            'episodes': raw_data.get('episodes'),
+            'score': score / 10 if score else None,
+            'genres': [{'name': name} for name in raw_data.get('genres') or []],
+            'studios': [n['name'] for n in (raw_data.get('studios') or {}).get('nodes') or [] if n.get('name')],
+            'raw': raw_data,
+        }
+        if start.get('year') and start.get('month') and start.get('day'):
+            normalized['aired_from'] = f"{start['year']}-{start['month']:02d}-{start['day']:02d}"
+        return normalized
+
+    @staticmethod
+    def _clean_description(description: str) -> str:
+        # Даже с asHtml: false в описании остаются <br> и <i>
+        description = re.sub(r'<[^>]+>', ' ', description)
+        return re.sub(r'\s+', ' ', description).strip()
+
     def get_popular_anime(self, page: int = 1, limit: int = 50) -> List[Dict]:
         """Получение популярных аниме"""
         query_str = """
@@ -80,6 +168,34 @@ class AnilistParser(BaseAnimeParser):
         data = response.json()
         return data.get("data", {}).get("Page", {}).get("media", [])
 
+    def get_posters_batch(self, titles: List[str]) -> Dict[str, Optional[str]]:
+        """Постеры для многих названий: один запрос с алиасами на POSTER_BATCH_LIMIT поисков"""
+        posters = {}
+        titles = list(dict.fromkeys(t for t in titles if t))
+
+        for i in range(0, len(titles), self.POSTER_BATCH_LIMIT):
+            chunk = titles[i:i + self.POSTER_BATCH_LIMIT]
+            params = ', '.join(f'$t{n}: String' for n in range(len(chunk)))
+            fields = '\n'.join(
+                f't{n}: Page(page: 1, perPage: 1) {{ media(search: $t{n}, type: ANIME) '
+                f'{{ id coverImage {{ large medium }} }} }}'
+                for n in range(len(chunk))
+            )
+            query_str = f'query ({params}) {{\n{fields}\n}}'
+            variables = {f't{n}': title for n, title in enumerate(chunk)}
+
+            response = self.session.post(self.BASE_URL, json={"query": query_str, "variables": variables})
+            response.raise_for_status()
+            # При частичных ошибках AniList всё равно отдаёт data по остальным алиасам
+            data = response.json().get("data") or {}
+
+            for n, title in enumerate(chunk):
+                media = ((data.get(f't{n}') or {}).get("media") or [None])[0]
+                cover = (media or {}).get("coverImage") or {}
+                posters[title] = cover.get("large") or cover.get("medium")
+
+        return posters
+
     def get_poster_url(self, title: str) -> Optional[str]:
         """Получение постера по названию"""
         results = self.search_anime(title, limit=1)
@@ -0,0 +1,137 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import aiohttp
+
+from .rate_limit import get_limiter
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+_DONE = object()
+
+
+class AsyncFetchEngine:
+    """Асинхронный загрузчик JSON с ограничением запросов в полёте.
+
+    Event loop крутится в отдельном потоке, а результаты отдаются
+    синхронному коду через ограниченную очередь, поэтому работа с ORM
+    остаётся в вызывающем потоке. Все запросы идут через одну
+    aiohttp-сессию с keep-alive соединениями.
+    """
+
+    def __init__(self, concurrency: int = 100, timeout: float = 10,
+                 headers: Optional[Dict] = None, queue_size: Optional[int] = None,
+                 max_retries: int = 3,
+                 on_response: Optional[Callable[[int, Optional[float]], None]] = None):
+        self.concurrency = concurrency
+        # Вызывается на каждый HTTP-ответ: (статус, секунды); 0 - сетевая ошибка
+        self.on_response = on_response
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.queue_size = queue_size or concurrency * 2
+
+    def fetch_iter(self, requests_iter: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, int, Optional[Dict]]]:
+        """Загрузить пары (ключ, url) и выдавать (ключ, http-статус, json)
+
+        Итератор запросов читается лениво, так что сеть не простаивает
+        между батчами. Статус 0 означает сетевую ошибку или таймаут.
+        """
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        thread = threading.Thread(
+            target=self._run_loop,
+            args=(iter(requests_iter), results, stop),
+            daemon=True,
+        )
+        thread.start()
+
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    def _run_loop(self, requests_iter, results: queue.Queue, stop: threading.Event):
+        try:
+            asyncio.run(self._fetch_all(requests_iter, results, stop))
+        except BaseException as e:
+            self._put(results, stop, e)
+        self._put(results, stop, _DONE, force=True)
+
+    async def _fetch_all(self, requests_iter, results: queue.Queue, stop: threading.Event):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=self.headers) as session:
+            workers = [
+                asyncio.create_task(self._worker(session, requests_iter, results, stop))
+                for _ in range(self.concurrency)
+            ]
+            await asyncio.gather(*workers)
+
+    async def _worker(self, session, requests_iter, results: queue.Queue, stop: threading.Event):
+        # Все воркеры тянут из общего итератора: вызовы next() идут
+        # в одном потоке event loop, поэтому блокировка не нужна
+        while not stop.is_set():
+            try:
+                key, url = next(requests_iter)
+            except StopIteration:
+                return
+
+            status, data = await self._fetch(session, url)
+            await asyncio.to_thread(self._put, results, stop, (key, status, data))
+
+    async def _fetch(self, session, url: str) -> Tuple[int, Optional[Dict]]:
+        limiter = get_limiter(url)
+
+        for attempt in range(self.max_retries + 1):
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            started = time.monotonic()
+            try:
+                async with session.get(url) as response:
+                    limiter.observe(response.status, response.headers)
+                    if self.on_response:
+                        self.on_response(response.status, time.monotonic() - started)
+                    if response.status == 429 and attempt < self.max_retries:
+                        continue
+                    if response.status != 200:
+                        return response.status, None
+                    return response.status, await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                if self.on_response:
+                    self.on_response(0, None)
+                return 0, None
+
+        return 429, None
+
+    @staticmethod
+    def _put(results: queue.Queue, stop: threading.Event, item, force: bool = False):
+        # Ждём места в очереди, пока потребитель жив
+        while force or not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if force and stop.is_set():
+                    return
@@ -1,12 +1,13 @@
 import abc
-import requests
 from typing import Dict, List, Optional
+from .rate_limit import RateLimitedSession
+from .utils import first_title
 
 class BaseAnimeParser(abc.ABC):
     """Базовый класс для парсеров аниме"""
     
     def __init__(self):
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         self.session.headers.update({
             'User-Agent': 'AnimeCore Parser/1.0 (+https://animecore.app)'
         })
@@ -32,7 +33,7 @@ class BaseAnimeParser(abc.ABC):
         return {
             'id': raw_data.get('id'),
             'title_ru': raw_data.get('russian') or raw_data.get('name'),
-            'title_en': raw_data.get('english') or raw_data.get('name'),
+            'title_en': first_title(raw_data.get('english')) or raw_data.get('name'),
             'description': raw_data.get('description', ''),
             'year': None,
             'status': 'finished',
@@ -0,0 +1,454 @@
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Справочники для синтетических аниме (id жанров как на Shikimori)
+FAKE_GENRES = [
+    (1, 'Action', 'Экшен'), (2, 'Adventure', 'Приключения'), (4, 'Comedy', 'Комедия'),
+    (7, 'Mystery', 'Детектив'), (10, 'Fantasy', 'Фэнтези'), (22, 'Romance', 'Романтика'),
+    (24, 'Sci-Fi', 'Фантастика'), (27, 'Shounen', 'Сёнен'), (36, 'Slice of Life', 'Повседневность'),
+]
+FAKE_STUDIOS = ['Madhouse', 'Sunrise', 'Bones', 'MAPPA', 'Kyoto Animation', 'Production I.G']
+FAKE_STATUSES = ['released', 'released', 'released', 'ongoing', 'anons']
+
+
+def synthetic_anime(anime_id: int) -> Dict:
+    """Детерминированный ответ /api/animes/<id> в формате Shikimori"""
+    rnd = random.Random(anime_id)
+    genres = rnd.sample(FAKE_GENRES, 2)
+    year = 1970 + anime_id % 55
+    return {
+        'id': anime_id,
+        'name': f'Fake Anime {anime_id}',
+        'russian': f'Тестовое аниме {anime_id}',
+        'english': [f'Fake Anime {anime_id}'],
+        'japanese': [f'フェイク {anime_id}'],
+        'kind': 'tv',
+        'status': rnd.choice(FAKE_STATUSES),
+        'episodes': rnd.randint(1, 26),
+        'score': f'{rnd.uniform(5, 9.5):.2f}',
+        'aired_on': f'{year}-{rnd.randint(1, 12):02d}-01',
+        'description': ' '.join(['Описание тестового аниме.'] * rnd.randint(3, 30)),
+        'image': {
+            'original': f'/system/animes/original/{anime_id}.jpg',
+            'x96': f'/system/animes/x96/{anime_id}.jpg',
+        },
+        'genres': [{'id': gid, 'name': name, 'russian': ru, 'kind': 'genre'} for gid, name, ru in genres],
+        'studios': [{'id': 1, 'name': rnd.choice(FAKE_STUDIOS)}],
+        'screenshots': [{'original': f'/system/screenshots/original/{anime_id}-{i}.jpg'} for i in range(3)],
+        'videos': [{'url': f'https://youtu.be/fake{anime_id}', 'kind': 'pv'}],
+        'rates_statuses_stats': [
+            {'name': name, 'value': rnd.randint(0, 50000)}
+            for name in ('Запланировано', 'Просмотрено', 'Смотрю', 'Брошено', 'Отложено')
+        ],
+    }
+
+
+def load_fixtures(path: Path) -> Dict[int, Dict]:
+    """Записанные ответы /api/animes/<id>: JSON Lines, можно в .gz"""
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    fixtures = {}
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                payload = json.loads(line)
+                fixtures[int(payload['id'])] = payload
+    return fixtures
+
+
+class FakeUpstream:
+    """Данные и поведение поддельного Shikimori/AniList/Jikan.
+
+    Каталог - либо записанные фикстуры, либо синтетические аниме с ID
+    id_offset+1 .. id_offset+size, из которых доля missing_ratio
+    отвечает 404. Задержка, случайные 429, серверный лимит запросов в
+    секунду и «хвост» медленных ответов (slow_ratio запросов отвечают
+    через slow_ms) настраиваются, чтобы воспроизводить поведение апстрима.
+    """
+
+    SHIKIMORI_SITE = 'https://shikimori.one'
+
+    def __init__(self, size: int = 2000, id_offset: int = 0, missing_ratio: float = 0.3,
+                 latency_ms: float = 20, jitter_ms: float = 10, throttle_ratio: float = 0.0,
+                 max_rps: Optional[float] = None, fixtures: Optional[Dict[int, Dict]] = None,
+                 seed: int = 0, slow_ratio: float = 0.0, slow_ms: float = 1000):
+        self.latency_ms = latency_ms
+        self.slow_ratio = slow_ratio
+        self.slow_ms = slow_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_ratio = throttle_ratio
+        self.max_rps = max_rps
+        self._random = random.Random(seed)
+
+        if fixtures:
+            self.catalog = {
+                anime_id + id_offset: dict(payload, id=anime_id + id_offset)
+                for anime_id, payload in fixtures.items()
+            }
+            self.synthetic = False
+        else:
+            rnd = random.Random(seed)
+            ids = range(id_offset + 1, id_offset + size + 1)
+            self.catalog = {anime_id: None for anime_id in ids if rnd.random() >= missing_ratio}
+            self.synthetic = True
+        self.ids = sorted(self.catalog)
+
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+
+    def anime(self, anime_id: int) -> Optional[Dict]:
+        if anime_id not in self.catalog:
+            return None
+        payload = self.catalog[anime_id]
+        return payload if payload is not None else synthetic_anime(anime_id)
+
+    def count(self, key: str):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def should_throttle(self) -> bool:
+        """Отвечать ли 429: случайно или по превышению max_rps"""
+        with self._lock:
+            if self.throttle_ratio and self._random.random() < self.throttle_ratio:
+                return True
+            if not self.max_rps:
+                return False
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.max_rps
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            slow = self.slow_ratio and self._random.random() < self.slow_ratio
+        seconds = max((self.slow_ms if slow else self.latency_ms) + jitter, 0) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    # --- Shikimori REST ---
+
+    def listing(self, params: Dict[str, str]) -> List[Dict]:
+        """/api/animes: как и Shikimori, отдаёт limit + 1, если есть ещё страница"""
+        limit = min(int(params.get('limit', 50)), 50)
+        page = max(int(params.get('page', 1)), 1)
+
+        items = (self.anime(anime_id) for anime_id in self.ids)
+        if params.get('year'):
+            items = (a for a in items if (a.get('aired_on') or '').startswith(params['year']))
+        if params.get('genre'):
+            genre_ids = {int(g) for g in params['genre'].split(',') if g.isdigit()}
+            items = (a for a in items if genre_ids & {g.get('id') for g in a.get('genres') or []})
+        items = list(items)
+
+        if params.get('order') in ('popularity', 'ranked'):
+            items.sort(key=lambda a: -float(a.get('score') or 0))
+
+        start = (page - 1) * limit
+        return [self._short(a) for a in items[start:start + limit + 1]]
+
+    @staticmethod
+    def _short(anime: Dict) -> Dict:
+        keys = ('id', 'name', 'russian', 'image', 'kind', 'score', 'status', 'episodes', 'aired_on')
+        return {key: anime.get(key) for key in keys}
+
+    # --- Shikimori GraphQL ---
+
+    def graphql_animes(self, variables: Dict) -> Dict:
+        ids = [int(x) for x in str(variables.get('ids') or '').split(',') if x.strip().isdigit()]
+        nodes = [self._graphql_node(self.anime(anime_id)) for anime_id in ids if anime_id in self.catalog]
+        return {'data': {'animes': nodes[:int(variables.get('limit') or 50)]}}
+
+    def _graphql_node(self, anime: Dict) -> Dict:
+        image = anime.get('image') or {}
+        return {
+            'id': str(anime['id']),
+            'name': anime.get('name'),
+            'russian': anime.get('russian'),
+            'english': self._first(anime.get('english')),
+            'japanese': self._first(anime.get('japanese')),
+            'status': anime.get('status'),
+            'episodes': anime.get('episodes'),
+            'score': float(anime.get('score') or 0),
+            'description': anime.get('description'),
+            'airedOn': {'date': anime.get('aired_on')},
+            'poster': {
+                'originalUrl': self.SHIKIMORI_SITE + image['original'] if image.get('original') else None,
+                'mainUrl': self.SHIKIMORI_SITE + image['x96'] if image.get('x96') else None,
+            },
+            'genres': [{'name': g.get('name'), 'russian': g.get('russian')} for g in anime.get('genres') or []],
+            'studios': [{'name': s.get('name')} for s in anime.get('studios') or []],
+            'screenshots': [{'originalUrl': self.SHIKIMORI_SITE + s['original']}
+                            for s in anime.get('screenshots') or [] if s.get('original')],
+            'videos': [{'url': v.get('url')} for v in anime.get('videos') or []],
+            'statusesStats': [{'status': s['name'], 'count': s['value']}
+                              for s in anime.get('rates_statuses_stats') or []],
+        }
+
+    @staticmethod
+    def _first(value):
+        # REST отдаёт english/japanese списком, GraphQL - строкой
+        if isinstance(value, list):
+            return value[0] if value else None
+        return value
+
+    # --- AniList GraphQL ---
+
+    def anilist(self, query: str, variables: Dict) -> Dict:
+        """Ответ AniList: поиск по названию, пачка поисков с алиасами, Media(id) или популярные"""
+        aliases = {key: value for key, value in variables.items() if re.match(r'^t\d+$', key)}
+        if aliases:
+            return {'data': {key: {'media': [self._anilist_media(str(value))]} for key, value in aliases.items()}}
+        if 'search' in variables:
+            return {'data': {'Page': {'media': [self._anilist_media(variables['search'])]}}}
+        if 'id' in variables:
+            return {'data': {'Media': self._anilist_media(str(variables['id']))}}
+        return {'data': {'Page': {'media': [self._anilist_media(str(i)) for i in range(int(variables.get('limit') or 10))]}}}
+
+    def anilist_by_mal(self, mal_id: int) -> Optional[Dict]:
+        """Media(idMal) в формате AniList; None - на AniList такого нет"""
+        anime = self.anime(mal_id)
+        if anime is None:
+            return None
+        media = self._anilist_media(anime['name'])
+        year, month, _ = (anime.get('aired_on') or '--').split('-')
+        media.update({
+            'idMal': anime['id'],
+            'title': {'romaji': anime['name'], 'english': self._first(anime.get('english')),
+                      'native': self._first(anime.get('japanese'))},
+            'description': f"<i>AniList:</i> {anime.get('description') or ''}<br>",
+            'status': {'released': 'FINISHED', 'ongoing': 'RELEASING', 'anons': 'NOT_YET_RELEASED'}.get(
+                anime.get('status'), 'FINISHED'),
+            'episodes': anime.get('episodes'),
+            'averageScore': int(float(anime.get('score') or 0) * 10),
+            'startDate': {'year': int(year) if year else None, 'month': int(month) if month else None, 'day': 1},
+            'genres': [g.get('name') for g in anime.get('genres') or []],
+            'studios': {'nodes': [{'name': s.get('name')} for s in anime.get('studios') or []]},
+            'trailer': {'id': f'fake{anime["id"]}', 'site': 'youtube'},
+        })
+        return media
+
+    @staticmethod
+    def _anilist_media(key: str) -> Dict:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+        cover = f'https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/fake-{digest}.jpg'
+        return {
+            'id': int(digest[:6], 16),
+            'title': {'romaji': key, 'english': key},
+            'coverImage': {'large': cover, 'medium': cover.replace('/large/', '/medium/')},
+        }
+
+
+    # --- Jikan REST ---
+
+    def jikan_anime(self, mal_id: int) -> Optional[Dict]:
+        """/v4/anime/<id>/full в формате Jikan"""
+        anime = self.anime(mal_id)
+        if anime is None:
+            return None
+        aired_on = anime.get('aired_on')
+        return {
+            'mal_id': anime['id'],
+            'title': anime['name'],
+            'title_english': self._first(anime.get('english')),
+            'title_japanese': self._first(anime.get('japanese')),
+            'synopsis': f"{anime.get('description') or ''} [Written by MAL Rewrite]",
+            'status': {'released': 'Finished Airing', 'ongoing': 'Currently Airing',
+                       'anons': 'Not yet aired'}.get(anime.get('status'), 'Finished Airing'),
+            'episodes': anime.get('episodes'),
+            'score': float(anime.get('score') or 0),
+            'year': int(aired_on[:4]) if aired_on else None,
+            'aired': {'from': f'{aired_on}T00:00:00+00:00' if aired_on else None},
+            'images': {'jpg': {'image_url': f'https://cdn.myanimelist.net/images/anime/{anime["id"]}.jpg',
+                               'large_image_url': f'https://cdn.myanimelist.net/images/anime/{anime["id"]}l.jpg'}},
+            'trailer': {'url': f'https://www.youtube.com/watch?v=fake{anime["id"]}'},
+            'genres': [{'name': g.get('name')} for g in anime.get('genres') or []],
+            'studios': [{'name': s.get('name')} for s in anime.get('studios') or []],
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    upstream: FakeUpstream = None
+    protocol_version = 'HTTP/1.1'
+
+    ANIME_PATH = re.compile(r'^/api/animes/(\d+)/?$')
+    JIKAN_PATH = re.compile(r'^/jikan/v4/anime/(\d+)/full/?$')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        if self._throttled():
+            return
+
+        match = self.ANIME_PATH.match(parts.path)
+        if match:
+            anime = self.upstream.anime(int(match.group(1)))
+            if anime is None:
+                return self._send(404, {'message': 'Страница не найдена', 'code': 404})
+
+            etag = '"%s"' % hashlib.sha1(json.dumps(anime, sort_keys=True).encode('utf-8')).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(304, None, {'ETag': etag})
+            return self._send(200, anime, {'ETag': etag})
+
+        match = self.JIKAN_PATH.match(parts.path)
+        if match:
+            anime = self.upstream.jikan_anime(int(match.group(1)))
+            if anime is None:
+                return self._send(404, {'status': 404, 'type': 'BadResponseException',
+                                        'message': 'Resource does not exist'})
+            return self._send(200, {'data': anime})
+
+        if parts.path.rstrip('/') == '/api/animes':
+            return self._send(200, self.upstream.listing(params))
+
+        self._send(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send(400, {'errors': [{'message': 'Invalid JSON'}]})
+
+        if self._throttled():
+            return
+
+        path = urlsplit(self.path).path.rstrip('/')
+        variables = body.get('variables') or {}
+        if path == '/api/graphql':
+            return self._send(200, self.upstream.graphql_animes(variables))
+        if path == '/anilist' and 'idMal' in variables:
+            media = self.upstream.anilist_by_mal(int(variables['idMal']))
+            if media is None:
+                return self._send(404, {'data': {'Media': None},
+                                        'errors': [{'message': 'Not Found.', 'status': 404}]})
+            return self._send(200, {'data': {'Media': media}})
+        if path == '/anilist':
+            return self._send(200, self.upstream.anilist(body.get('query') or '', variables))
+
+        self._send(404, {'message': 'Not found'})
+
+    def _throttled(self) -> bool:
+        self.upstream.delay()
+        if self.upstream.should_throttle():
+            self._send(429, {'message': 'Too Many Requests'}, {'Retry-After': '1'})
+            return True
+        return False
+
+    def _send(self, status: int, payload, headers: Optional[Dict] = None):
+        self.upstream.count(str(status))
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиенты закрывают keep-alive соединения как хотят - это не ошибка стенда
+        pass
+
+
+class FakeUpstreamServer:
+    """HTTP-сервер с FakeUpstream в фоновом потоке
+
+    Shikimori отвечает на <url>, AniList - на <url>/anilist, Jikan - на <url>/jikan/v4.
+    """
+
+    def __init__(self, upstream: FakeUpstream, host: str = '127.0.0.1', port: int = 0):
+        handler = type('FakeUpstreamHandler', (_Handler,), {'upstream': upstream})
+        self.upstream = upstream
+        self.httpd = _Server((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def anilist_url(self) -> str:
+        return f'{self.url}/anilist'
+
+    @property
+    def jikan_url(self) -> str:
+        return f'{self.url}/jikan/v4'
+
+    def start(self) -> 'FakeUpstreamServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def add_upstream_arguments(parser):
+    """Общие параметры стенда для команд fake_upstream и benchmark_import"""
+    parser.add_argument('--size', type=int, default=2000,
+                        help='Размер пространства синтетических ID')
+    parser.add_argument('--missing', type=float, default=0.3,
+                        help='Доля ID, отвечающих 404')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='Задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=10,
+                        help='Разброс задержки, мс')
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help='Доля запросов, получающих 429')
+    parser.add_argument('--max-rps', type=float, default=None,
+                        help='Серверный лимит запросов в секунду (сверх него - 429)')
+    parser.add_argument('--fixtures', type=str, default=None,
+                        help='JSON Lines (.jsonl или .jsonl.gz) с записанными ответами /api/animes/<id>')
+    parser.add_argument('--slow', type=float, default=0.0,
+                        help='Доля медленных ответов (хвост задержек)')
+    parser.add_argument('--slow-ms', type=float, default=1000,
+                        help='Задержка медленного ответа, мс')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def upstream_from_options(options: Dict, id_offset: int = 0) -> FakeUpstream:
+    fixtures = load_fixtures(options['fixtures']) if options.get('fixtures') else None
+    return FakeUpstream(
+        size=options['size'],
+        id_offset=id_offset,
+        missing_ratio=options['missing'],
+        latency_ms=options['latency'],
+        jitter_ms=options['jitter'],
+        throttle_ratio=options['throttle'],
+        max_rps=options['max_rps'],
+        fixtures=fixtures,
+        seed=options['seed'],
+        slow_ratio=options['slow'],
+        slow_ms=options['slow_ms'],
+    )
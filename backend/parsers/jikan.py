@@ -0,0 +1,83 @@
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from .base import BaseAnimeParser
+
+
+class JikanParser(BaseAnimeParser):
+    """Парсер Jikan (неофициальный REST API MyAnimeList)
+
+    ID в Jikan - это MAL ID, а у Shikimori они совпадают с MAL, так что
+    аниме запрашивается по тому же shikimori_id.
+    """
+
+    BASE_URL = "https://api.jikan.moe/v4"
+
+    STATUS_MAP = {
+        'Finished Airing': 'finished',
+        'Currently Airing': 'ongoing',
+        'Not yet aired': 'announced',
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.BASE_URL = getattr(settings, 'JIKAN_URL', self.BASE_URL).rstrip('/')
+
+    def search_anime(self, query: str, limit: int = 20) -> List[Dict]:
+        """Поиск аниме по названию"""
+        response = self.session.get(f"{self.BASE_URL}/anime", params={'q': query, 'limit': limit}, timeout=10)
+        response.raise_for_status()
+        return response.json().get('data') or []
+
+    def get_anime_by_id(self, mal_id: int) -> Optional[Dict]:
+        """Полная карточка аниме по MAL ID; None, если такого нет"""
+        response = self.session.get(f"{self.BASE_URL}/anime/{mal_id}/full", timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get('data')
+
+    def get_popular_anime(self, page: int = 1, limit: int = 50) -> List[Dict]:
+        """Топ аниме по популярности"""
+        response = self.session.get(
+            f"{self.BASE_URL}/top/anime",
+            params={'page': page, 'limit': min(limit, 25), 'filter': 'bypopularity'},
+            timeout=10,
+        )
+        response.raise_for_status()
+        return response.json().get('data') or []
+
+    def normalize_anime_data(self, raw_data: Dict) -> Dict:
+        """Нормализация в формат ShikimoriParser.normalize_anime_data (без русских полей)"""
+        images = (raw_data.get('images') or {}).get('jpg') or {}
+        aired_from = ((raw_data.get('aired') or {}).get('from') or '')[:10] or None
+        year = raw_data.get('year') or (int(aired_from[:4]) if aired_from else None)
+
+        normalized = {
+            'id': raw_data.get('mal_id'),
+            'mal_id': raw_data.get('mal_id'),
+            'title_ru': None,
+            'title_en': raw_data.get('title_english') or raw_data.get('title'),
+            'title_jp': raw_data.get('title_japanese'),
+            'description': self._clean_description(raw_data.get('synopsis') or ''),
+            'poster_url': images.get('large_image_url') or images.get('image_url') or '',
+            'trailer_url': (raw_data.get('trailer') or {}).get('url') or '',
+            'year': year,
+            'status': self.STATUS_MAP.get(raw_data.get('status'), 'finished'),
+            'episodes': raw_data.get('episodes'),
+            'score': raw_data.get('score'),
+            'genres': [{'name': g['name']} for g in raw_data.get('genres') or [] if g.get('name')],
+            'studios': [s['name'] for s in raw_data.get('studios') or [] if s.get('name')],
+            'raw': raw_data,
+        }
+        if aired_from:
+            normalized['aired_from'] = aired_from
+        return normalized
+
+    @staticmethod
+    def _clean_description(description: str) -> str:
+        # Jikan дописывает в конец «[Written by MAL Rewrite]»
+        description = re.sub(r'\[Written by [^\]]*\]', '', description)
+        return re.sub(r'\s+', ' ', description).strip()
@@ -1,29 +1,106 @@
+import threading
 import time
-import requests
 import random
 from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from .base import BaseAnimeParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from .anilist import AnilistParser
+from .jikan import JikanParser
+from .rate_limit import RateLimitedSession, on_slot_granted
 from .shikimori import ShikimoriParser
 
+# Порядок источников по умолчанию: первое непустое значение поля побеждает
+DEFAULT_PRIORITY = ['shikimori', 'anilist', 'jikan']
+
+# Как часто проверять, выдал ли лимитер слот запросу, ждущему в очереди
+SLOT_POLL = 0.05
+
+# Поля, для которых порядок другой
+FIELD_PRIORITY = {
+    'title_ru': ['shikimori'],
+    # Названия жанров у AniList и Jikan английские, в каталоге - с Shikimori
+    'genres': ['shikimori'],
+    'screenshots': ['shikimori'],
+    'score': ['shikimori', 'jikan', 'anilist'],
+    # У AniList и Jikan своя аудитория и другой масштаб - не смешиваем
+    'popularity': ['shikimori'],
+    'trailer_url': ['jikan', 'anilist', 'shikimori'],
+    'mal_id': ['jikan', 'anilist'],
+    'anilist_id': ['anilist'],
+}
+
+
+class SourceHealth:
+    """Состояние источника: сглаженная задержка и подряд идущие ошибки
+
+    После max_failures ошибок подряд источник пропускается cooldown секунд.
+    """
+
+    def __init__(self, max_failures: int = 3, cooldown: float = 30.0):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.latency = None
+        self.failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def observe(self, seconds: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+            else:
+                self.failures += 1
+                if self.failures >= self.max_failures:
+                    self.open_until = time.monotonic() + self.cooldown
+
+
 class MultiSourceParser:
-    """Парсер из нескольких источников"""
+    """Парсер из нескольких источников
+
+    Shikimori, AniList и Jikan адресуются одним ID (shikimori_id = MAL ID).
+    В режиме fan-out источники опрашиваются параллельно; если источник
+    не ответил за hedge_after секунд, к нему уходит дублирующий запрос
+    и берётся первый из ответов. Отсчёт идёт с момента, когда лимитер
+    хоста выдал запросу слот: ожидание в очереди лимитера дублем не
+    лечится, дубль встанет в ту же очередь. После первого полезного ответа
+    остальных ждём не больше grace секунд, так что задержка на аниме
+    определяется самым быстрым здоровым источником. Поля сливаются по
+    FIELD_PRIORITY.
+    """
     
-    def __init__(self, max_workers=10):
+    def __init__(self, max_workers=10, hedge_after: float = 0.8, grace: float = 0.3,
+                 timeout: float = 10.0, sources: Optional[Dict] = None):
         self.max_workers = max_workers
-        self.sources = {
+        self.hedge_after = hedge_after
+        self.grace = grace
+        self.timeout = timeout
+        self.sources = sources or {
             'shikimori': ShikimoriParser(),
-            'anilist': AniListParser(),
+            'anilist': AnilistParser(),
             'jikan': JikanParser(),
         }
+        self.health = {name: SourceHealth() for name in self.sources}
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_won': 0, 'errors': 0, 'late': 0}
+        self._stats_lock = threading.Lock()
+        # Общий пул запросов к источникам; опоздавшие дубли дорабатывают в нём же
+        self._executor = ThreadPoolExecutor(max_workers=max_workers * len(self.sources) * 2)
     
-    def fetch_anime_batch(self, anime_ids: List[int]) -> List[Dict]:
-        """Пакетная загрузка аниме"""
+    def fetch_anime_batch(self, anime_ids: List[int], fan_out: bool = False,
+                          errors: Optional[Dict[int, Exception]] = None) -> List[Dict]:
+        """Пакетная загрузка аниме (fan_out - со всех источников сразу)
+
+        ID, которые не удалось загрузить, попадают в errors вместе с
+        исключением: их нельзя путать с аниме, которого нет.
+        """
         results = []
+        fetch = self.fetch_merged if fan_out else self._fetch_single_anime
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_id = {
-                executor.submit(self._fetch_single_anime, anime_id): anime_id 
+                executor.submit(fetch, anime_id): anime_id 
                 for anime_id in anime_ids
             }
             
@@ -35,26 +112,165 @@ class MultiSourceParser:
                         results.append(data)
                 except Exception as e:
                     print(f"Ошибка ID {anime_id}: {e}")
+                    if errors is not None:
+                        errors[anime_id] = e
         
         return results
     
     def _fetch_single_anime(self, anime_id: int, source: str = 'shikimori') -> Optional[Dict]:
-        """Загрузка одного аниме с повторами"""
+        """Загрузка одного аниме из одного источника
+
+        Повторы на 429 делает RateLimitedSession, медленные ответы
+        перекрываются дублями в fetch_merged, так что без своих пауз.
+        """
         parser = self.sources.get(source)
         if not parser:
             return None
-        
-        for attempt in range(3):
-            try:
-                data = parser.get_anime_by_id(anime_id)
-                if data:
-                    return parser.normalize_anime_data(data)
-            except Exception as e:
-                if attempt == 2:
-                    print(f"Не удалось получить ID {anime_id}: {e}")
-                time.sleep(2 ** attempt)  # Экспоненциальная задержка
-        
-        return None
+
+        data = self._fetch_raw(source, anime_id)
+        return parser.normalize_anime_data(data) if data else None
+
+    def fetch_merged(self, anime_id: int, sources: Optional[List[str]] = None) -> Optional[Dict]:
+        """Опросить источники параллельно и слить ответы
+
+        None - все источники ответили, что аниме нет. Если ничего не нашлось,
+        но какой-то источник упал или не успел, - RuntimeError: отсутствие
+        аниме не доказано.
+        """
+        names = [
+            name for name in (sources or self.sources)
+            if name in self.sources and self.health[name].available()
+        ]
+        started = time.monotonic()
+        deadline = started + self.timeout
+        pending = {}
+        # Время отправки запроса апстриму; пишут потоки пула
+        sent_at: Dict[str, float] = {}
+        for name in names:
+            pending[self._executor.submit(self._fetch_raw, name, anime_id, sent_at)] = (name, False)
+
+        results: Dict[str, Optional[Dict]] = {}
+        failed = set()
+        hedged = set()
+        first_useful = None
+
+        while pending:
+            now = time.monotonic()
+            waiting = {name for name, _ in pending.values() if name not in results}
+            if not waiting:
+                break
+
+            wake_at = deadline
+            for name in waiting - hedged:
+                if name in sent_at:
+                    wake_at = min(wake_at, sent_at[name] + self.hedge_after)
+                else:
+                    # Запрос ещё ждёт слот у лимитера
+                    wake_at = min(wake_at, now + SLOT_POLL)
+            if first_useful is not None:
+                wake_at = min(wake_at, first_useful + self.grace)
+            if now >= deadline or (first_useful is not None and now >= first_useful + self.grace):
+                with self._stats_lock:
+                    self.stats['late'] += len(waiting)
+                break
+
+            done, _ = wait(pending, timeout=max(wake_at - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, is_hedge = pending.pop(future)
+                if name in results:
+                    continue
+                try:
+                    data = future.result()
+                except Exception:
+                    # Ошибка одного из дублей: ждём второй, если он ещё в полёте
+                    if not any(n == name for n, _ in pending.values()):
+                        results[name] = None
+                        failed.add(name)
+                    continue
+
+                results[name] = data
+                if is_hedge:
+                    with self._stats_lock:
+                        self.stats['hedge_won'] += 1
+                if data and first_useful is None:
+                    first_useful = time.monotonic()
+
+            # Медленным источникам - дублирующий запрос
+            now = time.monotonic()
+            for name in waiting - hedged - set(results):
+                if name in sent_at and now - sent_at[name] >= self.hedge_after:
+                    hedged.add(name)
+                    pending[self._executor.submit(self._fetch_raw, name, anime_id)] = (name, True)
+                    with self._stats_lock:
+                        self.stats['hedged'] += 1
+
+        normalized = {
+            name: self.sources[name].normalize_anime_data(data)
+            for name, data in results.items() if data
+        }
+        if not normalized:
+            unanswered = failed | (set(names) - set(results))
+            if unanswered or not names:
+                raise RuntimeError(f"Нет ответа от источников: {', '.join(sorted(unanswered)) or 'все отключены'}")
+            return None
+        return self.merge(anime_id, normalized)
+
+    def _fetch_raw(self, source: str, anime_id: int,
+                   sent_at: Optional[Dict[str, float]] = None) -> Optional[Dict]:
+        """Сырой ответ источника с учётом здоровья; исключение - ошибка запроса
+
+        В sent_at[source] записывается момент отправки: выдачи слота
+        лимитером или, если источник ходит без лимитера, начала запроса.
+        """
+        parser = self.sources[source]
+        started = time.monotonic()
+        with self._stats_lock:
+            self.stats['requests'] += 1
+        if sent_at is None:
+            sent_at = {}
+        if not isinstance(getattr(parser, 'session', None), RateLimitedSession):
+            sent_at.setdefault(source, started)
+        try:
+            with on_slot_granted(lambda: sent_at.setdefault(source, time.monotonic())):
+                if source == 'anilist':
+                    data = parser.get_anime_by_mal_id(anime_id)
+                elif source == 'shikimori':
+                    # В отличие от get_anime_by_id, ошибку не глотает: 404 и сбой различимы
+                    data = parser.get_anime_chunk([anime_id])
+                    data = data[0] if data else None
+                else:
+                    data = parser.get_anime_by_id(anime_id)
+        except Exception:
+            self.health[source].observe(time.monotonic() - started, ok=False)
+            with self._stats_lock:
+                self.stats['errors'] += 1
+            raise
+        self.health[source].observe(time.monotonic() - started, ok=True)
+        return data
+
+    @staticmethod
+    def merge(anime_id: int, normalized: Dict[str, Dict]) -> Dict:
+        """Слить нормализованные записи источников по FIELD_PRIORITY"""
+        fields = set()
+        for record in normalized.values():
+            fields.update(record)
+        fields -= {'id', 'raw'}
+
+        merged = {'id': anime_id, 'sources': sorted(normalized)}
+        for field in fields:
+            for name in FIELD_PRIORITY.get(field, DEFAULT_PRIORITY):
+                value = normalized.get(name, {}).get(field)
+                # Заглушка Shikimori вместо постера - не значение
+                if field == 'poster_url' and value and '/missing_' in value:
+                    continue
+                if value not in (None, '', [], {}):
+                    merged[field] = value
+                    break
+
+        # Без Shikimori title_ru и жанров в записи нет: английские значения
+        # не должны затереть русские, сохранённые раньше
+        merged.setdefault('poster_url', '')
+        return merged
     
     def generate_id_ranges(self, total: int = 100000) -> List[tuple]:
         """Генерация диапазонов ID для сбора"""
@@ -78,8 +294,19 @@ class MultiSourceParser:
         
         return ranges
     
-    def get_random_ids_from_range(self, start: int, end: int, count: int) -> List[int]:
-        """Генерация случайных ID из диапазона"""
+    def get_random_ids_from_range(self, start: int, end: int, count: int,
+                                  known_ids: Optional[List[int]] = None) -> List[int]:
+        """Генерация случайных ID из диапазона
+
+        Если известен список существующих ID (см. ShikimoriParser.iter_anime_ids),
+        выборка делается только из них, а не угадыванием.
+        """
+        if known_ids is not None:
+            in_range = [aid for aid in known_ids if start <= aid <= end]
+            if count >= len(in_range):
+                return in_range
+            return sorted(random.sample(in_range, count))
+
         total_ids = end - start + 1
         if count > total_ids:
             count = total_ids
@@ -96,26 +323,3 @@ class MultiSourceParser:
             ids = random.sample(range(start, end + 1), count)
         
         return ids
-
-# Создадим заглушки для других парсеров
-class AniListParser(BaseAnimeParser):
-    def search_anime(self, query: str, limit: int = 20) -> List[Dict]:
-        return []
-    
-    def get_anime_by_id(self, external_id: int) -> Optional[Dict]:
-        # TODO: Реализовать AniList API
-        return None
-    
-    def get_popular_anime(self, page: int = 1, limit: int = 50) -> List[Dict]:
-        return []
-
-class JikanParser(BaseAnimeParser):
-    def search_anime(self, query: str, limit: int = 20) -> List[Dict]:
-        return []
-    
-    def get_anime_by_id(self, external_id: int) -> Optional[Dict]:
-        # TODO: Реализовать Jikan API
-        return None
-    
-    def get_popular_anime(self, page: int = 1, limit: int = 50) -> List[Dict]:
-        return []
\ No newline at end of file
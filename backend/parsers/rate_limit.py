@@ -0,0 +1,215 @@
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+# Известные лимиты апстримов (запросов в секунду, размер пачки, окно лимита в заголовках).
+# Скорость - 90% от поминутного лимита, он строже секундного: Shikimori 5 rps и
+# 90 rpm, AniList 90 rpm, Jikan 3 rps и 60 rpm. Секундный лимит держит burst.
+HOST_LIMITS = {
+    'shikimori.one': {'rate': 1.35, 'burst': 5, 'window': 60},
+    'graphql.anilist.co': {'rate': 1.35, 'burst': 3, 'window': 60},
+    'api.jikan.moe': {'rate': 0.9, 'burst': 3, 'window': 60},
+}
+# Опубликованные поминутные лимиты, по ним заданы скорости выше
+HOST_MINUTE_LIMITS = {'shikimori.one': 90, 'graphql.anilist.co': 90, 'api.jikan.moe': 60}
+DEFAULT_LIMIT = {'rate': 5.0, 'burst': 5, 'window': 60}
+
+# Доля от порога бана, на которой держим скорость
+SAFETY_FACTOR = 0.9
+
+
+class TokenBucketLimiter:
+    """Адаптивный token bucket для одного апстрим-хоста.
+
+    Потокобезопасен: reserve() выдаёт каждому вызывающему свой слот,
+    а observe() подстраивает скорость по статусу ответа, Retry-After
+    и заголовкам X-RateLimit-* / RateLimit-*.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, window: float = 60, min_rate: float = 0.1):
+        self.rate = rate
+        self.max_rate = rate
+        self.ceiling = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.window = window
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Занять слот и вернуть, сколько секунд нужно подождать"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            # Долг по токенам отсчитывается от конца блокировки: ждущие Retry-After
+            # просыпаются не разом, а с шагом 1 / rate
+            debt = -self.tokens if self.tokens < 0 else 0.0
+            return max(self.blocked_until - now, 0.0) + debt / self.rate
+
+    def acquire(self):
+        """Блокирующее ожидание слота"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def observe(self, status: int, headers: Optional[Mapping] = None):
+        """Учесть ответ апстрима"""
+        headers = headers or {}
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            self._apply_limit_headers(now, headers)
+
+            retry_after = self._parse_retry_after(headers.get('Retry-After'))
+            if status == 429:
+                # Порог найден: опускаем потолок чуть ниже текущей скорости
+                self.ceiling = max(self.min_rate, self.rate * SAFETY_FACTOR)
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                self.blocked_until = max(self.blocked_until, now + (retry_after or self.window / 10))
+            elif retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            elif 200 <= status < 400:
+                # Аддитивный рост до потолка, потолок медленно тянется к максимуму
+                self.ceiling = min(self.max_rate, self.ceiling + self.max_rate * 0.001)
+                self.rate = min(self.ceiling, self.rate + self.ceiling * 0.02)
+
+    def _refill(self, now: float):
+        # Во время блокировки токены не копятся
+        start = max(self._updated, self.blocked_until)
+        self._updated = now
+        if now <= start:
+            return
+        self.tokens = min(float(self.burst), self.tokens + (now - start) * self.rate)
+
+    def _apply_limit_headers(self, now: float, headers: Mapping):
+        limit = self._header_number(headers, 'X-RateLimit-Limit', 'RateLimit-Limit')
+        remaining = self._header_number(headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        reset = self._header_number(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+
+        if limit:
+            self.max_rate = max(self.min_rate, limit / self.window * SAFETY_FACTOR)
+            self.ceiling = min(self.ceiling, self.max_rate)
+            self.rate = min(self.rate, self.max_rate)
+
+        if remaining is None or reset is None:
+            return
+
+        # Reset бывает unix-временем или числом секунд до сброса окна
+        seconds_left = reset - time.time() if reset > 1e9 else reset
+        seconds_left = max(seconds_left, 0.0)
+
+        if remaining <= 0:
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, now + seconds_left)
+        elif seconds_left > 0:
+            # Растягиваем остаток квоты на оставшееся окно
+            self.rate = max(self.min_rate, min(self.rate, remaining / seconds_left * SAFETY_FACTOR))
+
+    @staticmethod
+    def _header_number(headers: Mapping, *names) -> Optional[float]:
+        for name in names:
+            value = headers.get(name)
+            if value is None:
+                continue
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+        return None
+
+    @staticmethod
+    def _parse_retry_after(value) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+_limiters: Dict[str, TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _host(host_or_url: str) -> str:
+    host = urlsplit(host_or_url).hostname if '//' in host_or_url else host_or_url
+    return host or host_or_url
+
+
+def get_limiter(host_or_url: str) -> TokenBucketLimiter:
+    """Общий лимитер для хоста (один на процесс)"""
+    host = _host(host_or_url)
+
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = TokenBucketLimiter(**HOST_LIMITS.get(host, DEFAULT_LIMIT))
+            _limiters[host] = limiter
+        return limiter
+
+
+def configure_limiter(host_or_url: str, rate: float, burst: int = 1, window: float = 60) -> TokenBucketLimiter:
+    """Задать лимит хоста вместо значения из HOST_LIMITS (для локальных стендов)"""
+    limiter = TokenBucketLimiter(rate=rate, burst=burst, window=window)
+    with _limiters_lock:
+        _limiters[_host(host_or_url)] = limiter
+    return limiter
+
+
+_granted = threading.local()
+
+
+@contextmanager
+def on_slot_granted(callback: Callable[[], None]):
+    """Вызывать callback, когда лимитер выдал слот запросу из этого потока
+
+    Время в очереди лимитера - не задержка апстрима: по нему, например,
+    нельзя решать, что источник тормозит.
+    """
+    previous = getattr(_granted, 'callback', None)
+    _granted.callback = callback
+    try:
+        yield
+    finally:
+        _granted.callback = previous
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session, который ходит к хостам через общие лимитеры
+
+    На 429 запрос повторяется после паузы, выставленной лимитером.
+    """
+
+    def __init__(self, max_retries: int = 3):
+        super().__init__()
+        self.max_retries = max_retries
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = get_limiter(url)
+
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            callback = getattr(_granted, 'callback', None)
+            if callback is not None:
+                callback()
+            response = super().request(method, url, *args, **kwargs)
+            limiter.observe(response.status_code, response.headers)
+
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+        return response
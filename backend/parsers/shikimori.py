@@ -1,14 +1,55 @@
 import time
 import requests
 import re
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
+from django.conf import settings
 from .base import BaseAnimeParser
-from .anilist import AnilistParser
+from .utils import first_title, list_popularity
 
 class ShikimoriParser(BaseAnimeParser):
     """Улучшенный парсер Shikimori"""
     
     BASE_URL = "https://shikimori.one/api"
+    SITE_URL = "https://shikimori.one"
+    GRAPHQL_URL = "https://shikimori.one/api/graphql"
+    GRAPHQL_BATCH_LIMIT = 50
+    # GraphQL-ответ, переложенный в формат REST, беднее настоящего и без ETag:
+    # в кеше он лежит отдельно и не затирает ответ REST
+    GRAPHQL_CACHE_SOURCE = 'shikimori_graphql'
+
+    def __init__(self, payload_cache=None):
+        super().__init__()
+        # RawPayloadCache: сырые ответы сохраняются, повторные запросы идут с If-None-Match
+        self.payload_cache = payload_cache
+        # Адрес API можно подменить (например, на fake_upstream для бенчмарков);
+        # SITE_URL остаётся настоящим, от него строятся ссылки на постеры
+        base_url = getattr(settings, 'SHIKIMORI_URL', self.SITE_URL).rstrip('/')
+        self.BASE_URL = f"{base_url}/api"
+        self.GRAPHQL_URL = f"{base_url}/api/graphql"
+
+    # Только поля, которые использует normalize_anime_data
+    GRAPHQL_ANIMES_QUERY = """
+    query ($ids: String, $limit: PositiveInt) {
+      animes(ids: $ids, limit: $limit, censored: false) {
+        id
+        name
+        russian
+        english
+        japanese
+        status
+        episodes
+        score
+        description
+        airedOn { date }
+        poster { originalUrl mainUrl }
+        genres { name russian }
+        studios { name }
+        screenshots { originalUrl }
+        videos { url }
+        statusesStats { status count }
+      }
+    }
+    """
     
     def search_anime(self, query: str, limit: int = 20) -> List[Dict]:
         """Поиск аниме по названию"""
@@ -26,13 +67,137 @@ class ShikimoriParser(BaseAnimeParser):
         """Получение аниме по ID"""
         try:
             url = f"{self.BASE_URL}/animes/{shikimori_id}"
-            response = self.session.get(url, timeout=10)
+            headers = {}
+            etag = self.payload_cache.etag('shikimori', shikimori_id) if self.payload_cache else None
+            if etag:
+                headers['If-None-Match'] = etag
+
+            response = self.session.get(url, headers=headers, timeout=10)
+            if response.status_code == 304:
+                self.payload_cache.touch('shikimori', shikimori_id)
+                return self.payload_cache.get('shikimori', shikimori_id)
+
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            if self.payload_cache:
+                self.payload_cache.put('shikimori', shikimori_id, data, etag=response.headers.get('ETag'))
+            return data
         except Exception as e:
             print(f"Ошибка получения аниме {shikimori_id}: {e}")
             return None
     
+    def get_anime_batch(self, shikimori_ids: List[int]) -> List[Dict]:
+        """Пакетное получение аниме через GraphQL (до 50 за запрос)
+
+        Возвращает данные в том же виде, что и REST /animes/<id>, так что
+        их можно сразу отдавать в normalize_anime_data. Несуществующие ID
+        просто отсутствуют в результате.
+        """
+        results = []
+
+        for i in range(0, len(shikimori_ids), self.GRAPHQL_BATCH_LIMIT):
+            chunk = shikimori_ids[i:i + self.GRAPHQL_BATCH_LIMIT]
+            try:
+                results.extend(self.get_anime_chunk(chunk))
+            except Exception as e:
+                print(f"Ошибка пакетного получения {chunk[0]}-{chunk[-1]}: {e}")
+
+        return results
+
+    def get_anime_chunk(self, shikimori_ids: List[int]) -> List[Dict]:
+        """Один GraphQL-запрос на не больше чем GRAPHQL_BATCH_LIMIT ID
+
+        В отличие от get_anime_batch ошибки не глотаются: по пустому
+        результату без исключения можно судить, что ID не существуют.
+        """
+        response = self.session.post(
+            self.GRAPHQL_URL,
+            json={
+                'query': self.GRAPHQL_ANIMES_QUERY,
+                'variables': {'ids': ','.join(str(x) for x in shikimori_ids), 'limit': len(shikimori_ids)},
+            },
+            timeout=30
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('errors'):
+            raise ValueError(payload['errors'][0].get('message'))
+
+        nodes = (payload.get('data') or {}).get('animes') or []
+        items = [self._graphql_to_rest(node) for node in nodes]
+        if self.payload_cache:
+            for item in items:
+                self.payload_cache.put(self.GRAPHQL_CACHE_SOURCE, item['id'], item)
+        return items
+
+    def _graphql_to_rest(self, node: Dict) -> Dict:
+        """Привести аниме из GraphQL к формату REST API"""
+        poster = node.get('poster') or {}
+        aired_on = (node.get('airedOn') or {}).get('date')
+
+        return {
+            'id': int(node['id']),
+            'name': node.get('name'),
+            'russian': node.get('russian'),
+            'english': node.get('english'),
+            'japanese': node.get('japanese'),
+            'status': node.get('status'),
+            'episodes': node.get('episodes'),
+            'score': node.get('score'),
+            'description': node.get('description') or '',
+            'aired_on': aired_on,
+            # Пустой image даст /missing_original.jpg, постер потом найдёт Anilist
+            'image': {
+                'original': poster.get('originalUrl'),
+                'x96': poster.get('mainUrl'),
+            },
+            'genres': node.get('genres') or [],
+            'studios': node.get('studios') or [],
+            'screenshots': [{'original': s['originalUrl']} for s in node.get('screenshots') or []],
+            'videos': node.get('videos') or [],
+            'rates_statuses_stats': [
+                {'name': s['status'], 'value': s['count']} for s in node.get('statusesStats') or []
+            ],
+        }
+
+    def iter_anime_ids(self, limit: int = 50, retries: int = 3) -> Iterator[int]:
+        """Перебрать ID всех существующих аниме через листинг по id
+
+        Shikimori отдаёт limit + 1 элементов, если есть следующая страница,
+        поэтому лишний элемент может повториться на следующей странице.
+        Если страница не загрузилась и после retries попыток - RuntimeError:
+        оборванный листинг нельзя принимать за полный.
+        """
+        page = 1
+        while True:
+            items = None
+            error = None
+            for attempt in range(retries):
+                try:
+                    url = f"{self.BASE_URL}/animes"
+                    params = {'page': page, 'limit': limit, 'order': 'id', 'censored': 'false'}
+                    response = self.session.get(url, params=params, timeout=30)
+                    response.raise_for_status()
+                    items = response.json()
+                    break
+                except Exception as e:
+                    error = e
+                    print(f"Ошибка листинга, страница {page} (попытка {attempt + 1}): {e}")
+                    if attempt + 1 < retries:
+                        time.sleep(2 ** attempt)
+
+            if items is None:
+                raise RuntimeError(f"Листинг Shikimori оборван на странице {page}") from error
+            if not items:
+                return
+
+            for item in items:
+                yield item['id']
+
+            if len(items) <= limit:
+                return
+            page += 1
+
     def get_popular_anime(self, page: int = 1, limit: int = 50) -> List[Dict]:
         """Получение популярных аниме с пагинацией"""
         try:
@@ -98,39 +263,34 @@ class ShikimoriParser(BaseAnimeParser):
             return []
     
     def normalize_anime_data(self, raw_data: Dict) -> Dict:
-        """Нормализация данных Shikimori"""
+        """Нормализация данных Shikimori
+
+        Без сетевых запросов: аниме без постера получают /missing_original.jpg,
+        а постеры для них пачкой ищет AnilistPosterResolver после импорта.
+        """
         # Обработка постера с fallback
         poster_url = ''
         if raw_data.get('image'):
             if (raw_data['image'].get('original') and
-                raw_data['image']['original'] != '/assets/globals/missing_original.jpg'):
-                poster_url = f"https://shikimori.one{raw_data['image']['original']}"
+                not raw_data['image']['original'].endswith('/assets/globals/missing_original.jpg')):
+                poster_url = self.absolute_url(raw_data['image']['original'])
             elif raw_data['image'].get('x96'):
-                poster_url = f"https://shikimori.one{raw_data['image']['x96']}"
+                poster_url = self.absolute_url(raw_data['image']['x96'])
             else:
-                # Попробовать получить с Anilist
-                title = raw_data.get('russian') or raw_data.get('name') or raw_data.get('english')
-                if title:
-                    anilist_parser = AnilistParser()
-                    alt_poster = anilist_parser.get_poster_url(title)
-                    if alt_poster:
-                        poster_url = alt_poster
-                    else:
-                        poster_url = '/missing_original.jpg'
-                else:
-                    poster_url = '/missing_original.jpg'
+                poster_url = '/missing_original.jpg'
 
         normalized = {
             'id': raw_data.get('id'),
             'title_ru': raw_data.get('russian') or raw_data.get('name'),
-            'title_en': raw_data.get('english') or raw_data.get('name'),
-            'title_jp': raw_data.get('japanese'),
+            'title_en': first_title(raw_data.get('english')) or raw_data.get('name'),
+            'title_jp': first_title(raw_data.get('japanese')),
             'description': self._clean_description(raw_data.get('description', '')),
             'poster_url': poster_url,
             'year': raw_data.get('aired_on', '').split('-')[0] if raw_data.get('aired_on') else None,
             'status': self._map_status(raw_data.get('status')),
             'episodes': raw_data.get('episodes'),
             'score': raw_data.get('score'),
+            'popularity': list_popularity(raw_data.get('rates_statuses_stats')),
             'genres': [{'name': g['russian'] or g['name']} for g in raw_data.get('genres', [])],
             'studios': [s['name'] for s in raw_data.get('studios', [])],
             'screenshots': [{'url': s['original']} for s in raw_data.get('screenshots', [])],
@@ -143,7 +303,15 @@ class ShikimoriParser(BaseAnimeParser):
         
         return normalized
     
-    def _clean_description(self, description: str) -> str:
+    @classmethod
+    def absolute_url(cls, path: str) -> str:
+        """REST отдаёт пути от корня сайта, GraphQL - полные URL"""
+        if not path or path.startswith('http'):
+            return path
+        return f"{cls.SITE_URL}{path}"
+
+    @staticmethod
+    def _clean_description(description: str) -> str:
         """Очистка описания от BBCode тегов Shikimori"""
         if not description:
             return description
@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from . import rate_limit
+from .async_fetch import AsyncFetchEngine
+from .fake_upstream import FakeUpstream, FakeUpstreamServer
+from .multi_source import MultiSourceParser
+from .rate_limit import HOST_LIMITS, HOST_MINUTE_LIMITS, RateLimitedSession, TokenBucketLimiter, configure_limiter
+from .shikimori import ShikimoriParser
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+    def test_burst_then_rate(self):
+        limiter = TokenBucketLimiter(rate=10, burst=2)
+        waits = [limiter.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, delta=0.01)
+        self.assertAlmostEqual(waits[3], 0.2, delta=0.01)
+
+    def test_waiters_after_retry_after_are_spaced(self):
+        limiter = TokenBucketLimiter(rate=10, burst=1)
+        limiter.reserve()
+        limiter.observe(429, {'Retry-After': '2'})
+        rate = limiter.rate
+        waits = [limiter.reserve() for _ in range(3)]
+
+        # Первый ждёт конца блокировки, следующие - ещё по 1 / rate
+        self.assertGreaterEqual(waits[0], 2.0)
+        for before, after in zip(waits, waits[1:]):
+            self.assertAlmostEqual(after - before, 1 / rate, delta=0.01)
+
+    def test_429_lowers_rate_and_success_recovers(self):
+        limiter = TokenBucketLimiter(rate=4, burst=1)
+        limiter.observe(429, {'Retry-After': '0'})
+        self.assertEqual(limiter.rate, 2)
+        for _ in range(200):
+            limiter.observe(200)
+        self.assertGreater(limiter.rate, 2)
+        self.assertLessEqual(limiter.rate, limiter.ceiling)
+
+    def test_cold_start_stays_within_minute_limits(self):
+        for host, per_minute in HOST_MINUTE_LIMITS.items():
+            limits = HOST_LIMITS[host]
+            limiter = TokenBucketLimiter(limits['rate'], limits['burst'], limits['window'])
+            waits = [limiter.reserve() for _ in range(per_minute + 1)]
+            # За первую минуту - не больше лимита, и не больше burst разом
+            self.assertLessEqual(sum(1 for wait in waits if wait < 60), per_minute, host)
+            self.assertEqual(sum(1 for wait in waits if wait == 0), limits['burst'], host)
+
+    def test_remaining_header_blocks_until_reset(self):
+        limiter = TokenBucketLimiter(rate=10, burst=5)
+        limiter.observe(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '3'})
+        self.assertGreaterEqual(limiter.reserve(), 2.9)
+
+
+class FakeListingSession:
+    """Листинг /animes по id: pages - страницы с ID, None - страница падает"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        ids = self.pages[params['page'] - 1] if params['page'] <= len(self.pages) else []
+        if ids is None:
+            raise requests.ConnectionError('connection reset')
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps([{'id': i} for i in ids]).encode()
+        return response
+
+
+@mock.patch('parsers.shikimori.time.sleep')
+class IterAnimeIdsTests(SimpleTestCase):
+    def parser(self, pages):
+        parser = ShikimoriParser()
+        parser.session = FakeListingSession(pages)
+        return parser
+
+    def test_walks_pages_until_short_page(self, sleep):
+        # limit + 1 элемент - признак следующей страницы
+        parser = self.parser([[1, 2, 3], [3, 4]])
+        self.assertEqual(list(parser.iter_anime_ids(limit=2)), [1, 2, 3, 3, 4])
+
+    def test_failed_page_raises_instead_of_truncating(self, sleep):
+        parser = self.parser([[1, 2, 3], None])
+        ids = parser.iter_anime_ids(limit=2, retries=3)
+        with self.assertRaises(RuntimeError):
+            list(ids)
+        self.assertEqual(parser.session.calls, 4)
+
+
+class FakeSource:
+    """Источник для MultiSourceParser: records - нормализованные записи по ID"""
+
+    def __init__(self, records=None, error=False, delay=0.0):
+        self.records = records or {}
+        self.error = error
+        self.delay = delay
+
+    def _get(self, anime_id):
+        time.sleep(self.delay)
+        if self.error:
+            raise requests.ConnectionError('connection reset')
+        return self.records.get(anime_id)
+
+    def get_anime_chunk(self, anime_ids):
+        return [data for data in map(self._get, anime_ids) if data]
+
+    get_anime_by_id = get_anime_by_mal_id = _get
+
+    def normalize_anime_data(self, data):
+        return dict(data)
+
+
+class ThrottledSource(FakeSource):
+    """FakeSource, который ходит через RateLimitedSession к фиктивному хосту"""
+
+    URL = 'http://throttled.test/anime'
+
+    def __init__(self, records=None):
+        super().__init__(records)
+        self.session = RateLimitedSession()
+
+    def _get(self, anime_id):
+        self.session.get(self.URL)
+        return super()._get(anime_id)
+
+
+class MultiSourceParserTests(SimpleTestCase):
+    def parser(self, **sources):
+        return MultiSourceParser(max_workers=2, hedge_after=5, grace=0.05, timeout=2, sources=sources)
+
+    def test_merges_by_field_priority(self):
+        parser = self.parser(
+            shikimori=FakeSource({1: {'id': 1, 'title_ru': 'Тетрадь', 'title_en': '', 'genres': [{'name': 'Триллер'}]}}),
+            anilist=FakeSource({1: {'id': 1, 'title_en': 'Death Note', 'genres': [{'name': 'Thriller'}]}}),
+        )
+        merged = parser.fetch_merged(1)
+        self.assertEqual(merged['title_ru'], 'Тетрадь')
+        self.assertEqual(merged['title_en'], 'Death Note')
+        self.assertEqual(merged['genres'], [{'name': 'Триллер'}])
+
+    def test_without_shikimori_russian_fields_are_omitted(self):
+        parser = self.parser(
+            shikimori=FakeSource({1: {'id': 1, 'title_ru': 'Тетрадь'}}, delay=0.5),
+            anilist=FakeSource({1: {'id': 1, 'title_en': 'Death Note', 'genres': [{'name': 'Thriller'}]}}),
+        )
+        merged = parser.fetch_merged(1)
+        self.assertEqual(merged['sources'], ['anilist'])
+        self.assertEqual(merged['title_en'], 'Death Note')
+        self.assertNotIn('title_ru', merged)
+        self.assertNotIn('genres', merged)
+
+    def test_all_sources_empty_is_missing(self):
+        parser = self.parser(shikimori=FakeSource(), anilist=FakeSource())
+        self.assertIsNone(parser.fetch_merged(1))
+
+    def test_failed_source_is_not_missing(self):
+        parser = self.parser(shikimori=FakeSource(error=True), anilist=FakeSource())
+        with self.assertRaises(RuntimeError):
+            parser.fetch_merged(1)
+
+    def test_slow_source_is_hedged(self):
+        parser = MultiSourceParser(hedge_after=0.1, grace=0.05, timeout=2, sources={
+            'shikimori': FakeSource({1: {'id': 1, 'title_ru': 'Тетрадь'}}, delay=0.4),
+        })
+        self.assertEqual(parser.fetch_merged(1)['title_ru'], 'Тетрадь')
+        self.assertEqual(parser.stats['hedged'], 1)
+
+    def test_source_throttled_by_limiter_is_not_hedged(self):
+        # Слот освободится через 0.5 с, сам ответ мгновенный
+        limiter = configure_limiter(ThrottledSource.URL, rate=2, burst=1)
+        limiter.reserve()
+        self.addCleanup(rate_limit._limiters.pop, 'throttled.test', None)
+        response = requests.Response()
+        response.status_code = 200
+
+        parser = MultiSourceParser(hedge_after=0.1, grace=0.05, timeout=2, sources={
+            'shikimori': ThrottledSource({1: {'id': 1, 'title_ru': 'Тетрадь'}}),
+        })
+        with mock.patch('requests.Session.request', return_value=response):
+            self.assertEqual(parser.fetch_merged(1)['title_ru'], 'Тетрадь')
+        self.assertEqual(parser.stats['hedged'], 0)
+        self.assertEqual(parser.stats['requests'], 1)
+
+    def test_batch_reports_errors(self):
+        parser = self.parser(shikimori=FakeSource({1: {'id': 1}}), anilist=FakeSource(error=True))
+        errors = {}
+        with mock.patch('builtins.print'):
+            results = parser.fetch_anime_batch([1, 2], fan_out=True, errors=errors)
+        self.assertEqual([data['id'] for data in results], [1])
+        self.assertEqual(list(errors), [2])
+
+
+class AsyncFetchEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream(size=60, missing_ratio=0.3, latency_ms=2, jitter_ms=0)
+        self.server = FakeUpstreamServer(self.upstream).start()
+        self.addCleanup(self.server.stop)
+        # Лимит по умолчанию (5 rps) растянул бы тест на секунды
+        configure_limiter(self.server.url, rate=10000, burst=10000)
+        self.addCleanup(rate_limit._limiters.pop, '127.0.0.1', None)
+
+    def url(self, anime_id):
+        return f'{self.server.url}/api/animes/{anime_id}'
+
+    def test_every_request_is_answered_once(self):
+        engine = AsyncFetchEngine(concurrency=8)
+        results = list(engine.fetch_iter((anime_id, self.url(anime_id)) for anime_id in range(1, 61)))
+
+        # Порядок - по готовности, но каждый ключ ровно один раз
+        self.assertEqual(sorted(key for key, _, _ in results), list(range(1, 61)))
+        for key, status, data in results:
+            if key in self.upstream.catalog:
+                self.assertEqual((status, data['id']), (200, key))
+            else:
+                self.assertEqual((status, data), (404, None))
+
+    def test_requests_are_read_lazily(self):
+        pulled = []
+
+        def requests_iter():
+            for anime_id in range(1, 61):
+                pulled.append(anime_id)
+                yield anime_id, self.url(anime_id)
+
+        engine = AsyncFetchEngine(concurrency=2, queue_size=2)
+        results = engine.fetch_iter(requests_iter())
+        next(results)
+        time.sleep(0.3)
+        # Потребитель стоит: в полёте не больше воркеров, в очереди - не больше queue_size
+        self.assertLessEqual(len(pulled), 1 + 2 + 2)
+        results.close()
+
+    def test_network_errors_and_callbacks(self):
+        statuses = []
+        engine = AsyncFetchEngine(concurrency=2, timeout=2,
+                                  on_response=lambda status, seconds: statuses.append(status))
+        missing = next(anime_id for anime_id in range(1, 61) if anime_id not in self.upstream.catalog)
+        # Порт, на котором никто не слушает
+        self.server.stop()
+        dead_url = self.url(1)
+        self.server = FakeUpstreamServer(self.upstream).start()
+        configure_limiter(self.server.url, rate=10000, burst=10000)
+
+        results = dict((key, status) for key, status, _ in engine.fetch_iter([
+            ('found', self.url(self.upstream.ids[0])),
+            ('missing', self.url(missing)),
+            ('dead', dead_url),
+        ]))
+        self.assertEqual(results, {'found': 200, 'missing': 404, 'dead': 0})
+        self.assertEqual(sorted(statuses), [0, 200, 404])
+
+    def test_iterator_error_reaches_consumer(self):
+        def requests_iter():
+            yield 1, self.url(1)
+            raise ValueError('broken id source')
+
+        engine = AsyncFetchEngine(concurrency=2)
+        with self.assertRaises(ValueError):
+            list(engine.fetch_iter(requests_iter()))
+
+    def test_early_exit_stops_event_loop(self):
+        finished = threading.Event()
+        run_loop = AsyncFetchEngine._run_loop
+
+        def tracked(engine, *args):
+            run_loop(engine, *args)
+            finished.set()
+
+        engine = AsyncFetchEngine(concurrency=4, queue_size=2)
+        with mock.patch.object(AsyncFetchEngine, '_run_loop', tracked):
+            results = engine.fetch_iter((anime_id, self.url(anime_id)) for anime_id in range(1, 61))
+            next(results)
+            results.close()
+        # close() ждёт поток event loop: к этому моменту он уже завершился
+        self.assertTrue(finished.is_set())
+        self.assertLess(sum(self.upstream.counters.values()), 60)
+
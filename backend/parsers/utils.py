@@ -0,0 +1,18 @@
+from typing import Optional
+
+
+def first_title(value) -> Optional[str]:
+    """Первое непустое название: REST Shikimori отдаёт english/japanese списком, GraphQL - строкой"""
+    if isinstance(value, (list, tuple)):
+        value = next((item for item in value if item), None)
+    return value or None
+
+
+def list_popularity(stats) -> Optional[int]:
+    """Популярность как на Shikimori: сколько пользователей добавили аниме в список
+
+    stats - rates_statuses_stats из REST ([{name, value}] по статусам).
+    """
+    if not stats:
+        return None
+    return sum(int(item.get('value') or 0) for item in stats)